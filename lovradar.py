@@ -4,22 +4,39 @@ LovRadar v14.0 - Strategisk Regulatorisk Overvåkning
 Bærekraft & Handel for Byggevarebransjen
 """
 
+from __future__ import annotations
+
 import os
+import gzip
+import codecs
 import json
 import hashlib
-import smtplib
 import difflib
 import re
+import time
+import glob
+import argparse
 import asyncio
-import aiohttp
+import threading
+import contextvars
+import concurrent.futures
+import functools
+import importlib.util
 import logging
-from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import deque
+from html.parser import HTMLParser
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
 from dataclasses import dataclass, field, asdict
-from typing import Optional
-from bs4 import BeautifulSoup
-import feedparser
+from typing import Optional, TYPE_CHECKING
+
+import lovradar_plan
+
+# Tunge avhengigheter (aiohttp, bs4, feedparser, smtplib, lxml) importeres der de brukes,
+# så en kjøring uten forfalte kilder slipper å laste dem.
+if TYPE_CHECKING:
+    import aiohttp
 
 # --- KONFIGURASJON ---
 
@@ -102,12 +119,63 @@ ALLE_KEYWORDS = list(set(KEYWORDS["miljø"] + KEYWORDS["bygg"] + KEYWORDS["hande
 
 CONFIG = {
     "cache_file": "lovradar_cache.json",
-    "change_threshold_percent": 0.3,
+    "shard_report_file": "lovradar_rapport.json",
+    "snapshot_dir": "lovradar_snapshots",
+    "snapshot_keep_versions": 5,
+    "snapshot_max_age_days": 365,
+    "history_max_entries": 50,
     "request_timeout": 30,
+    "max_response_bytes": 50_000_000,
+    "download_chunk_bytes": 65536,
     "retry_attempts": 3,
     "retry_delay": 2,
     "rate_limit_delay": 0.5,
-    "max_rss_entries": 15,
+    "max_concurrent_requests": 5,
+    "host_rate_limits": {
+        "lovdata.no": 2.0,
+        "dibk.no": 1.0,
+        "regjeringen.no": 1.0,
+        "forbrukertilsynet.no": 1.0,
+    },
+    "host_burst": 2,
+    "extraction_engine": "bs4",
+    "extraction_workers": None,
+    "lovdata_bulk_urls": [
+        "https://api.lovdata.no/v1/publicData/get/gjeldende-lover.tar.bz2",
+        "https://api.lovdata.no/v1/publicData/get/gjeldende-sentrale-forskrifter.tar.bz2",
+    ],
+    "bulk_queue_size": 8,
+    "checkpoint_dir": "lovradar_sjekkpunkt",
+    "plan_file": lovradar_plan.PLAN_FIL,
+    "history_db": "lovradar_historikk.db",
+    "subscribers_file": "lovradar_abonnenter.json",
+    "smtp_host": "smtp.gmail.com",
+    "smtp_port": 465,
+    "smtp_security": "ssl",
+    "smtp_batch_size": 50,
+    "checkpoint_window_hours": 24,
+    "poll_min_interval_hours": 20,
+    "poll_max_staleness_days": 14,
+    "poll_run_margin_hours": 12,
+    "poll_change_fraction": 0.1,
+    "poll_prior_days": 365,
+    "category_priority": {"miljø": 1.0, "bygg": 1.0, "handel": 1.0, "alle": 0.5},
+    "rss_poll_interval_hours": 20,
+    "daemon_host": "127.0.0.1",
+    "daemon_port": 8765,
+    "daemon_min_sleep_seconds": 60,
+    "daemon_max_sleep_seconds": 21600,
+    "max_rss_entries": 50,
+    "rss_seen_ttl_days": 90,
+    "rss_seen_max_entries": 10000,
+    "rss_near_duplicate_distance": 3,
+    "keyword_compound_min_length": 5,
+    "relevance_threshold": 0.0,
+    "relevance_k1": 1.2,
+    "relevance_b": 0.75,
+    "relevance_category_weights": {"miljø": 1.0, "bygg": 1.0, "handel": 1.0},
+    "relevance_own_category_boost": 1.5,
+    "relevance_corpus_max": 10000,
     "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
@@ -118,75 +186,583 @@ logging.basicConfig(
 )
 logger = logging.getLogger("LovRadar")
 
+try:
+    import resource
+except ImportError:  # Ikke tilgjengelig på Windows
+    resource = None
+
+
+# --- MÅLING ---
+
+class Maaler:
+    def __init__(self):
+        self.faser = {}
+        self.kilder = {}
+        self.bytes_lastet_ned = 0
+        self.forsok_pa_nytt = 0
+        self.http_429 = 0
+        self.maks_minne_andre = None
+
+    def registrer(self, fase: str, sekunder: float, kilde: Optional[str] = None, antall: int = 1):
+        total = self.faser.setdefault(fase, {"antall": 0, "sekunder": 0.0})
+        total["antall"] += antall
+        total["sekunder"] += sekunder
+        if kilde:
+            per_kilde = self.kilder.setdefault(kilde, {})
+            per_kilde[fase] = per_kilde.get(fase, 0.0) + sekunder
+
+    @contextmanager
+    def fase(self, navn: str, kilde: Optional[str] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrer(navn, time.perf_counter() - start, kilde)
+
+    def slaa_sammen(self, faser: dict, kilde: Optional[str] = None):
+        for navn, total in faser.items():
+            self.registrer(navn, total["sekunder"], kilde, total["antall"])
+
+    def legg_til(self, ytelse: dict):
+        # Tar inn som_dict() fra en annen kjøring, f.eks. en shard
+        for navn, total in ytelse["faser"].items():
+            self.registrer(navn, total["sekunder"], antall=total["antall"])
+        for kilde, faser in ytelse["kilder"].items():
+            per_kilde = self.kilder.setdefault(kilde, {})
+            for fase, sekunder in faser.items():
+                per_kilde[fase] = per_kilde.get(fase, 0.0) + sekunder
+        self.bytes_lastet_ned += ytelse["bytes_lastet_ned"]
+        self.forsok_pa_nytt += ytelse["forsok_pa_nytt"]
+        self.http_429 += ytelse["http_429"]
+        self.maks_minne_andre = max(self.maks_minne_andre or 0, ytelse["maks_minne_mb"] or 0) or None
+
+    def som_dict(self) -> dict:
+        return {
+            "faser": {navn: {"antall": t["antall"], "sekunder": round(t["sekunder"], 4)}
+                      for navn, t in self.faser.items()},
+            "kilder": {kilde: {fase: round(sek, 4) for fase, sek in faser.items()}
+                       for kilde, faser in sorted(self.kilder.items())},
+            "bytes_lastet_ned": self.bytes_lastet_ned,
+            "forsok_pa_nytt": self.forsok_pa_nytt,
+            "http_429": self.http_429,
+            "maks_minne_mb": max(filter(None, (maks_minne_mb(), self.maks_minne_andre)), default=None),
+        }
+
+
+def maks_minne_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss er i kB på Linux; prosesspoolens arbeidere telles når de er avsluttet
+    egen = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    barn = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(egen, barn) / 1024, 1)
+
+
+AKTIV_MAALER = contextvars.ContextVar("aktiv_maaler", default=None)
+AKTIV_KILDE = contextvars.ContextVar("aktiv_kilde", default=None)
+
+
+def maalt(fase: str):
+    def dekorator(funksjon):
+        @functools.wraps(funksjon)
+        def innpakket(*args, **kwargs):
+            maaler = AKTIV_MAALER.get()
+            if maaler is None:
+                return funksjon(*args, **kwargs)
+            with maaler.fase(fase, AKTIV_KILDE.get()):
+                return funksjon(*args, **kwargs)
+        return innpakket
+    return dekorator
+
 
 # --- HJELPEFUNKSJONER ---
 
+# Normaliseringsreglene kompileres én gang til to mønstre og én oversettelsestabell.
+# Endres reglene, skal NORMALISERING_VERSJON økes: versjonen lagres per lov i cachen, og en
+# baseline med eldre versjon normaliseres på nytt fra råteksten i snapshotet før den diffes.
+NORMALISERING_VERSJON = 1
+NORMALISERING_REGLER = {
+    "fjern": [
+        r'\d{1,2}\.\d{1,2}\.\d{2,4}',   # datoer (01.02.2024)
+        r'\d{4}-\d{2}-\d{2}',            # ISO-datoer
+        r'[Vv]ersjon\s*\d+(?:\.\d+)*',   # versjonsnummer i sidefoten
+    ],
+    # "Sist endret"-stempelet fjernes med resten av linjen. Det kjøres etter "fjern", slik at en fjernet dato etterlater dobbelt mellomrom som avslutter stempelet
+    "stempel": r'(?i:sist\s+endret).*?(?=\s{2}|\n|$)',
+    "mellomrom": "-–—•·",
+}
+
+
+def kompiler_normalisering(regler: dict) -> tuple:
+    return (re.compile("|".join(regler["fjern"])),
+            re.compile(regler["stempel"]),
+            str.maketrans({tegn: " " for tegn in regler["mellomrom"]}))
+
+
+FJERN_MONSTER, STEMPEL_MONSTER, MELLOMROM_TABELL = kompiler_normalisering(NORMALISERING_REGLER)
+
+
+@maalt("normaliser_tekst")
 def normaliser_tekst(tekst: str) -> str:
     if not tekst:
         return ""
-    tekst = re.sub(r'\d{1,2}\.\d{1,2}\.\d{2,4}', '', tekst)
-    tekst = re.sub(r'\d{4}-\d{2}-\d{2}', '', tekst)
-    tekst = re.sub(r'[Vv]ersjon\s*\d+(\.\d+)*', '', tekst)
-    tekst = re.sub(r'Sist\s+endret.*?(?=\s{2}|\n|$)', '', tekst, flags=re.IGNORECASE)
-    tekst = re.sub(r'\s+', ' ', tekst)
-    tekst = re.sub(r'[§\-–—•·]', ' ', tekst)
-    return tekst.strip().lower()
+    tekst = STEMPEL_MONSTER.sub("", FJERN_MONSTER.sub("", tekst)).translate(MELLOMROM_TABELL)
+    return " ".join(tekst.split()).lower()
+
+
+STOY_TAGGER = ["script", "style", "nav", "footer", "header", "aside",
+               "button", "form", "input", "select", "meta", "link",
+               "noscript", "iframe"]
+
+STOY_KLASSER = ["breadcrumb", "navigation", "sidebar", "footer",
+                "header", "menu", "pagination", "share", "print"]
+
+# Innholdsbeholdere i prioritert rekkefølge: (tagg, attributt, verdi)
+INNHOLD_BEHOLDERE = [
+    ("div", "class", "LovdataParagraf"),
+    ("div", "class", "LovdataLov"),
+    ("div", "class", "dokumentBeholder"),
+    ("div", "id", "LovdataDokument"),
+    ("article", None, None),
+    ("main", None, None),
+    ("div", "role", "main"),
+    ("div", "class", "content"),
+]
 
 
-def ekstraher_lovtekst(html: str) -> str:
-    if not html:
-        return ""
+def _ekstraher_bs4(html: str, dokument: bool = False) -> str:
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "nav", "footer", "header", "aside",
-                     "button", "form", "input", "select", "meta", "link",
-                     "noscript", "iframe"]):
+    for tag in soup(STOY_TAGGER + (["head"] if dokument else [])):
         tag.decompose()
-    for selector in [".breadcrumb", ".navigation", ".sidebar", ".footer",
-                     ".header", ".menu", ".pagination", ".share", ".print"]:
-        for elem in soup.select(selector):
+    for klasse in STOY_KLASSER:
+        for elem in soup.select("." + klasse):
             elem.decompose()
-    content = (soup.find("div", class_="LovdataParagraf") or
-               soup.find("div", class_="LovdataLov") or
-               soup.find("div", class_="dokumentBeholder") or
-               soup.find("div", id="LovdataDokument") or
-               soup.find("article") or
-               soup.find("main") or
-               soup.find("div", {"role": "main"}) or
-               soup.find("div", class_="content") or
-               soup.body)
+    if dokument:
+        return soup.get_text(separator=" ")
+    content = None
+    for tagg, attributt, verdi in INNHOLD_BEHOLDERE:
+        content = soup.find(tagg, {attributt: verdi} if attributt else {})
+        if content:
+            break
+    content = content or soup.body
     if not content:
         return ""
-    tekst = content.get_text(separator=" ")
-    return normaliser_tekst(tekst)
+    return content.get_text(separator=" ")
+
+
+def _xpath_klasse(klasse: str) -> str:
+    return "contains(concat(' ', normalize-space(@class), ' '), ' " + klasse + " ')"
+
+
+def _fjern_element(elem):
+    # drop_tree beholder teksten etter elementet, slik decompose() gjør, men limer den rett på
+    # teksten foran; i bs4 er de to egne tekstnoder, så "før<form>..</form>etter" blir to ord
+    if elem.tail:
+        elem.tail = " " + elem.tail
+    elem.drop_tree()
+
+
+def _ekstraher_lxml(html: str, dokument: bool = False) -> str:
+    from lxml import etree, html as lxml_html
+    try:
+        rot = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        # F.eks. dokumenter med encoding-deklarasjon i en str; bs4 takler dem
+        return _ekstraher_bs4(html, dokument)
+    stoy_tagger = STOY_TAGGER + (["head"] if dokument else [])
+    for elem in list(rot.iter(etree.Comment, etree.ProcessingInstruction, *stoy_tagger)):
+        _fjern_element(elem)
+    stoy = rot.xpath("//*[" + " or ".join(_xpath_klasse(k) for k in STOY_KLASSER) + "]")
+    for elem in stoy:
+        _fjern_element(elem)
+    if dokument:
+        return " ".join(rot.itertext())
+    content = None
+    for tagg, attributt, verdi in INNHOLD_BEHOLDERE:
+        if attributt == "class":
+            treff = rot.xpath("(//" + tagg + "[" + _xpath_klasse(verdi) + "])[1]")
+        elif attributt:
+            treff = rot.xpath("(//" + tagg + "[@" + attributt + "='" + verdi + "'])[1]")
+        else:
+            treff = rot.xpath("(//" + tagg + ")[1]")
+        if treff:
+            content = treff[0]
+            break
+    if content is None and re.search(r"<body[\s>]", html, re.IGNORECASE):
+        # lxml lager alltid <body>; html.parser bare når dokumentet har en
+        content = rot.find("body")
+    if content is None:
+        return ""
+    return " ".join(content.itertext())
+
+
+TOMME_TAGGER = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+                "meta", "param", "source", "track", "wbr"}
+
+
+class StromParser(HTMLParser):
+    # Inkrementell ekstraksjon: siden mates inn i biter mens den lastes ned, og bare teksten
+    # i innholdsbeholderne tas vare på. Verken hele siden eller et dokumenttre holdes i minnet.
+    # Beholderen velges som i bs4: den første av høyest prioritet, ellers <body>. Med
+    # dokument=True er hele dokumentet utenom <head> innholdet.
+    def __init__(self, dokument: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.dokument = dokument
+        self.stabel = []       # (tagg, er støy, prioritet for beholder åpnet her)
+        self.stoy = 0
+        self.beholdere = {0: []} if dokument else {}    # prioritet -> tekstbiter; lavere tall vinner
+        self.aapne = {0} if dokument else set()
+        self.data = []
+
+    def _prioritet(self, tagg: str, attributter: dict, klasser: list) -> Optional[int]:
+        for prioritet, (beholder_tagg, attributt, verdi) in enumerate(INNHOLD_BEHOLDERE):
+            if tagg != beholder_tagg:
+                continue
+            if (attributt is None or (attributt == "class" and verdi in klasser)
+                    or (attributt != "class" and attributter.get(attributt) == verdi)):
+                return prioritet
+        return len(INNHOLD_BEHOLDERE) if tagg == "body" else None
+
+    def _tom_data(self):
+        # Tekst mellom to tagger er én tekstnode, selv om den kom i flere biter
+        if self.data:
+            tekst = "".join(self.data)
+            self.data = []
+            for prioritet in self.aapne:
+                self.beholdere[prioritet].append(tekst)
+
+    def handle_starttag(self, tagg, attributter):
+        self._tom_data()
+        if tagg in TOMME_TAGGER:
+            return
+        attributter = dict(attributter)
+        klasser = (attributter.get("class") or "").split()
+        er_stoy = (self.stoy > 0 or tagg in STOY_TAGGER or any(k in STOY_KLASSER for k in klasser)
+                   or (self.dokument and tagg == "head"))
+        prioritet = None if er_stoy or self.dokument else self._prioritet(tagg, attributter, klasser)
+        if prioritet is not None and all(p > prioritet for p in self.beholdere):
+            # Beholdere med lavere prioritet kan ikke lenger vinne og kastes
+            for p in [p for p in self.beholdere if p > prioritet]:
+                del self.beholdere[p]
+                self.aapne.discard(p)
+            self.beholdere[prioritet] = []
+            self.aapne.add(prioritet)
+        else:
+            prioritet = None
+        self.stabel.append((tagg, er_stoy, prioritet))
+        self.stoy += er_stoy
+
+    def handle_endtag(self, tagg):
+        self._tom_data()
+        for i in range(len(self.stabel) - 1, -1, -1):
+            if self.stabel[i][0] == tagg:
+                break
+        else:
+            return
+        for _, er_stoy, prioritet in self.stabel[i:]:
+            self.stoy -= er_stoy
+            self.aapne.discard(prioritet)
+        del self.stabel[i:]
+
+    def handle_data(self, data):
+        if not self.stoy and self.aapne:
+            self.data.append(data)
+
+    def handle_comment(self, data):
+        self._tom_data()
+
+    def handle_decl(self, decl):
+        self._tom_data()
+
+    def handle_pi(self, data):
+        self._tom_data()
+
+    def resultat(self) -> str:
+        self.close()
+        self._tom_data()
+        if not self.beholdere:
+            return ""
+        return " ".join(self.beholdere[min(self.beholdere)])
+
+
+def _ekstraher_strom(html: str, dokument: bool = False) -> str:
+    parser = StromParser(dokument)
+    parser.feed(html)
+    return parser.resultat()
+
+
+EKSTRAKSJON_MOTORER = {
+    "bs4": _ekstraher_bs4,
+    "lxml": _ekstraher_lxml,
+    "strom": _ekstraher_strom,
+}
+
+
+def velg_ekstraksjon_motor(motor: Optional[str] = None) -> str:
+    motor = motor or CONFIG["extraction_engine"]
+    if motor not in EKSTRAKSJON_MOTORER:
+        logger.warning(f"Ukjent ekstraksjonsmotor '{motor}', bruker bs4")
+        return "bs4"
+    if motor == "lxml" and importlib.util.find_spec("lxml") is None:
+        logger.warning("lxml er ikke installert, bruker bs4")
+        return "bs4"
+    return motor
+
+
+@maalt("ekstraher_lovtekst")
+def ekstraher_raatekst(html: str, motor: str = "bs4", dokument: bool = False) -> str:
+    # dokument=True for dokumentene i datapakkene: de har ingen sideramme, og innholdsreglene
+    # for nettsidene ville valgt første <article>, dvs. bare første paragraf
+    if not html:
+        return ""
+    return EKSTRAKSJON_MOTORER[motor](html, dokument)
+
+
+def ekstraher_lovtekst(html: str, motor: str = "bs4", dokument: bool = False) -> str:
+    return normaliser_tekst(ekstraher_raatekst(html, motor, dokument))
+
+
+def ekstraher_med_maaling(html: str, motor: str, dokument: bool = False) -> tuple:
+    # Kjøres i prosesspoolen; fasetidene sendes tilbake og legges til hovedprosessens måler.
+    # Råteksten følger med, den lagres så baselinen kan normaliseres på nytt senere
+    maaler = Maaler()
+    token = AKTIV_MAALER.set(maaler)
+    try:
+        raa = ekstraher_raatekst(html, motor, dokument)
+        return raa, normaliser_tekst(raa), maaler.faser
+    finally:
+        AKTIV_MAALER.reset(token)
+
+
+# Paragrafoverskrifter slik de ser ut etter normalisering: "§ 3 a." beholdes, "§ 1-1." blir
+# "§ 1 1.", og kapitteloverskrifter beholder ordet "kapittel".
+SEKSJON_MONSTER = re.compile(
+    r'§ (?P<paragraf>\d+(?: \d+)?(?: ?[a-z])?)\.\s'
+    r'|\bkapittel (?P<kapittel>\d+ ?[a-z]?)\.\s'
+)
+
 
+def _seksjon_etikett(treff: re.Match) -> str:
+    if treff.group("kapittel"):
+        return "Kapittel " + treff.group("kapittel").strip()
+    nummer = treff.group("paragraf").strip()
+    deler = nummer.split(" ")
+    if len(deler) > 1 and deler[1].isdigit():
+        nummer = deler[0] + "-" + " ".join(deler[1:])
+    return "§ " + nummer
 
+
+# Ord som står foran en henvisning ("jf. § 7.", "nevnt i § 5."), ikke foran en overskrift
+REFERANSE_ORD = {"i", "jf", "jf.", "jfr", "jfr.", "etter", "og", "eller", "til", "se", "ved",
+                 "av", "med", "mot", "under", "efter", "ifølge", "paragraf", "§§"}
+
+
+def _seksjon_nokkel(etikett: str) -> tuple:
+    # "§ 3-2 a" -> (3, 2.01): bokstavparagrafer sorteres mellom sine naboer
+    deler = [float(d) for d in re.findall(r"\d+", etikett)]
+    bokstav = re.search(r"[a-z]$", etikett)
+    if bokstav and deler:
+        deler[-1] += (ord(bokstav.group()) - 96) / 100
+    return tuple(deler)
+
+
+# Største sprang i nummereringen mellom to overskrifter, f.eks. over et par opphevede paragrafer
+SEKSJON_MAKS_SPRANG = 3
+# Antall tidligere kandidater en overskrift kan følge etter; holder kjedesøket lineært
+SEKSJON_VINDU = 64
+
+
+def _folger_etter(forrige: tuple, nokkel: tuple) -> bool:
+    if len(forrige) != len(nokkel) or nokkel <= forrige:
+        return False
+    if len(nokkel) > 1 and int(nokkel[0]) != int(forrige[0]):
+        # "§ 3-1" etter "§ 2-7": nytt kapittel, og nummereringen i kapitlet starter på nytt
+        return int(nokkel[0]) - int(forrige[0]) <= SEKSJON_MAKS_SPRANG and int(nokkel[1]) <= SEKSJON_MAKS_SPRANG
+    return int(nokkel[-1]) - int(forrige[-1]) <= SEKSJON_MAKS_SPRANG
+
+
+def _lengste_kjede(kandidater: list) -> list:
+    # Overskriftene er den lengste rekken av kandidater der hver følger tett på den forrige.
+    # En henvisning fremover ("gjelder tilsvarende for § 9.") bryter rekken og faller utenfor.
+    lengde, forgjenger = [], []
+    for i, (_, nokkel) in enumerate(kandidater):
+        beste, fra = 1, None
+        for j in range(max(i - SEKSJON_VINDU, 0), i):
+            # Ved likhet vinner den siste kandidaten: en henvisning står foran overskriften
+            if lengde[j] + 1 >= beste and _folger_etter(kandidater[j][1], nokkel):
+                beste, fra = lengde[j] + 1, j
+        lengde.append(beste)
+        forgjenger.append(fra)
+    if not kandidater:
+        return []
+    i = len(lengde) - 1 - lengde[::-1].index(max(lengde))
+    kjede = []
+    while i is not None:
+        kjede.append(i)
+        i = forgjenger[i]
+    return kjede[::-1]
+
+
+def del_i_seksjoner(tekst: str) -> list:
+    kandidater = {}
+    for treff in SEKSJON_MONSTER.finditer(tekst):
+        # En henvisning som avslutter en setning ser ut som en overskrift; ordet foran avslører
+        # de fleste, og resten faller utenfor rekkefølgen i _lengste_kjede
+        foran = tekst[max(treff.start() - 12, 0):treff.start()].split()
+        if foran and foran[-1] in REFERANSE_ORD:
+            continue
+        etikett = _seksjon_etikett(treff)
+        kandidater.setdefault(etikett.split(" ")[0], []).append((treff.start(), etikett))
+    overskrifter = []
+    for per_type in kandidater.values():
+        nokler = [(start, _seksjon_nokkel(etikett)) for start, etikett in per_type]
+        overskrifter += [per_type[i] for i in _lengste_kjede(nokler)]
+    seksjoner = []
+    etikett, start = "Innledning", 0
+    for ny_start, ny_etikett in sorted(overskrifter):
+        if ny_start > start:
+            seksjoner.append((etikett, tekst[start:ny_start]))
+        etikett, start = ny_etikett, ny_start
+    seksjoner.append((etikett, tekst[start:]))
+    # Mellomrom slås sammen, så bare ordene avgjør om to seksjoner er like
+    seksjoner = [(e, " ".join(t.split())) for e, t in seksjoner]
+    return [(e, t) for e, t in seksjoner if t]
+
+
+def _utdrag(ord_liste: list) -> str:
+    return " ".join(ord_liste)[:200] + "..."
+
+
+def _diff_seksjon(etikett: str, gammel: str, ny: str) -> tuple:
+    gamle_ord, nye_ord = gammel.split(), ny.split()
+    matcher = difflib.SequenceMatcher(None, gamle_ord, nye_ord)
+    ulike_tegn = 0
+    nytt, fjernet = [], []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        ulike_tegn += sum(len(o) + 1 for o in gamle_ord[i1:i2]) + sum(len(o) + 1 for o in nye_ord[j1:j2])
+        fjernet.extend(gamle_ord[i1:i2])
+        nytt.extend(nye_ord[j1:j2])
+    beskrivelse = etikett + " endret."
+    if nytt:
+        beskrivelse += " Nytt: " + _utdrag(nytt)
+    if fjernet:
+        beskrivelse += " Fjernet: " + _utdrag(fjernet)
+    return ulike_tegn, beskrivelse
+
+
+@maalt("beregn_endring")
 def beregn_endring(gammel: str, ny: str) -> tuple:
     if not gammel or not ny:
         return 0.0, []
-    gammel_norm = normaliser_tekst(gammel)
-    ny_norm = normaliser_tekst(ny)
-    matcher = difflib.SequenceMatcher(None, gammel_norm, ny_norm)
-    likhet = matcher.ratio()
-    endring_prosent = round((1 - likhet) * 100, 2)
+    gamle = del_i_seksjoner(gammel)
+    nye = del_i_seksjoner(ny)
+    totalt = sum(len(t) for _, t in gamle) + sum(len(t) for _, t in nye)
+    if not totalt:
+        return 0.0, []
+    # Juster seksjonene mot hverandre på innhold; bare ulike seksjoner diffes ord for ord
+    matcher = difflib.SequenceMatcher(None, gamle, nye, autojunk=False)
+    ulike_tegn = 0
     endringer = []
-    if endring_prosent > 0:
-        differ = difflib.unified_diff(
-            gammel_norm.split('. '),
-            ny_norm.split('. '),
-            lineterm=''
-        )
-        for line in differ:
-            if line.startswith('+') and not line.startswith('+++'):
-                endring = line[1:].strip()
-                if len(endring) > 20:
-                    endringer.append("Nytt: " + endring[:200] + "...")
-            elif line.startswith('-') and not line.startswith('---'):
-                endring = line[1:].strip()
-                if len(endring) > 20:
-                    endringer.append("Fjernet: " + endring[:200] + "...")
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        ledige = list(gamle[i1:i2])
+        for etikett, tekst in nye[j1:j2]:
+            par = next((g for g in ledige if g[0] == etikett), None)
+            if par:
+                ledige.remove(par)
+                tegn, beskrivelse = _diff_seksjon(etikett, par[1], tekst)
+                if tegn:
+                    ulike_tegn += tegn
+                    endringer.append(beskrivelse)
+            else:
+                ulike_tegn += len(tekst)
+                endringer.append(etikett + " lagt til: " + tekst[:200] + "...")
+        for etikett, tekst in ledige:
+            ulike_tegn += len(tekst)
+            endringer.append(etikett + " fjernet: " + tekst[:200] + "...")
+    endring_prosent = round(min(ulike_tegn / totalt, 1.0) * 100, 2)
     return endring_prosent, endringer[:5]
 
 
+class NokkelordMatcher:
+    # Aho-Corasick-automat over alle nøkkelord: ett pass over teksten uansett antall ord.
+    # Treff må starte på en ordgrense. Korte ord (epd, esg, hms) må også slutte på en,
+    # mens lengre ord kan være førsteledd i et sammensatt ord ("avfall" i "avfallsplan").
+    # Bindestrek og mellomrom regnes som like, siden normaliseringen gjør "ce-merking" til
+    # "ce merking"; treffene meldes med ordet slik det står i listen.
+    def __init__(self, keywords: dict):
+        self._goto = [{}]
+        self._fail = [0]
+        self._ut = [[]]
+        self._kategorier = {}
+        for kategori, ordliste in keywords.items():
+            for kw in ordliste:
+                kategorier = self._kategorier.setdefault(kw.lower(), [])
+                if kategori not in kategorier:
+                    kategorier.append(kategori)
+        for kw in self._kategorier:
+            tilstand = 0
+            for tegn in kw.translate(MELLOMROM_TABELL):
+                neste = self._goto[tilstand].get(tegn)
+                if neste is None:
+                    neste = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._ut.append([])
+                    self._goto[tilstand][tegn] = neste
+                tilstand = neste
+            self._ut[tilstand].append(kw)
+        ko = deque(self._goto[0].values())
+        while ko:
+            tilstand = ko.popleft()
+            for tegn, neste in self._goto[tilstand].items():
+                ko.append(neste)
+                f = self._fail[tilstand]
+                while f and tegn not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[neste] = self._goto[f].get(tegn, 0)
+                self._ut[neste] = self._ut[neste] + self._ut[self._fail[neste]]
+
+    def finn(self, tekst: str) -> dict:
+        tekst = tekst.lower().translate(MELLOMROM_TABELL)
+        min_lengde = CONFIG["keyword_compound_min_length"]
+        treff = {}
+        tilstand = 0
+        for i, tegn in enumerate(tekst):
+            while tilstand and tegn not in self._goto[tilstand]:
+                tilstand = self._fail[tilstand]
+            tilstand = self._goto[tilstand].get(tegn, 0)
+            for kw in self._ut[tilstand]:
+                start = i - len(kw) + 1
+                if start > 0 and tekst[start - 1].isalnum():
+                    continue
+                if len(kw) < min_lengde and i + 1 < len(tekst) and tekst[i + 1].isalnum():
+                    continue
+                for kategori in self._kategorier[kw]:
+                    per_kategori = treff.setdefault(kategori, {})
+                    per_kategori[kw] = per_kategori.get(kw, 0) + 1
+        return treff
+
+
+def ordtelling(treff: dict) -> dict:
+    # Et ord som står i flere kategorier telles én gang
+    antall = {}
+    for per_kategori in treff.values():
+        for kw, n in per_kategori.items():
+            antall[kw] = max(antall.get(kw, 0), n)
+    return antall
+
+
+def keywords_fra_treff(treff: dict) -> list:
+    antall = ordtelling(treff)
+    # Flest treff først; ved likhet beholdes rekkefølgen ordene ble funnet i
+    return sorted(antall, key=lambda kw: -antall[kw])
+
+
 @dataclass
 class Funn:
     type: str
@@ -198,44 +774,1042 @@ class Funn:
     endring_prosent: float = 0.0
     endringer: list = field(default_factory=list)
     keywords: list = field(default_factory=list)
+    keyword_treff: dict = field(default_factory=dict)
+    ord_antall: int = 0             # Antall ord i teksten nøkkelordene ble talt i
+    relevans: float = 0.0
+    simhash: str = ""
+    kilder: list = field(default_factory=list)    # Alle feeder som hadde nyheten, når den kom flere steder
+
+
+@dataclass
+class HttpSvar:
+    status: int
+    tekst: str = ""
+    validatorer: dict = field(default_factory=dict)
+    utdrag: Optional[str] = None    # Ferdig ekstrahert tekst når siden ble parset under nedlastingen
+    innhold: bytes = b""            # Udekodede bytes når kallet ba om dem (RSS)
+
+
+META_TEGNSETT_MONSTER = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def tegnsett(headers, start: bytes = b"") -> str:
+    # Tegnsettet i HTTP-headeren går foran <meta charset> i starten av siden; uten noen av dem UTF-8
+    kandidater = []
+    for parameter in headers.get("Content-Type", "").split(";")[1:]:
+        navn, _, verdi = parameter.strip().partition("=")
+        if navn.lower() == "charset":
+            kandidater.append(verdi.strip('"'))
+    treff = META_TEGNSETT_MONSTER.search(start[:4096])
+    if treff:
+        kandidater.append(treff.group(1).decode("ascii", errors="replace"))
+    for kandidat in kandidater:
+        try:
+            return codecs.lookup(kandidat).name
+        except LookupError:
+            continue
+    return "utf-8"
+
+
+# --- RELEVANS ---
+
+RELEVANS_ORD = list(dict.fromkeys(kw.lower() for ordliste in KEYWORDS.values() for kw in ordliste))
+RELEVANS_INDEKS = {kw: i for i, kw in enumerate(RELEVANS_ORD)}
+
+
+def oppdater_relevansstatistikk(statistikk: dict, funn: list, tellinger: list):
+    # Dokumentfrekvensene samles over kjøringene, så IDF og terskel er stabile selv når
+    # en kjøring bare har et par funn. Over relevance_corpus_max halveres alt.
+    df = statistikk.setdefault("df", {})
+    statistikk["dokumenter"] = statistikk.get("dokumenter", 0) + len(funn)
+    statistikk["ord"] = statistikk.get("ord", 0) + sum(max(f.ord_antall, 1) for f in funn)
+    for antall in tellinger:
+        for kw in antall:
+            df[kw] = df.get(kw, 0) + 1
+    if statistikk["dokumenter"] > CONFIG["relevance_corpus_max"]:
+        statistikk["dokumenter"] /= 2
+        statistikk["ord"] /= 2
+        statistikk["df"] = {kw: n / 2 for kw, n in df.items()}
+
+
+def _relevans_vekter(np) -> tuple:
+    # Én vektrad per kategori: grunnvekt fra ordets kategorier, forsterket for ord i
+    # kategorien selv. Rad 0 (grunnvekten) brukes for andre kategorier, f.eks. "alle".
+    vekter = CONFIG["relevance_category_weights"]
+    grunnvekt = np.zeros(len(RELEVANS_ORD))
+    egne = {}
+    for kategori, ordliste in KEYWORDS.items():
+        indekser = [RELEVANS_INDEKS[kw.lower()] for kw in ordliste]
+        grunnvekt[indekser] = np.maximum(grunnvekt[indekser], vekter.get(kategori, 1.0))
+        egne[kategori] = indekser
+    rader = np.tile(grunnvekt, (len(egne) + 1, 1))
+    for rad, indekser in enumerate(egne.values(), start=1):
+        rader[rad, indekser] *= CONFIG["relevance_own_category_boost"]
+    return {kategori: rad for rad, kategori in enumerate(egne, start=1)}, rader
+
+
+@maalt("beregn_relevans")
+def beregn_relevans(funn: list, statistikk: dict):
+    # BM25 over nøkkelordvokabularet for alle funn i kjøringen på én gang. Treffene ligger som en
+    # glissen matrise (rad, kolonne, antall), så arbeidet følger antall treff og ikke vokabularet.
+    # Tellingene kommer fra nøkkelordautomaten, så tekstene leses ikke på nytt.
+    if not funn:
+        return
+    import numpy as np
+    tellinger = [{kw: n for kw, n in ordtelling(f.keyword_treff).items() if kw in RELEVANS_INDEKS} for f in funn]
+    oppdater_relevansstatistikk(statistikk, funn, tellinger)
+    k1, b = CONFIG["relevance_k1"], CONFIG["relevance_b"]
+
+    treff_per_funn = np.fromiter((len(t) for t in tellinger), dtype=np.int64, count=len(funn))
+    rader = np.repeat(np.arange(len(funn)), treff_per_funn)
+    kolonner = np.fromiter((RELEVANS_INDEKS[kw] for t in tellinger for kw in t), dtype=np.int64, count=len(rader))
+    tf = np.fromiter((n for t in tellinger for n in t.values()), dtype=float, count=len(rader))
+
+    df = np.array([statistikk["df"].get(kw, 0) for kw in RELEVANS_ORD], dtype=float)
+    idf = np.log1p((statistikk["dokumenter"] - df + 0.5) / (df + 0.5))
+    lengder = np.fromiter((max(f.ord_antall, 1) for f in funn), dtype=float, count=len(funn))
+    norm = k1 * (1 - b + b * lengder / (statistikk["ord"] / statistikk["dokumenter"]))
+    kategori_rad, vektrader = _relevans_vekter(np)
+    kategorier = np.fromiter((kategori_rad.get(f.kategori, 0) for f in funn), dtype=np.int64, count=len(funn))
+
+    bidrag = vektrader[kategorier[rader], kolonner] * idf[kolonner] * tf * (k1 + 1) / (tf + norm[rader])
+    poeng = np.bincount(rader, weights=bidrag, minlength=len(funn))
+    # Stikkordene som bidrar mest først, ikke bare de som ble funnet først; lexsort er stabil
+    rekkefolge = np.lexsort((-np.round(bidrag, 6), rader))
+    stikkord = np.split(kolonner[rekkefolge], np.cumsum(treff_per_funn)[:-1])
+    for f, p, ordene in zip(funn, poeng.tolist(), stikkord):
+        f.relevans = round(p, 3)
+        if ordene.size:
+            f.keywords = [RELEVANS_ORD[i] for i in ordene[:5].tolist()]
+
+
+# --- PLANLEGGING AV FORESPØRSLER ---
+
+class TokenBotte:
+    def __init__(self, rate: float, kapasitet: float):
+        self.rate = rate
+        self.kapasitet = kapasitet
+        self.tokens = kapasitet
+        self.sist = time.monotonic()
+        self._laas = asyncio.Lock()
+
+    async def vent(self):
+        async with self._laas:
+            while True:
+                naa = time.monotonic()
+                self.tokens = min(self.kapasitet, self.tokens + (naa - self.sist) * self.rate)
+                self.sist = naa
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def host_for(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class HostBegrenser:
+    def __init__(self):
+        self._semafor = asyncio.Semaphore(CONFIG["max_concurrent_requests"])
+        self._botter = {}
+
+    def _botte(self, host: str) -> TokenBotte:
+        if host not in self._botter:
+            rate = CONFIG["host_rate_limits"].get(host, 1 / CONFIG["rate_limit_delay"])
+            self._botter[host] = TokenBotte(rate, CONFIG["host_burst"])
+        return self._botter[host]
+
+    @asynccontextmanager
+    async def plass(self, url: str):
+        # Vent på hostens token før vi tar en plass, så en treg host ikke blokkerer de andre
+        await self._botte(host_for(url)).vent()
+        async with self._semafor:
+            yield
+
+
+# --- LAGRING ---
+
+def skriv_atomisk(sti: str, data: bytes):
+    # Skriv til en midlertidig fil og bytt navn, så en avbrutt kjøring aldri etterlater en halv fil
+    midlertidig = sti + ".tmp"
+    with open(midlertidig, 'wb') as f:
+        f.write(data)
+    os.replace(midlertidig, sti)
+
+
+class SnapshotLager:
+    # Fulle normaliserte lovtekster, gzip-komprimert og adressert med sha256 av teksten
+    def __init__(self, mappe: str):
+        self.mappe = mappe
+
+    def _sti(self, tekst_hash: str) -> str:
+        return os.path.join(self.mappe, tekst_hash[:2], tekst_hash[2:] + ".txt.gz")
+
+    def finnes(self, tekst_hash: str) -> bool:
+        return bool(tekst_hash) and os.path.exists(self._sti(tekst_hash))
+
+    def lagre(self, tekst: str) -> str:
+        tekst_hash = hashlib.sha256(tekst.encode()).hexdigest()
+        if self.finnes(tekst_hash):
+            return tekst_hash
+        sti = self._sti(tekst_hash)
+        os.makedirs(os.path.dirname(sti), exist_ok=True)
+        skriv_atomisk(sti, gzip.compress(tekst.encode(), mtime=0))
+        return tekst_hash
+
+    def hent(self, tekst_hash: str) -> Optional[str]:
+        if not self.finnes(tekst_hash):
+            return None
+        try:
+            with open(self._sti(tekst_hash), 'rb') as f:
+                return gzip.decompress(f.read()).decode()
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            logger.warning(f"Kunne ikke lese snapshot {tekst_hash[:12]}: {e}")
+            return None
+
+    def rydd(self, beholdes: set) -> int:
+        if not os.path.isdir(self.mappe):
+            return 0
+        slettet = 0
+        for undermappe in os.listdir(self.mappe):
+            sti = os.path.join(self.mappe, undermappe)
+            if not os.path.isdir(sti):
+                continue
+            for filnavn in os.listdir(sti):
+                if undermappe + filnavn.split(".")[0] not in beholdes:
+                    os.remove(os.path.join(sti, filnavn))
+                    slettet += 1
+            if not os.listdir(sti):
+                os.rmdir(sti)
+        return slettet
+
+
+def snapshots_som_beholdes(lover: dict) -> set:
+    grense = datetime.now().timestamp() - CONFIG["snapshot_max_age_days"] * 86400
+    beholdes = set()
+    for oppforing in lover.values():
+        for nokkel in ("hash", "raa_hash"):
+            if oppforing.get(nokkel):
+                beholdes.add(oppforing[nokkel])
+        for versjon in oppforing.get("historikk", [])[-CONFIG["snapshot_keep_versions"]:]:
+            if datetime.fromisoformat(versjon["fra"]).timestamp() >= grense:
+                beholdes.add(versjon["hash"])
+    return beholdes
+
+
+SPORINGSPARAMETRE = ("utm_", "fbclid", "gclid", "mc_")
+
+
+def normaliser_lenke(url: str) -> str:
+    deler = urlsplit(url.strip())
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(deler.query, keep_blank_values=True)
+        if not k.lower().startswith(SPORINGSPARAMETRE)
+    ))
+    return urlunsplit((deler.scheme.lower(), deler.netloc.lower(), deler.path.rstrip("/") or "/", query, ""))
+
+
+def rydd_tidsindeks(data: dict) -> int:
+    # Felles for indeksene i cachen (nøkkel -> sist sett): utløpte oppføringer fjernes først,
+    # deretter de eldste til antallet er under taket
+    grense = datetime.now().timestamp() - CONFIG["rss_seen_ttl_days"] * 86400
+    utlopt = [n for n, t in data.items() if datetime.fromisoformat(t).timestamp() < grense]
+    for n in utlopt:
+        del data[n]
+    overskudd = len(data) - CONFIG["rss_seen_max_entries"]
+    if overskudd > 0:
+        for n in sorted(data, key=data.get)[:overskudd]:
+            del data[n]
+    return len(utlopt) + max(overskudd, 0)
+
+
+class SettIndeks:
+    # Nøkkel -> sist sett (ISO-tid). Lever i cachen, så samme nyhet rapporteres bare én gang
+    def __init__(self, data: dict):
+        self.data = data
+
+    @staticmethod
+    def nokler(link: str, guid: str) -> list:
+        nokler = []
+        if link:
+            nokler.append("l:" + normaliser_lenke(link))
+        if guid and guid != link:
+            nokler.append("g:" + guid.strip())
+        return nokler
+
+    def er_sett(self, nokler: list) -> bool:
+        return any(n in self.data for n in nokler)
+
+    def merk(self, nokler: list, tidspunkt: str):
+        for n in nokler:
+            self.data[n] = tidspunkt
+
+    def rydd(self) -> int:
+        return rydd_tidsindeks(self.data)
+
+
+def simhash(tekst: str) -> str:
+    # 64-bits SimHash over ordene: nesten like tekster får fingeravtrykk med få ulike bit.
+    # Ordpar er utelatt; i korte nyhetstekster gjør de en omskrevet tittel til et helt nytt avtrykk.
+    ordene = re.findall(r"\w+", re.sub(r"<[^>]+>", " ", tekst).lower())
+    if not ordene:
+        return ""
+    summer = [0] * 64
+    for t in ordene:
+        verdi = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            summer[bit] += 1 if verdi >> bit & 1 else -1
+    return format(sum(1 << bit for bit in range(64) if summer[bit] > 0), "016x")
+
+
+class LikhetsIndeks:
+    # SimHash -> sist sett (ISO-tid), i cachen ved siden av SettIndeks. Fingeravtrykket deles i
+    # avstand + 1 bånd; to avtrykk med høyst avstand ulike bit er like i minst ett bånd, så
+    # oppslag går via båndene i stedet for å sammenligne med alle tidligere nyheter.
+    def __init__(self, data: dict):
+        self.data = data
+        self.avstand = CONFIG["rss_near_duplicate_distance"]
+        self.bredde = 64 // (self.avstand + 1)
+        self._botter = None
+
+    def _baand(self, verdi: int) -> list:
+        maske = (1 << self.bredde) - 1
+        return [(i, verdi >> (i * self.bredde) & maske) for i in range(self.avstand + 1)]
+
+    def _bygg(self):
+        if self._botter is None:
+            self._botter = {}
+            for avtrykk in self.data:
+                for baand in self._baand(int(avtrykk, 16)):
+                    self._botter.setdefault(baand, set()).add(avtrykk)
+
+    def finn(self, avtrykk: str) -> Optional[str]:
+        if not avtrykk:
+            return None
+        self._bygg()
+        verdi = int(avtrykk, 16)
+        for baand in self._baand(verdi):
+            for kandidat in self._botter.get(baand, ()):
+                if kandidat in self.data and bin(verdi ^ int(kandidat, 16)).count("1") <= self.avstand:
+                    return kandidat
+        return None
+
+    def merk(self, avtrykk: str, tidspunkt: str):
+        if not avtrykk:
+            return
+        self._bygg()
+        self.data[avtrykk] = tidspunkt
+        for baand in self._baand(int(avtrykk, 16)):
+            self._botter.setdefault(baand, set()).add(avtrykk)
+
+    def rydd(self) -> int:
+        fjernet = rydd_tidsindeks(self.data)
+        if fjernet:
+            # Båndene bygges på nytt ved neste oppslag, uten de fjernede avtrykkene
+            self._botter = None
+        return fjernet
+
+
+def slaa_sammen_nyhet(klynge: dict, nyhet: dict):
+    # Tar imot funn som dict (vars() av et Funn eller fra en rapport) og samler kildene i klyngen
+    kilder = klynge.get("kilder") or [{"kilde": klynge["kilde"], "url": klynge["url"]}]
+    for kilde in nyhet.get("kilder") or [{"kilde": nyhet["kilde"], "url": nyhet["url"]}]:
+        if kilde not in kilder:
+            kilder.append(kilde)
+    klynge["kilder"] = kilder
+
+
+def last_cache(sti: str) -> dict:
+    if os.path.exists(sti):
+        try:
+            with open(sti, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Kunne ikke laste cache: {e}")
+    return {"lover": {}, "siste_kjoring": None}
+
+
+def lagre_cache(cache: dict, snapshots: SnapshotLager, sti: str, rydd_snapshots: bool = True):
+    cache["siste_kjoring"] = datetime.now().isoformat()
+    for oppforing in cache.get("lover", {}).values():
+        # Eldre cache-formater hadde avkortet tekst inline; den trengs ikke når snapshotet finnes
+        if "tekst" in oppforing and snapshots.finnes(oppforing.get("hash")):
+            del oppforing["tekst"]
+    if rydd_snapshots:
+        try:
+            slettet = snapshots.rydd(snapshots_som_beholdes(cache.get("lover", {})))
+            if slettet:
+                logger.info(f"Ryddet {slettet} gamle snapshots")
+        except OSError as e:
+            logger.warning(f"Kunne ikke rydde snapshots: {e}")
+    SettIndeks(cache.setdefault("rss_sett", {})).rydd()
+    LikhetsIndeks(cache.setdefault("rss_likhet", {})).rydd()
+    try:
+        skriv_atomisk(sti, json.dumps(cache, indent=2, ensure_ascii=False).encode("utf-8"))
+    except Exception as e:
+        logger.error(f"Kunne ikke lagre cache: {e}")
+
+
+class Sjekkpunkt:
+    # Ferdige kilder lagres fortløpende, én fil per kilde, så en avbrutt kjøring kan fortsette
+    def __init__(self, mappe: str):
+        self.mappe = mappe
+
+    def _sti(self, type_: str, navn: str) -> str:
+        return os.path.join(self.mappe, type_ + "-" + hashlib.sha256(navn.encode("utf-8")).hexdigest()[:24] + ".json")
+
+    def start(self, fortsett: bool) -> dict:
+        start_fil = os.path.join(self.mappe, "kjoring.json")
+        if fortsett and os.path.exists(start_fil):
+            with open(start_fil, 'r', encoding='utf-8') as f:
+                startet = datetime.fromisoformat(json.load(f)["startet"])
+            if (datetime.now() - startet).total_seconds() <= CONFIG["checkpoint_window_hours"] * 3600:
+                lagret = self._last_alle()
+                logger.info(f"Fortsetter kjøring fra {startet.isoformat()}: {len(lagret)} kilder ferdige")
+                return lagret
+            logger.info("Sjekkpunktene er for gamle, starter en ny kjøring")
+        elif fortsett:
+            logger.info("Fant ingen avbrutt kjøring å fortsette")
+        self.fjern()
+        os.makedirs(self.mappe, exist_ok=True)
+        skriv_atomisk(start_fil, json.dumps({"startet": datetime.now().isoformat()}).encode("utf-8"))
+        return {}
+
+    def _last_alle(self) -> dict:
+        lagret = {}
+        for filnavn in sorted(os.listdir(self.mappe)):
+            if filnavn == "kjoring.json" or not filnavn.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.mappe, filnavn), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                lagret[(data["type"], data["kilde"])] = data
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Hopper over ødelagt sjekkpunkt {filnavn}: {e}")
+        return lagret
+
+    def lagre(self, type_: str, navn: str, data: dict):
+        try:
+            skriv_atomisk(self._sti(type_, navn),
+                          json.dumps({"type": type_, "kilde": navn, **data}, ensure_ascii=False).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Kunne ikke lagre sjekkpunkt for {navn}: {e}")
+
+    def fjern(self):
+        if not os.path.isdir(self.mappe):
+            return
+        for filnavn in os.listdir(self.mappe):
+            os.remove(os.path.join(self.mappe, filnavn))
+        os.rmdir(self.mappe)
+
+
+# --- HISTORIKK ---
+
+HISTORIKK_SKJEMA = """
+CREATE TABLE IF NOT EXISTS kjoringer (
+    id INTEGER PRIMARY KEY,
+    tidspunkt TEXT NOT NULL,
+    statistikk TEXT NOT NULL,
+    feil TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS funn (
+    id INTEGER PRIMARY KEY,
+    kjoring_id INTEGER NOT NULL REFERENCES kjoringer(id),
+    tidspunkt TEXT NOT NULL,
+    type TEXT NOT NULL,
+    kilde TEXT NOT NULL,
+    kategori TEXT NOT NULL,
+    tittel TEXT NOT NULL,
+    url TEXT NOT NULL,
+    endring_prosent REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS endringer (
+    funn_id INTEGER NOT NULL REFERENCES funn(id),
+    nr INTEGER NOT NULL,
+    tekst TEXT NOT NULL,
+    PRIMARY KEY (funn_id, nr)
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    funn_id INTEGER NOT NULL REFERENCES funn(id),
+    keyword TEXT NOT NULL,
+    kategori TEXT NOT NULL,
+    antall INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS funn_tid ON funn (tidspunkt);
+CREATE INDEX IF NOT EXISTS funn_kilde_tid ON funn (kilde, tidspunkt);
+CREATE INDEX IF NOT EXISTS funn_kategori_tid ON funn (kategori, tidspunkt);
+CREATE INDEX IF NOT EXISTS funn_kjoring ON funn (kjoring_id);
+CREATE INDEX IF NOT EXISTS keywords_keyword ON keywords (keyword, funn_id);
+"""
+
+
+class HistorikkLager:
+    # Alle kjøringer og funn i én SQLite-fil. Det skrives bare nye rader, og søk går via indeksene.
+    def __init__(self, sti: str):
+        import sqlite3
+        self.db = sqlite3.connect(sti)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(HISTORIKK_SKJEMA)
+
+    def lukk(self):
+        self.db.close()
+
+    def lagre_rapport(self, rapport: dict) -> int:
+        statistikk = {n: v for n, v in rapport["statistikk"].items() if n != "ytelse"}
+        with self.db:
+            kjoring_id = self.db.execute(
+                "INSERT INTO kjoringer (tidspunkt, statistikk, feil) VALUES (?, ?, ?)",
+                (rapport["tidspunkt"], json.dumps(statistikk, ensure_ascii=False),
+                 json.dumps(rapport["feil"], ensure_ascii=False))
+            ).lastrowid
+            for f in rapport["lovendringer"] + rapport["nyheter"]:
+                funn_id = self.db.execute(
+                    "INSERT INTO funn (kjoring_id, tidspunkt, type, kilde, kategori, tittel, url, endring_prosent, data)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kjoring_id, rapport["tidspunkt"], f["type"], f["kilde"], f["kategori"], f["tittel"],
+                     f["url"], f.get("endring_prosent", 0.0), json.dumps(f, ensure_ascii=False))
+                ).lastrowid
+                self.db.executemany("INSERT INTO endringer (funn_id, nr, tekst) VALUES (?, ?, ?)",
+                                    [(funn_id, nr, tekst) for nr, tekst in enumerate(f.get("endringer", []))])
+                treff = f.get("keyword_treff") or {f["kategori"]: {kw: 1 for kw in f.get("keywords", [])}}
+                self.db.executemany("INSERT INTO keywords (funn_id, keyword, kategori, antall) VALUES (?, ?, ?, ?)",
+                                    [(funn_id, kw.lower(), kategori, antall)
+                                     for kategori, ord_ in treff.items() for kw, antall in ord_.items()])
+        return kjoring_id
+
+    def sok(self, kilde: Optional[str] = None, kategori: Optional[str] = None, keyword: Optional[str] = None,
+            fra: Optional[str] = None, til: Optional[str] = None, type_: Optional[str] = None,
+            grense: Optional[int] = None) -> list:
+        vilkar, parametre = [], []
+        for kolonne, verdi in (("kilde", kilde), ("kategori", kategori), ("type", type_)):
+            if verdi:
+                vilkar.append(f"f.{kolonne} = ?")
+                parametre.append(verdi)
+        if fra:
+            vilkar.append("f.tidspunkt >= ?")
+            parametre.append(fra)
+        if til:
+            vilkar.append("f.tidspunkt < ?")
+            parametre.append(til)
+        if keyword:
+            vilkar.append("f.id IN (SELECT funn_id FROM keywords WHERE keyword = ?)")
+            parametre.append(keyword.lower())
+        sql = "SELECT f.tidspunkt, f.data FROM funn f"
+        if vilkar:
+            sql += " WHERE " + " AND ".join(vilkar)
+        sql += " ORDER BY f.tidspunkt DESC, f.id"
+        if grense:
+            sql += " LIMIT ?"
+            parametre.append(grense)
+        return [{"tidspunkt": rad["tidspunkt"], **json.loads(rad["data"])}
+                for rad in self.db.execute(sql, parametre)]
+
+    def siste_kjoring(self) -> Optional[int]:
+        rad = self.db.execute("SELECT MAX(id) FROM kjoringer").fetchone()
+        return rad[0]
+
+    def rapport(self, kjoring_id: int) -> Optional[dict]:
+        # Gjenskaper rapporten slik main() tidligere skrev den til lovradar_rapport_*.json
+        kjoring = self.db.execute("SELECT * FROM kjoringer WHERE id = ?", (kjoring_id,)).fetchone()
+        if kjoring is None:
+            return None
+        funn = [json.loads(rad["data"]) for rad in
+                self.db.execute("SELECT data FROM funn WHERE kjoring_id = ? ORDER BY id", (kjoring_id,))]
+        return {
+            "tidspunkt": kjoring["tidspunkt"],
+            "lovendringer": [f for f in funn if f["type"] == "lov"],
+            "nyheter": [f for f in funn if f["type"] == "rss"],
+            "feil": json.loads(kjoring["feil"]),
+            "statistikk": json.loads(kjoring["statistikk"]),
+        }
+
+
+RELATIV_TID_MONSTER = re.compile(r'^(\d+)([dmy])$')
+
+
+def les_tidspunkt(verdi: str) -> str:
+    # ISO-dato eller relativ tid bakover: 30d, 6m, 1y
+    treff = RELATIV_TID_MONSTER.match(verdi.strip().lower())
+    if treff:
+        dager = int(treff.group(1)) * {"d": 1, "m": 30, "y": 365}[treff.group(2)]
+        return (datetime.now() - timedelta(days=dager)).isoformat()
+    try:
+        return datetime.fromisoformat(verdi).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ugyldig tidspunkt '{verdi}', forventet ISO-dato eller f.eks. 30d, 6m, 1y")
+
+
+def lagre_i_historikk(rapport: dict):
+    try:
+        historikk = HistorikkLager(CONFIG["history_db"])
+        try:
+            kjoring_id = historikk.lagre_rapport(rapport)
+        finally:
+            historikk.lukk()
+        logger.info(f"Kjøring {kjoring_id} lagret i {CONFIG['history_db']}")
+    except Exception as e:
+        logger.error(f"Kunne ikke lagre historikk: {e}")
+
+
+def kjor_historikk(args: argparse.Namespace):
+    historikk = HistorikkLager(CONFIG["history_db"])
+    try:
+        for sti in args.importer:
+            with open(sti, 'r', encoding='utf-8') as f:
+                historikk.lagre_rapport(json.load(f))
+            logger.info(f"Importert: {sti}")
+        if args.eksport:
+            kjoring_id = args.kjoring or historikk.siste_kjoring()
+            rapport = historikk.rapport(kjoring_id) if kjoring_id else None
+            if rapport is None:
+                logger.error("Fant ingen kjøring å eksportere")
+                return
+            skriv_rapport(rapport, args.eksport)
+        if args.sok:
+            treff = historikk.sok(args.lov, args.kategori, args.keyword, args.fra, args.til, args.type, args.grense)
+            if args.format == "json":
+                print(json.dumps(treff, indent=2, ensure_ascii=False))
+                return
+            for f in treff:
+                endring = f"{f['endring_prosent']:>6.1f}%" if f["type"] == "lov" else "  nyhet"
+                print(f"{f['tidspunkt'][:10]}  {f['kategori']:<7} {endring}  {f['kilde']}: {f['tittel']}"
+                      + (f"  [{', '.join(f['keywords'])}]" if f.get("keywords") else ""))
+            print(f"{len(treff)} funn")
+    finally:
+        historikk.lukk()
+
+
+# --- SKANNEPLAN ---
+
+def forventet_endringsrate(oppforing: dict, naa: datetime) -> float:
+    # Endringer per dag. Prioren (én endring per poll_prior_days) hindrer at en ny
+    # kilde uten observerte endringer regnes som helt stabil.
+    historikk = oppforing.get("historikk", [])
+    forst_sett = oppforing.get("forst_sett") or (historikk[0]["fra"] if historikk else None)
+    dager = max((naa - datetime.fromisoformat(forst_sett)).total_seconds() / 86400, 0) if forst_sett else 0
+    endringer = max(len(historikk) - 1, 0)
+    return (endringer + 1) / (dager + CONFIG["poll_prior_days"])
+
+
+def skanneintervall(oppforing: dict, kategori: str, naa: datetime) -> float:
+    prioritet = CONFIG["category_priority"].get(kategori, 1.0)
+    dager = CONFIG["poll_change_fraction"] / forventet_endringsrate(oppforing, naa) / prioritet
+    # sist_sjekket skrives midt i en kjøring, og neste planlagte kjøring kan starte litt før
+    # samme klokkeslett. Uten margin ville en kilde på taket vente en hel kjøring for lenge.
+    tak = CONFIG["poll_max_staleness_days"] * 86400 - CONFIG["poll_run_margin_hours"] * 3600
+    return min(max(dager * 86400, CONFIG["poll_min_interval_hours"] * 3600), tak)
+
+
+def er_forfalt(oppforing: Optional[dict], kategori: str, naa: datetime) -> bool:
+    if not oppforing or not oppforing.get("sist_sjekket"):
+        return True
+    sist = datetime.fromisoformat(oppforing["sist_sjekket"])
+    return (naa - sist).total_seconds() >= skanneintervall(oppforing, kategori, naa)
+
+
+def rss_forfalt(oppforing: Optional[dict], naa: datetime) -> bool:
+    if not oppforing or not oppforing.get("sist_sjekket"):
+        return True
+    sist = datetime.fromisoformat(oppforing["sist_sjekket"])
+    return (naa - sist).total_seconds() >= CONFIG["rss_poll_interval_hours"] * 3600
+
+
+def kildefingeravtrykk(lover: list, rss_kilder: list) -> str:
+    # Endres overvåkningslisten eller skanneplanens innstillinger, kan ikke planfilen brukes
+    innhold = [[asdict(lov) for lov in lover], [asdict(rss) for rss in rss_kilder],
+               {n: v for n, v in CONFIG.items() if n.startswith(("poll_", "rss_poll_", "category_"))}]
+    return hashlib.sha256(json.dumps(innhold, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+# --- LOVDATA DATAPAKKER ---
+
+LOVDATA_URL_MONSTER = re.compile(r'/dokument/(NL|SF|LF)/(?:lov|forskrift)/(\d{4})-(\d{2})-(\d{2})-(\d+)', re.IGNORECASE)
+LOVDATA_FIL_MONSTER = re.compile(r'(?:^|/)(nl|sf|lf)-(\d{8})-(\d+)[^/]*$', re.IGNORECASE)
+TITTEL_MONSTER = re.compile(rb'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+
+def lovdata_nokkel(url: str) -> Optional[tuple]:
+    treff = LOVDATA_URL_MONSTER.search(url)
+    if not treff:
+        return None
+    return treff.group(1).lower(), treff.group(2) + treff.group(3) + treff.group(4), int(treff.group(5))
+
+
+def lovdata_nokkel_fra_filnavn(filnavn: str) -> Optional[tuple]:
+    # Filene i datapakkene heter f.eks. nl-20020621-034.xml; nummeret kan være nullutfylt
+    treff = LOVDATA_FIL_MONSTER.search(filnavn)
+    if not treff:
+        return None
+    return treff.group(1).lower(), treff.group(2), int(treff.group(3))
+
+
+def lovdata_url(nokkel: tuple) -> str:
+    dokumenttype, dato, nummer = nokkel
+    sti = "lov" if dokumenttype == "nl" else "forskrift"
+    return (f"https://lovdata.no/dokument/{dokumenttype.upper()}/{sti}/"
+            f"{dato[:4]}-{dato[4:6]}-{dato[6:]}-{nummer}")
+
+
+def aapne_bulk_kilde(kilde: str):
+    if kilde.startswith(("http://", "https://")):
+        import urllib.request
+        foresporsel = urllib.request.Request(kilde, headers={"User-Agent": CONFIG["user_agent"]})
+        return urllib.request.urlopen(foresporsel, timeout=CONFIG["request_timeout"])
+    return open(kilde, 'rb')
+
+
+class LesingAvbrutt(Exception):
+    # Leseren av datapakken stoppes fordi ingen lenger tar imot dokumentene
+    pass
+
+
+def les_lovdata_arkiv(fil, onsket: Optional[set], lever):
+    # Strømmende modus ("r|*"): arkivet leses sekvensielt og pakkes aldri ut på disk
+    import tarfile
+    with tarfile.open(fileobj=fil, mode="r|*") as tar:
+        for medlem in tar:
+            if not medlem.isfile():
+                continue
+            nokkel = lovdata_nokkel_fra_filnavn(medlem.name)
+            if nokkel is None or (onsket is not None and nokkel not in onsket):
+                continue
+            lever(nokkel, tar.extractfile(medlem).read())
+
+
+# --- SHARDING ---
+
+SHARD_FIL_MONSTER = re.compile(r'\.shard-(\d+)-av-(\d+)$')
+
+
+def i_shard(navn: str, shard: tuple) -> bool:
+    # Stabil fordeling på tvers av prosesser og maskiner (hash() er randomisert per prosess)
+    indeks, antall = shard
+    verdi = int.from_bytes(hashlib.sha256(navn.encode("utf-8")).digest()[:8], "big")
+    return verdi % antall == indeks - 1
+
+
+def les_shard(verdi: str) -> tuple:
+    try:
+        indeks, antall = (int(d) for d in verdi.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ugyldig shard '{verdi}', forventet i/n")
+    if not 1 <= indeks <= antall:
+        raise argparse.ArgumentTypeError(f"Ugyldig shard '{verdi}', i må være mellom 1 og n")
+    return indeks, antall
+
+
+def shard_fil(sti: str, shard: tuple) -> str:
+    rot, endelse = os.path.splitext(sti)
+    return f"{rot}.shard-{shard[0]}-av-{shard[1]}{endelse}"
+
+
+def finn_shard_filer(sti: str) -> dict:
+    rot, endelse = os.path.splitext(sti)
+    filer = {}
+    for kandidat in glob.glob(glob.escape(rot) + ".shard-*-av-*" + glob.escape(endelse)):
+        treff = SHARD_FIL_MONSTER.search(os.path.splitext(kandidat)[0])
+        if treff:
+            filer[(int(treff.group(1)), int(treff.group(2)))] = kandidat
+    return filer
+
+
+def flett_cache(cache: dict, deler: list, duplikater: list = ()) -> dict:
+    cache.setdefault("lover", {})
+    sett = cache.setdefault("rss_sett", {})
+    likhet = cache.setdefault("rss_likhet", {})
+    for del_ in deler:
+        cache["lover"].update(del_.get("lover", {}))
+        for indeks, data in ((sett, del_.get("rss_sett", {})), (likhet, del_.get("rss_likhet", {}))):
+            for nokkel, tidspunkt in data.items():
+                if tidspunkt > indeks.get(nokkel, ""):
+                    indeks[nokkel] = tidspunkt
+        for navn, oppforing in del_.get("rss_kilder", {}).items():
+            if oppforing["sist_sjekket"] > cache.setdefault("rss_kilder", {}).get(navn, {}).get("sist_sjekket", ""):
+                cache["rss_kilder"][navn] = oppforing
+    # Alle shardene startet fra samme relevansstatistikk; det hver av dem har lagt til, summeres
+    grunnlag = cache.get("relevans", {})
+    relevans = {"dokumenter": grunnlag.get("dokumenter", 0), "ord": grunnlag.get("ord", 0),
+                "df": dict(grunnlag.get("df", {}))}
+    for del_ in deler:
+        statistikk = del_.get("relevans", {})
+        for navn in ("dokumenter", "ord"):
+            relevans[navn] += max(statistikk.get(navn, 0) - grunnlag.get(navn, 0), 0)
+        for kw, n in statistikk.get("df", {}).items():
+            relevans["df"][kw] = relevans["df"].get(kw, 0) + max(n - grunnlag.get("df", {}).get(kw, 0), 0)
+    # En nyhet fra flere shards ble talt i hver av dem, men er ett funn etter flettingen
+    for f in duplikater:
+        relevans["dokumenter"] = max(relevans["dokumenter"] - 1, 0)
+        relevans["ord"] = max(relevans["ord"] - max(f.get("ord_antall", 0), 1), 0)
+        for kw in ordtelling(f.get("keyword_treff") or {}):
+            if relevans["df"].get(kw):
+                relevans["df"][kw] -= 1
+    if relevans["dokumenter"]:
+        cache["relevans"] = relevans
+    return cache
+
+
+def flett_rapporter(deler: list, lover: Optional[list] = None, rss_kilder: Optional[list] = None) -> tuple:
+    # Gir den flettede rapporten og nyhetene som ble slått sammen med et funn fra en annen shard
+    lov_rekkefolge = {lov.navn: i for i, lov in enumerate(ALLE_LOVER if lover is None else lover)}
+    rss_rekkefolge = {rss.navn: i for i, rss in enumerate(RSS_KILDER if rss_kilder is None else rss_kilder)}
+    lovendringer = sorted((f for d in deler for f in d["lovendringer"]),
+                          key=lambda f: (lov_rekkefolge.get(f["kilde"], len(lov_rekkefolge)), f["kilde"]))
+    nyheter = []
+    duplikater = []
+    sett = {}
+    likhet = LikhetsIndeks({})
+    klynger = {}
+    # Samme eller nesten lik nyhet i feeder på ulike shards gir ett funn, som ved en vanlig kjøring
+    for f in sorted((f for d in deler for f in d["nyheter"]),
+                    key=lambda f: (rss_rekkefolge.get(f["kilde"], len(rss_rekkefolge)), f["kilde"])):
+        nokler = SettIndeks.nokler(f["url"], "")
+        klynge = next((sett[n] for n in nokler if n in sett), None)
+        lik = likhet.finn(f.get("simhash", "")) if klynge is None else None
+        if klynge is None and lik:
+            klynge = klynger[lik]
+        if klynge is not None:
+            slaa_sammen_nyhet(klynge, f)
+            duplikater.append(f)
+        else:
+            nyheter.append(f)
+            klynge = f
+            if f.get("simhash"):
+                likhet.merk(f["simhash"], "")
+                klynger[f["simhash"]] = f
+        for n in nokler:
+            sett.setdefault(n, klynge)
+    statistikk = {}
+    for d in deler:
+        for navn, verdi in d["statistikk"].items():
+            if isinstance(verdi, int):
+                statistikk[navn] = statistikk.get(navn, 0) + verdi
+    statistikk["lovendringer_funnet"] = len(lovendringer)
+    statistikk["nyheter_funnet"] = len(nyheter)
+    return {
+        "tidspunkt": max(d["tidspunkt"] for d in deler),
+        "lovendringer": lovendringer,
+        "nyheter": nyheter,
+        "feil": [feil for d in deler for feil in d["feil"]],
+        "statistikk": statistikk,
+    }, duplikater
+
+
+def flett_shards(maaler: Maaler, lover: Optional[list] = None, rss_kilder: Optional[list] = None) -> Optional[dict]:
+    rapportfiler = finn_shard_filer(CONFIG["shard_report_file"])
+    if not rapportfiler:
+        logger.error("Fant ingen shard-rapporter å flette")
+        return None
+    antall = max(n for _, n in rapportfiler)
+    mangler = [i for i in range(1, antall + 1) if (i, antall) not in rapportfiler]
+    deler = []
+    for shard in sorted(s for s in rapportfiler if s[1] == antall):
+        with open(rapportfiler[shard], 'r', encoding='utf-8') as f:
+            deler.append(json.load(f))
+    rapport, duplikater = flett_rapporter(deler, lover, rss_kilder)
+    for del_ in deler:
+        maaler.legg_til(del_["statistikk"]["ytelse"])
+    rapport["statistikk"]["ytelse"] = maaler.som_dict()
+    rapport["statistikk"]["shards"] = antall
+    for i in mangler:
+        logger.error(f"Mangler shard {i}/{antall}")
+        rapport["feil"].append(f"Mangler resultat fra shard {i}/{antall}")
+
+    cachefiler = finn_shard_filer(CONFIG["cache_file"])
+    cache_deler = [last_cache(cachefiler[s]) for s in sorted(cachefiler) if s[1] == antall]
+    cache = flett_cache(last_cache(CONFIG["cache_file"]), cache_deler, duplikater)
+    lagre_cache(cache, SnapshotLager(CONFIG["snapshot_dir"]), CONFIG["cache_file"])
+    # Gjenstående planfiler fra shards fjernes; skanneplanen skrives for hele overvåkningslisten
+    planfiler = finn_shard_filer(CONFIG["plan_file"])
+    for sti in list(rapportfiler.values()) + list(cachefiler.values()) + list(planfiler.values()):
+        os.remove(sti)
+    LovRadar(lover, rss_kilder).lagre_plan()
+    logger.info(f"Flettet {len(deler)} av {antall} shards")
+    return rapport
 
 
 # --- HOVEDMOTOR ---
 
+def ny_http_session():
+    import aiohttp
+    headers = {"User-Agent": CONFIG["user_agent"]}
+    connector = aiohttp.TCPConnector(limit=CONFIG["max_concurrent_requests"])
+    return aiohttp.ClientSession(headers=headers, connector=connector)
+
+
 class LovRadar:
-    def __init__(self):
+    def __init__(self, lover: Optional[list] = None, rss_kilder: Optional[list] = None,
+                 bulk_kilder: Optional[list] = None, bulk_alle: bool = False,
+                 shard: Optional[tuple] = None, alle: bool = False, fortsett: bool = False):
+        self.shard = shard
+        self.alle = alle
+        self.fortsett = fortsett
+        self.lover = ALLE_LOVER if lover is None else lover
+        self.rss_kilder = RSS_KILDER if rss_kilder is None else rss_kilder
+        if shard:
+            self.lover = [lov for lov in self.lover if i_shard(lov.navn, shard)]
+            self.rss_kilder = [rss for rss in self.rss_kilder if i_shard(rss.navn, shard)]
+        self.cache_fil = shard_fil(CONFIG["cache_file"], shard) if shard else CONFIG["cache_file"]
+        self.bulk_kilder = bulk_kilder or []
+        self.bulk_alle = bulk_alle
         self.cache = self._last_cache()
+        self.snapshots = SnapshotLager(CONFIG["snapshot_dir"])
+        self.sjekkpunkt = Sjekkpunkt(shard_fil(CONFIG["checkpoint_dir"], shard) if shard else CONFIG["checkpoint_dir"])
+        self.gjenopptatt = {}
+        self.sett = SettIndeks(self.cache.setdefault("rss_sett", {}))
+        self.likhet = LikhetsIndeks(self.cache.setdefault("rss_likhet", {}))
+        self.begrenser = None
+        self.matcher = NokkelordMatcher(KEYWORDS)
+        self.motor = "bs4"
+        self.prosesspool = None
+        self._nullstill()
+
+    def _nullstill(self):
+        # Tilstand for én kjøring; cache, matcher og prosesspool overlever mellom kjøringer i daemon-modus
         self.funn = []
         self.feil = []
+        self.revalidert = 0
+        self.lover_sjekket = 0
+        self.lover_utsatt = 0
+        self.rss_sjekket = 0
+        self.maaler = Maaler()
 
     def _last_cache(self) -> dict:
-        if os.path.exists(CONFIG["cache_file"]):
-            try:
-                with open(CONFIG["cache_file"], 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"Kunne ikke laste cache: {e}")
-        return {"lover": {}, "siste_kjoring": None}
+        cache = last_cache(CONFIG["cache_file"])
+        if self.shard:
+            cache["lover"] = {navn: oppforing for navn, oppforing in cache.get("lover", {}).items()
+                              if i_shard(navn, self.shard)}
+        return cache
 
     def _lagre_cache(self):
-        self.cache["siste_kjoring"] = datetime.now().isoformat()
+        # En shard kjenner bare sine egne lover; snapshots ryddes og skanneplanen
+        # skrives når shardene flettes
+        lagre_cache(self.cache, self.snapshots, self.cache_fil, rydd_snapshots=self.shard is None)
+        if not self.shard:
+            self.lagre_plan()
+
+    def lagre_plan(self):
+        # lovradar_plan.py leser planen uten å laste denne modulen; "standard" sier at den gjelder
+        # overvåkningslisten i koden, og kodens hash fanger endringer i listen og innstillingene
         try:
-            with open(CONFIG["cache_file"], 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Kunne ikke lagre cache: {e}")
-
-    async def _fetch_med_retry(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+            kilder = kildefingeravtrykk(self.lover, self.rss_kilder)
+            plan = {"neste_forfall": self.neste_forfall().isoformat(),
+                    "kilder": kilder,
+                    "standard": kilder == kildefingeravtrykk(ALLE_LOVER, RSS_KILDER),
+                    "kode": lovradar_plan.filhash(lovradar_plan.KODE_FIL),
+                    "cache": self.cache_fil,
+                    "cache_hash": lovradar_plan.filhash(self.cache_fil),
+                    "sjekkpunkt": CONFIG["checkpoint_dir"]}
+            skriv_atomisk(CONFIG["plan_file"], json.dumps(plan).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Kunne ikke lagre skanneplan: {e}")
+
+    def neste_forfall(self) -> datetime:
+        naa = datetime.now()
+        tider = []
+        for lov in self.lover:
+            oppforing = self.cache.get("lover", {}).get(lov.navn)
+            if er_forfalt(oppforing, lov.kategori, naa) or not self.snapshots.finnes(oppforing.get("hash")):
+                return naa
+            tider.append(datetime.fromisoformat(oppforing["sist_sjekket"])
+                         + timedelta(seconds=skanneintervall(oppforing, lov.kategori, naa)))
+        for rss in self.rss_kilder:
+            oppforing = self.cache.get("rss_kilder", {}).get(rss.navn)
+            if rss_forfalt(oppforing, naa):
+                return naa
+            tider.append(datetime.fromisoformat(oppforing["sist_sjekket"])
+                         + timedelta(hours=CONFIG["rss_poll_interval_hours"]))
+        return min(tider, default=naa + timedelta(days=CONFIG["poll_max_staleness_days"]))
+
+    async def _fetch_med_retry(self, session: aiohttp.ClientSession, url: str,
+                               validatorer: Optional[dict] = None, strom: bool = False,
+                               raa: bool = False) -> Optional[HttpSvar]:
+        with self.maaler.fase("fetch", AKTIV_KILDE.get()):
+            return await self._fetch(session, url, validatorer, strom, raa)
+
+    async def _les_innhold(self, response, url: str, parser: Optional[StromParser],
+                           raa: bool = False) -> Optional[tuple]:
+        # Kroppen leses i biter: størrelsen begrenses, hashen regnes ut underveis, og med en
+        # parser mates bitene rett inn i den så hele siden aldri ligger i minnet. Uten parser
+        # holdes hele kroppen, men aldri mer enn max_response_bytes. Med raa dekodes ingenting
+        maks = CONFIG["max_response_bytes"]
+        lengde = response.headers.get("Content-Length", "")
+        if maks and lengde.isdigit() and int(lengde) > maks:
+            logger.warning(f"For stor respons fra {url}: {lengde} bytes (maks {maks})")
+            return None
+        sha = hashlib.sha256()
+        dekoder = None
+        biter = []
+        lest = 0
+        async for bit in response.content.iter_chunked(CONFIG["download_chunk_bytes"]):
+            lest += len(bit)
+            if maks and lest > maks:
+                logger.warning(f"For stor respons fra {url}: over {maks} bytes, avbryter")
+                return None
+            sha.update(bit)
+            if raa:
+                biter.append(bit)
+                continue
+            if dekoder is None:
+                # Første bit rommer <meta charset> når headeren ikke har tegnsettet
+                dekoder = codecs.getincrementaldecoder(tegnsett(response.headers, bit))(errors="replace")
+            if parser:
+                parser.feed(dekoder.decode(bit))
+            else:
+                biter.append(dekoder.decode(bit))
+        self.maaler.bytes_lastet_ned += lest
+        if raa:
+            return b"".join(biter), sha.hexdigest()
+        if dekoder is None:
+            dekoder = codecs.getincrementaldecoder(tegnsett(response.headers))(errors="replace")
+        if parser:
+            parser.feed(dekoder.decode(b"", final=True))
+            return parser.resultat(), sha.hexdigest()
+        biter.append(dekoder.decode(b"", final=True))
+        return "".join(biter), sha.hexdigest()
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str,
+                     validatorer: Optional[dict], strom: bool = False, raa: bool = False) -> Optional[HttpSvar]:
+        headers = {}
+        if validatorer:
+            if validatorer.get("etag"):
+                headers["If-None-Match"] = validatorer["etag"]
+            if validatorer.get("last_modified"):
+                headers["If-Modified-Since"] = validatorer["last_modified"]
         for attempt in range(CONFIG["retry_attempts"]):
+            if attempt:
+                self.maaler.forsok_pa_nytt += 1
             try:
-                async with session.get(url, timeout=CONFIG["request_timeout"]) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    elif response.status == 429:
-                        await asyncio.sleep(CONFIG["retry_delay"] * (attempt + 1))
-                    else:
-                        logger.warning(f"HTTP {response.status} for {url}")
-                        return None
+                async with self.begrenser.plass(url):
+                    async with session.get(url, headers=headers, timeout=CONFIG["request_timeout"]) as response:
+                        status = response.status
+                        if status in (200, 304):
+                            tekst, innhold_hash = "", None
+                            if status == 200:
+                                innhold = await self._les_innhold(response, url, StromParser() if strom else None, raa)
+                                if innhold is None:
+                                    return None
+                                tekst, innhold_hash = innhold
+                            return HttpSvar(
+                                status=status,
+                                tekst="" if strom or raa else tekst,
+                                utdrag=tekst if strom and status == 200 else None,
+                                innhold=tekst if raa else b"",
+                                validatorer={
+                                    "etag": response.headers.get("ETag"),
+                                    "last_modified": response.headers.get("Last-Modified"),
+                                    "content_length": response.headers.get("Content-Length"),
+                                    "sha256": innhold_hash,
+                                }
+                            )
+                if status == 429:
+                    self.maaler.http_429 += 1
+                    await asyncio.sleep(CONFIG["retry_delay"] * (attempt + 1))
+                else:
+                    logger.warning(f"HTTP {status} for {url}")
+                    return None
             except asyncio.TimeoutError:
                 logger.warning(f"Timeout for {url} (forsøk {attempt + 1})")
             except Exception as e:
@@ -244,87 +1818,391 @@ class LovRadar:
                 await asyncio.sleep(CONFIG["retry_delay"])
         return None
 
+    async def _ekstraher(self, html: str, dokument: bool = False) -> tuple:
+        # Parsing er CPU-bundet; i prosesspoolen overlapper den med nedlastingene.
+        # Gir (råtekst, normalisert tekst)
+        if self.prosesspool is None:
+            raa = ekstraher_raatekst(html, self.motor, dokument)
+            return raa, normaliser_tekst(raa)
+        loop = asyncio.get_running_loop()
+        raa, tekst, faser = await loop.run_in_executor(self.prosesspool, ekstraher_med_maaling, html, self.motor, dokument)
+        self.maaler.slaa_sammen(faser, AKTIV_KILDE.get())
+        return raa, tekst
+
     async def _skann_lover(self, session: aiohttp.ClientSession):
-        logger.info(f"Skanner {len(ALLE_LOVER)} lovkilder...")
         if "lover" not in self.cache:
             self.cache["lover"] = {}
-        for lov in ALLE_LOVER:
-            await asyncio.sleep(CONFIG["rate_limit_delay"])
-            html = await self._fetch_med_retry(session, lov.url)
-            if not html:
-                self.feil.append(f"Kunne ikke hente: {lov.navn}")
-                continue
-            tekst = ekstraher_lovtekst(html)
-            if not tekst:
-                continue
-            ny_hash = hashlib.sha256(tekst.encode()).hexdigest()
-            if lov.navn in self.cache["lover"]:
-                gammel = self.cache["lover"][lov.navn]
-                if ny_hash != gammel.get("hash"):
-                    endring_prosent, endringer = beregn_endring(
-                        gammel.get("tekst", ""),
-                        tekst
-                    )
-                    if endring_prosent >= CONFIG["change_threshold_percent"]:
-                        self.funn.append(Funn(
-                            type="lov",
-                            kilde=lov.navn,
-                            kategori=lov.kategori,
-                            tittel=lov.navn + " - " + lov.beskrivelse,
-                            url=lov.url,
-                            beskrivelse=lov.beskrivelse,
-                            endring_prosent=endring_prosent,
-                            endringer=endringer
-                        ))
-                        logger.info(f"Endring detektert: {lov.navn} ({endring_prosent}%)")
+        resultater = {}
+        gjenstaende = self.lover
+        if self.bulk_kilder:
+            resultater = await self._skann_bulk()
+            gjenstaende = [lov for lov in self.lover if lov.navn not in resultater]
+        if not self.alle:
+            naa = datetime.now()
+            forfalt = [lov for lov in gjenstaende
+                       if er_forfalt(self.cache["lover"].get(lov.navn), lov.kategori, naa)
+                       or not self.snapshots.finnes(self.cache["lover"][lov.navn].get("hash"))]
+            self.lover_utsatt = len(gjenstaende) - len(forfalt)
+            gjenstaende = forfalt
+        logger.info(f"Skanner {len(gjenstaende)} lovkilder ({self.lover_utsatt} ikke forfalt)...")
+        funn = await asyncio.gather(*(self._skann_lov(session, lov) for lov in gjenstaende))
+        resultater.update((lov.navn, f) for lov, f in zip(gjenstaende, funn))
+        rekkefolge = {lov.navn: i for i, lov in enumerate(self.lover)}
+        self.lover_sjekket = len(self.lover) - self.lover_utsatt + sum(1 for navn in resultater if navn not in rekkefolge)
+        for navn in sorted(resultater, key=lambda n: (rekkefolge.get(n, len(rekkefolge)), n)):
+            if resultater[navn]:
+                self.funn.append(resultater[navn])
+
+    def _ferdig_lov(self, navn: str, funn: Optional[Funn], revalidert: bool = False) -> Optional[Funn]:
+        self.sjekkpunkt.lagre("lov", navn, {
+            "cache": self.cache["lover"].get(navn),
+            "funn": asdict(funn) if funn else None,
+            "revalidert": revalidert,
+        })
+        return funn
+
+    def _gjenopprett_lov(self, lagret: dict) -> Optional[Funn]:
+        # Resultatet fra den avbrutte kjøringen brukes som om kilden var skannet nå
+        if lagret["cache"]:
+            self.cache["lover"][lagret["kilde"]] = lagret["cache"]
+        if lagret["revalidert"]:
+            self.revalidert += 1
+        return Funn(**lagret["funn"]) if lagret["funn"] else None
+
+    async def _skann_lov(self, session: aiohttp.ClientSession, lov: LovKilde) -> Optional[Funn]:
+        AKTIV_KILDE.set(lov.navn)
+        if ("lov", lov.navn) in self.gjenopptatt:
+            return self._gjenopprett_lov(self.gjenopptatt[("lov", lov.navn)])
+        gammel = self.cache["lover"].get(lov.navn)
+        validatorer = None
+        if gammel and self.snapshots.finnes(gammel.get("hash")):
+            # Uten snapshot av baselinen må siden lastes ned på nytt for å lage den
+            validatorer = gammel.get("validatorer")
+        svar = await self._fetch_med_retry(session, lov.url, validatorer, strom=self.motor == "strom")
+        if not svar:
+            self.feil.append(f"Kunne ikke hente: {lov.navn}")
+            return None
+        if svar.status == 304 and gammel:
+            # Uendret siden forrige kjøring: ingen nedlasting, parsing eller diff
+            self.revalidert += 1
+            gammel["sist_sjekket"] = datetime.now().isoformat()
+            return self._ferdig_lov(lov.navn, None, revalidert=True)
+        if (validatorer and validatorer.get("sha256") == svar.validatorer["sha256"]
+                and gammel.get("norm_versjon") == NORMALISERING_VERSJON):
+            # Byte for byte lik forrige versjon (servere uten ETag): ingen parsing eller diff
+            gammel["sist_sjekket"] = datetime.now().isoformat()
+            gammel["validatorer"] = svar.validatorer
+            return self._ferdig_lov(lov.navn, None)
+        if svar.utdrag is not None:
+            raa, tekst = svar.utdrag, normaliser_tekst(svar.utdrag)
+        else:
+            raa, tekst = await self._ekstraher(svar.tekst)
+        if not tekst:
+            return None
+        return self._ferdig_lov(lov.navn, self._behandle_lovtekst(lov, raa, tekst, svar.validatorer, "side"))
+
+    def _behandle_lovtekst(self, lov: LovKilde, raa: str, tekst: str, validatorer: dict,
+                           kildetype: str) -> Optional[Funn]:
+        gammel = self.cache["lover"].get(lov.navn)
+        if gammel and gammel.get("kildetype", "side") != kildetype:
+            # Nettsiden og datapakken gir litt ulik tekst; bytte av kilde er ingen lovendring
+            logger.info(f"Ny baseline for: {lov.navn} (kilde: {kildetype})")
+            gammel = None
+        if gammel and not self.snapshots.finnes(gammel.get("hash")):
+            # Uten snapshot finnes bare den avkortede teksten fra eldre cache-format; en diff mot
+            # den ville meldt alt etter kuttet som lagt til, så baselinen byttes ut uten varsel
+            logger.info(f"Ny baseline for: {lov.navn} (ingen snapshot av forrige versjon)")
+            gammel = None
+        funn = None
+        ny_hash = self.snapshots.lagre(tekst)
+        forrige = self.cache["lover"].get(lov.navn, {})
+        if (forrige.get("hash") == ny_hash and forrige.get("norm_versjon") == NORMALISERING_VERSJON
+                and self.snapshots.finnes(forrige.get("raa_hash"))):
+            # Samme tekst etter normalisering: råteksten fra forrige versjon holder for en senere
+            # ny normalisering, så tidsstempler og sideramme gir ingen nye snapshots
+            raa_hash = forrige["raa_hash"]
+        else:
+            raa_hash = self.snapshots.lagre(raa)
+        historikk = forrige.get("historikk", [])
+        baseline = None
+        if gammel and gammel.get("norm_versjon") != NORMALISERING_VERSJON:
+            # Reglene er endret siden baselinen ble lagret: den normaliseres på nytt fra råteksten,
+            # så bare forskjeller i selve loven gir varsel
+            raa_baseline = self.snapshots.hent(gammel.get("raa_hash"))
+            if raa_baseline is None:
+                logger.info(f"Ny baseline for: {lov.navn} (ingen råtekst å normalisere på nytt)")
+                gammel = None
             else:
-                logger.info(f"Ny baseline for: {lov.navn}")
-            self.cache["lover"][lov.navn] = {
-                "hash": ny_hash,
-                "tekst": tekst[:10000],
-                "sist_sjekket": datetime.now().isoformat(),
-                "kategori": lov.kategori
-            }
-
-    async def _skann_rss(self, session: aiohttp.ClientSession):
-        logger.info(f"Skanner {len(RSS_KILDER)} RSS-kilder...")
-        for rss in RSS_KILDER:
-            await asyncio.sleep(CONFIG["rate_limit_delay"])
-            html = await self._fetch_med_retry(session, rss.url)
-            if not html:
-                continue
+                baseline = normaliser_tekst(raa_baseline)
+                if baseline == tekst:
+                    # Bare normaliseringen er endret: ingen ny versjon i historikken
+                    logger.info(f"Normalisert på nytt: {lov.navn} (v{gammel.get('norm_versjon')} -> v{NORMALISERING_VERSJON})")
+                    if historikk:
+                        historikk = historikk[:-1] + [{**historikk[-1], "hash": ny_hash}]
+                    gammel = {**gammel, "hash": ny_hash}
+        if gammel:
+            if ny_hash != gammel.get("hash"):
+                # Baselinen lastes bare for lover som faktisk er endret
+                if baseline is None:
+                    baseline = self.snapshots.hent(gammel.get("hash")) or ""
+                endring_prosent, endringer = beregn_endring(baseline, tekst)
+                # Enhver endret seksjon meldes: én ny setning i en lang lov er en liten andel av
+                # dokumentet, og neste kjøring diffes mot den nye versjonen
+                if endringer:
+                    endret_tekst = " ".join(endringer)
+                    treff = self.matcher.finn(endret_tekst)
+                    funn = Funn(
+                        type="lov",
+                        kilde=lov.navn,
+                        kategori=lov.kategori,
+                        tittel=lov.navn + " - " + lov.beskrivelse,
+                        url=lov.url,
+                        beskrivelse=lov.beskrivelse,
+                        endring_prosent=endring_prosent,
+                        endringer=endringer,
+                        keywords=keywords_fra_treff(treff)[:5],
+                        keyword_treff=treff,
+                        ord_antall=len(endret_tekst.split())
+                    )
+                    logger.info(f"Endring detektert: {lov.navn} ({endring_prosent}%)")
+        elif lov.navn not in self.cache["lover"]:
+            logger.info(f"Ny baseline for: {lov.navn}")
+        naa = datetime.now().isoformat()
+        if not historikk or historikk[-1]["hash"] != ny_hash:
+            historikk = (historikk + [{"hash": ny_hash, "fra": naa}])[-CONFIG["history_max_entries"]:]
+        self.cache["lover"][lov.navn] = {
+            "hash": ny_hash,
+            "raa_hash": raa_hash,
+            "sist_sjekket": naa,
+            "forst_sett": forrige.get("forst_sett") or (historikk[0]["fra"] if historikk else naa),
+            "kategori": lov.kategori,
+            "kildetype": kildetype,
+            "norm_versjon": NORMALISERING_VERSJON,
+            "validatorer": validatorer,
+            "historikk": historikk
+        }
+        return funn
+
+    async def _skann_bulk(self) -> dict:
+        # Én nedlasting av datapakken erstatter én forespørsel per lov. Arkivet leses i en
+        # tråd og dokumentene sendes videre gjennom en begrenset kø, så minnebruken holdes nede.
+        overvaket = {}
+        for lov in self.lover:
+            nokkel = lovdata_nokkel(lov.url)
+            if nokkel:
+                overvaket[nokkel] = lov
+        onsket = None if self.bulk_alle else set(overvaket)
+        logger.info(f"Leser Lovdata-datapakker ({'alle dokumenter' if onsket is None else str(len(onsket)) + ' dokumenter'})...")
+        loop = asyncio.get_running_loop()
+        ko = asyncio.Queue(maxsize=CONFIG["bulk_queue_size"])
+        resultater = {}
+        # Settes når arbeiderne har gitt opp; da tømmer ingen køen lenger, og leseren må stoppe
+        stopp = threading.Event()
+
+        def legg_i_ko(element):
+            fremtid = asyncio.run_coroutine_threadsafe(ko.put(element), loop)
+            while True:
+                try:
+                    return fremtid.result(timeout=0.5)
+                except concurrent.futures.TimeoutError:
+                    if stopp.is_set():
+                        fremtid.cancel()
+                        raise LesingAvbrutt()
+
+        def lever(nokkel, data):
+            legg_i_ko((nokkel, data))
+
+        def les_alle() -> list:
+            feil = []
             try:
-                feed = feedparser.parse(html)
-                for entry in feed.entries[:CONFIG["max_rss_entries"]]:
-                    tittel = getattr(entry, 'title', '')
-                    sammendrag = getattr(entry, 'summary', '')
-                    link = getattr(entry, 'link', '')
-                    tekst = (tittel + " " + sammendrag).lower()
-                    matchende_keywords = [kw for kw in ALLE_KEYWORDS if kw in tekst]
-                    if matchende_keywords:
-                        eksisterende_urls = [f.url for f in self.funn if f.type == "rss"]
-                        if link not in eksisterende_urls:
-                            self.funn.append(Funn(
-                                type="rss",
-                                kilde=rss.navn,
-                                kategori=rss.kategori,
-                                tittel=tittel,
-                                url=link,
-                                keywords=matchende_keywords[:5]
-                            ))
-            except Exception as e:
-                logger.error(f"Feil ved parsing av {rss.navn}: {e}")
+                for kilde in self.bulk_kilder:
+                    try:
+                        with aapne_bulk_kilde(kilde) as fil:
+                            les_lovdata_arkiv(fil, onsket, lever)
+                    except LesingAvbrutt:
+                        raise
+                    except Exception as e:
+                        # Også avbrutt nedlasting (IncompleteRead) og ødelagt innhold, ikke bare OSError
+                        logger.error(f"Feil ved lesing av datapakke {kilde}: {e!r}")
+                        feil.append(f"Kunne ikke lese datapakke: {kilde}")
+            except LesingAvbrutt:
+                pass
+            finally:
+                # Sluttmerket sendes uansett hvordan lesingen endte, ellers venter arbeiderne for alltid
+                try:
+                    legg_i_ko(None)
+                except LesingAvbrutt:
+                    pass
+            return feil
+
+        async def arbeider():
+            while True:
+                element = await ko.get()
+                if element is None:
+                    await ko.put(None)
+                    return
+                nokkel, data = element
+                lov = overvaket.get(nokkel) or self._lov_fra_datapakke(nokkel, data)
+                if self.shard and not i_shard(lov.navn, self.shard):
+                    continue
+                AKTIV_KILDE.set(lov.navn)
+                if ("lov", lov.navn) in self.gjenopptatt:
+                    resultater[lov.navn] = self._gjenopprett_lov(self.gjenopptatt[("lov", lov.navn)])
+                    continue
+                raa, tekst = await self._ekstraher(data.decode("utf-8", errors="replace"), dokument=True)
+                if tekst:
+                    resultater[lov.navn] = self._ferdig_lov(
+                        lov.navn, self._behandle_lovtekst(lov, raa, tekst, {}, "datapakke"))
+
+        leser = loop.run_in_executor(None, les_alle)
+        arbeidere = [asyncio.ensure_future(arbeider()) for _ in range(os.cpu_count() or 1)]
+        try:
+            await asyncio.gather(*arbeidere)
+        except BaseException:
+            # En arbeider feilet eller kjøringen ble avbrutt: stopp leseren og de andre arbeiderne
+            # før feilen sendes videre, ellers venter leseren på plass i køen for alltid
+            stopp.set()
+            for oppgave in arbeidere:
+                oppgave.cancel()
+            await asyncio.gather(leser, *arbeidere, return_exceptions=True)
+            raise
+        self.feil.extend(await leser)
+        logger.info(f"Datapakker: {len(resultater)} dokumenter behandlet")
+        return resultater
+
+    @staticmethod
+    def _lov_fra_datapakke(nokkel: tuple, data: bytes) -> LovKilde:
+        treff = TITTEL_MONSTER.search(data[:4096])
+        tittel = treff.group(1).decode("utf-8", errors="replace").strip() if treff else ""
+        return LovKilde("-".join(str(d) for d in nokkel), lovdata_url(nokkel), "alle", tittel)
 
-    async def kjor_skanning(self) -> dict:
+    async def _skann_rss(self, session: aiohttp.ClientSession):
+        naa = datetime.now()
+        kilder = [rss for rss in self.rss_kilder
+                  if self.alle or rss_forfalt(self.cache.get("rss_kilder", {}).get(rss.navn), naa)]
+        self.rss_sjekket = len(kilder)
+        logger.info(f"Skanner {len(kilder)} RSS-kilder ({len(self.rss_kilder) - len(kilder)} ikke forfalt)...")
+        resultater = await asyncio.gather(*(self._skann_rss_kilde(session, rss) for rss in kilder))
+        naa = datetime.now().isoformat()
+        sett_i_kjoring = {}
+        klynger = {}
+        gjentatt = 0
+        # Merkes først her, i kildenes rekkefølge, så duplikater på tvers av feeder gir ett funn.
+        # Samme lenke eller nesten lik tekst legger feeden til kildene i det første funnet;
+        # en omformulert nyhet som ble meldt i en tidligere kjøring, meldes ikke igjen.
+        for oppforinger in resultater:
+            for nokler, funn in oppforinger:
+                tidligere = next((sett_i_kjoring[n] for n in nokler if n in sett_i_kjoring), None)
+                if funn and tidligere:
+                    slaa_sammen_nyhet(vars(tidligere), vars(funn))
+                elif funn:
+                    lik = self.likhet.finn(funn.simhash)
+                    if lik in klynger:
+                        slaa_sammen_nyhet(vars(klynger[lik]), vars(funn))
+                        funn = klynger[lik]
+                    elif lik:
+                        gjentatt += 1
+                        funn = None
+                    else:
+                        self.funn.append(funn)
+                        klynger[funn.simhash] = funn
+                    self.likhet.merk(lik or funn.simhash, naa)
+                # Bare oppføringer som ga funn; samme lenke uten nøkkelordtreff i én feed skal
+                # ikke skjule den i en annen feed der den treffer
+                if funn:
+                    for n in nokler:
+                        sett_i_kjoring.setdefault(n, funn)
+                self.sett.merk(nokler, naa)
+        if gjentatt:
+            logger.info(f"{gjentatt} nyheter var omformuleringer av nyheter meldt tidligere")
+
+    async def _skann_rss_kilde(self, session: aiohttp.ClientSession, rss: RSSKilde) -> list:
+        AKTIV_KILDE.set(rss.navn)
+        lagret = self.gjenopptatt.get(("rss", rss.navn))
+        if lagret is not None:
+            self.cache.setdefault("rss_kilder", {})[rss.navn] = {"sist_sjekket": lagret["sist_sjekket"]}
+            return [(nokler, Funn(**funn) if funn else None) for nokler, funn in lagret["oppforinger"]]
+        # Feedparser får bytene og finner selv tegnsettet, også når det bare står i XML-prologen
+        svar = await self._fetch_med_retry(session, rss.url, raa=True)
+        if not svar or not svar.innhold:
+            return []
+        sist_sjekket = datetime.now().isoformat()
+        self.cache.setdefault("rss_kilder", {})[rss.navn] = {"sist_sjekket": sist_sjekket}
+        oppforinger = []
+        try:
+            import feedparser
+            feed = feedparser.parse(svar.innhold)
+            for entry in feed.entries[:CONFIG["max_rss_entries"]]:
+                tittel = getattr(entry, 'title', '')
+                sammendrag = getattr(entry, 'summary', '')
+                link = getattr(entry, 'link', '')
+                nokler = SettIndeks.nokler(link, getattr(entry, 'id', ''))
+                if self.sett.er_sett(nokler):
+                    oppforinger.append((nokler, None))
+                    continue
+                tekst = tittel + " " + sammendrag
+                treff = self.matcher.finn(tekst)
+                funn = None
+                if treff:
+                    funn = Funn(
+                        type="rss",
+                        kilde=rss.navn,
+                        kategori=rss.kategori,
+                        tittel=tittel,
+                        url=link,
+                        keywords=keywords_fra_treff(treff)[:5],
+                        keyword_treff=treff,
+                        ord_antall=len(tekst.split()),
+                        simhash=simhash(tekst)
+                    )
+                oppforinger.append((nokler, funn))
+            self.sjekkpunkt.lagre("rss", rss.navn, {
+                "sist_sjekket": sist_sjekket,
+                "oppforinger": [(nokler, asdict(funn) if funn else None) for nokler, funn in oppforinger]
+            })
+        except Exception as e:
+            logger.error(f"Feil ved parsing av {rss.navn}: {e}")
+        return oppforinger
+
+    async def _skann(self, session: aiohttp.ClientSession):
+        # Lov- og RSS-henting deler samme begrenser, så de flettes i én felles pool
+        await asyncio.gather(self._skann_lover(session), self._skann_rss(session))
+
+    def _vurder_relevans(self):
+        beregn_relevans(self.funn, self.cache.setdefault("relevans", {}))
+        # Terskelen gjelder nyheter; lovendringer meldes alltid
+        terskel = CONFIG["relevance_threshold"]
+        for_mange = [f for f in self.funn if f.type == "rss" and f.relevans < terskel]
+        if for_mange:
+            logger.info(f"{len(for_mange)} nyheter under relevansterskelen {terskel}")
+            self.funn = [f for f in self.funn if not (f.type == "rss" and f.relevans < terskel)]
+
+    async def kjor_skanning(self, session: Optional[aiohttp.ClientSession] = None) -> dict:
         logger.info("=" * 60)
         logger.info("LovRadar v14.0 - Starter strategisk skanning")
         logger.info("=" * 60)
-        headers = {"User-Agent": CONFIG["user_agent"]}
-        connector = aiohttp.TCPConnector(limit=5)
-        async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
-            await self._skann_lover(session)
-            await self._skann_rss(session)
+        self._nullstill()
+        AKTIV_MAALER.set(self.maaler)
+        self.gjenopptatt = self.sjekkpunkt.start(self.fortsett)
+        self.begrenser = HostBegrenser()
+        self.motor = velg_ekstraksjon_motor()
+        # En pool som er satt på forhånd (daemon-modus) eies av kalleren og lukkes ikke her
+        egen_pool = self.prosesspool is None and CONFIG["extraction_workers"] != 0
+        if egen_pool:
+            self.prosesspool = concurrent.futures.ProcessPoolExecutor(max_workers=CONFIG["extraction_workers"])
+        try:
+            if session is not None:
+                await self._skann(session)
+            else:
+                async with ny_http_session() as session:
+                    await self._skann(session)
+        finally:
+            if egen_pool:
+                self.prosesspool.shutdown()
+                self.prosesspool = None
+        self._vurder_relevans()
         self._lagre_cache()
+        self.sjekkpunkt.fjern()
 
         lovendringer = [asdict(f) for f in self.funn if f.type == "lov"]
         nyheter = [asdict(f) for f in self.funn if f.type == "rss"]
@@ -335,12 +2213,17 @@ class LovRadar:
             "nyheter": nyheter,
             "feil": self.feil,
             "statistikk": {
-                "lover_sjekket": len(ALLE_LOVER),
-                "rss_sjekket": len(RSS_KILDER),
+                "lover_sjekket": self.lover_sjekket,
+                "revalidert_uten_nedlasting": self.revalidert,
+                "lover_utsatt": self.lover_utsatt,
+                "rss_sjekket": self.rss_sjekket,
                 "lovendringer_funnet": len(lovendringer),
-                "nyheter_funnet": len(nyheter)
+                "nyheter_funnet": len(nyheter),
+                "ytelse": self.maaler.som_dict()
             }
         }
+        if self.shard:
+            rapport["shard"] = {"indeks": self.shard[0], "antall": self.shard[1]}
         logger.info("-" * 60)
         logger.info(f"Skanning fullført: {len(lovendringer)} lovendringer, {len(nyheter)} relevante nyheter")
         return rapport
@@ -348,72 +2231,129 @@ class LovRadar:
 
 # --- E-POST RAPPORT ---
 
-def generer_html_rapport(rapport: dict) -> str:
-    dato = datetime.now().strftime('%d.%m.%Y')
+@dataclass
+class Abonnent:
+    navn: str
+    epost: str
+    kategorier: list = field(default_factory=list)
+    keywords: list = field(default_factory=list)
 
-    lov_miljo = [f for f in rapport["lovendringer"] if f["kategori"] == "miljø"]
-    lov_bygg = [f for f in rapport["lovendringer"] if f["kategori"] == "bygg"]
-    lov_handel = [f for f in rapport["lovendringer"] if f["kategori"] == "handel"]
-
-    nyheter_miljo = [f for f in rapport["nyheter"] if f["kategori"] == "miljø"]
-    nyheter_bygg = [f for f in rapport["nyheter"] if f["kategori"] == "bygg"]
-    nyheter_handel = [f for f in rapport["nyheter"] if f["kategori"] == "handel"]
-    nyheter_alle = [f for f in rapport["nyheter"] if f["kategori"] == "alle"]
-
-    def render_lovendring(f):
-        endringer_html = ""
-        if f.get("endringer"):
-            endringer_html = "<ul style='margin: 5px 0; padding-left: 20px; font-size: 12px; color: #666;'>"
-            for e in f["endringer"][:3]:
-                endringer_html += "<li>" + e + "</li>"
-            endringer_html += "</ul>"
-        return (
-            "<div style='background: #fff3cd; padding: 10px; margin: 10px 0; "
-            "border-left: 4px solid #ffc107; border-radius: 4px;'>"
-            "<b>" + f['kilde'] + "</b> "
-            "<span style='color: #dc3545;'>(" + str(f['endring_prosent']) + "% endring)</span><br>"
-            "<span style='color: #666; font-size: 12px;'>" + f.get('beskrivelse', '') + "</span>"
-            + endringer_html +
-            "<a href='" + f['url'] + "' style='color: #007bff;'>Se kilde</a>"
-            "</div>"
-        )
+    def filter(self) -> tuple:
+        return tuple(sorted(self.kategorier)), tuple(sorted(k.lower() for k in self.keywords))
 
-    def render_nyhet(f):
-        keywords = ", ".join(f.get("keywords", [])[:3])
-        return (
-            "<div style='padding: 8px 0; border-bottom: 1px solid #eee;'>"
-            "<b>" + f['tittel'] + "</b><br>"
-            "<span style='color: #666; font-size: 12px;'>"
-            + f['kilde'] + " | Stikkord: " + keywords + "</span><br>"
-            "<a href='" + f['url'] + "' style='color: #007bff; font-size: 12px;'>Les mer</a>"
-            "</div>"
-        )
+    def vil_ha(self, kategorier: set, keywords: set) -> bool:
+        if self.kategorier and not kategorier.intersection(self.kategorier):
+            return False
+        return not self.keywords or bool(keywords.intersection(k.lower() for k in self.keywords))
 
-    def render_seksjon(tittel, emoji, lovendringer, nyheter, farge):
-        if not lovendringer and not nyheter:
-            return ""
-        innhold = ""
-        if lovendringer:
-            innhold += "<h4 style='margin: 10px 0 5px 0;'>Lovendringer:</h4>"
-            for f in lovendringer:
-                innhold += render_lovendring(f)
-        if nyheter:
-            innhold += "<h4 style='margin: 15px 0 5px 0;'>Relevante nyheter:</h4>"
-            for f in nyheter:
-                innhold += render_nyhet(f)
-        return (
-            "<div style='margin: 20px 0; padding: 15px; background: #f8f9fa; "
-            "border-radius: 8px; border-left: 5px solid " + farge + ";'>"
-            "<h3 style='margin: 0 0 10px 0; color: " + farge + ";'>"
-            + emoji + " " + tittel + "</h3>" + innhold + "</div>"
-        )
+
+KATEGORI_SEKSJONER = [
+    ("miljø", "Miljo, Kjemikalier og Baerekraft", "[MILJO]", "#28a745"),
+    ("bygg", "Bygg og Produktkrav", "[BYGG]", "#17a2b8"),
+    ("handel", "Handel og Forbruker", "[HANDEL]", "#6f42c1"),
+    ("alle", "Generelt (Stortinget)", "[GENERELT]", "#6c757d"),
+]
+
+
+def _render_lovendring(f: dict) -> str:
+    endringer_html = ""
+    if f.get("endringer"):
+        endringer_html = "<ul style='margin: 5px 0; padding-left: 20px; font-size: 12px; color: #666;'>"
+        for e in f["endringer"][:3]:
+            endringer_html += "<li>" + e + "</li>"
+        endringer_html += "</ul>"
+    return (
+        "<div style='background: #fff3cd; padding: 10px; margin: 10px 0; "
+        "border-left: 4px solid #ffc107; border-radius: 4px;'>"
+        "<b>" + f['kilde'] + "</b> "
+        "<span style='color: #dc3545;'>(" + str(f['endring_prosent']) + "% endring)</span><br>"
+        "<span style='color: #666; font-size: 12px;'>" + f.get('beskrivelse', '') + "</span>"
+        + endringer_html +
+        "<a href='" + f['url'] + "' style='color: #007bff;'>Se kilde</a>"
+        "</div>"
+    )
+
+
+def _render_nyhet(f: dict) -> str:
+    keywords = ", ".join(f.get("keywords", [])[:3])
+    kilder = ", ".join(dict.fromkeys(k["kilde"] for k in f.get("kilder") or [])) or f['kilde']
+    return (
+        "<div style='padding: 8px 0; border-bottom: 1px solid #eee;'>"
+        "<b>" + f['tittel'] + "</b><br>"
+        "<span style='color: #666; font-size: 12px;'>"
+        + kilder + " | Stikkord: " + keywords + "</span><br>"
+        "<a href='" + f['url'] + "' style='color: #007bff; font-size: 12px;'>Les mer</a>"
+        "</div>"
+    )
+
+
+def _render_seksjon(tittel: str, emoji: str, lovendringer: list, nyheter: list, farge: str) -> str:
+    if not lovendringer and not nyheter:
+        return ""
+    innhold = ""
+    if lovendringer:
+        innhold += "<h4 style='margin: 10px 0 5px 0;'>Lovendringer:</h4>"
+        innhold += "".join(lovendringer)
+    if nyheter:
+        innhold += "<h4 style='margin: 15px 0 5px 0;'>Relevante nyheter:</h4>"
+        innhold += "".join(nyheter)
+    return (
+        "<div style='margin: 20px 0; padding: 15px; background: #f8f9fa; "
+        "border-radius: 8px; border-left: 5px solid " + farge + ";'>"
+        "<h3 style='margin: 0 0 10px 0; color: " + farge + ";'>"
+        + emoji + " " + tittel + "</h3>" + innhold + "</div>"
+    )
+
+
+def _funn_keywords(f: dict) -> set:
+    keywords = {kw.lower() for kw in f.get("keywords", [])}
+    for treff in (f.get("keyword_treff") or {}).values():
+        keywords.update(kw.lower() for kw in treff)
+    return keywords
+
+
+def _funn_kategorier(f: dict) -> set:
+    # Funn i "alle" (Regjeringen, datapakken) går også til abonnentene på kategoriene
+    # nøkkelordene traff i, ellers ville et kategorifilter aldri sluppet dem gjennom
+    if f["kategori"] != "alle":
+        return {f["kategori"]}
+    return {"alle"} | {kategori for kategori, treff in (f.get("keyword_treff") or {}).items() if treff}
+
+
+def grupper_rapport(rapport: dict) -> dict:
+    # Hvert funn rendres én gang; abonnentenes sammendrag settes sammen av de ferdige bitene
+    gruppering = {kategori: {"lovendringer": [], "nyheter": []} for kategori, _, _, _ in KATEGORI_SEKSJONER}
+    # Mest relevant først; sorteringen er stabil, så rapporter uten relevans beholder rekkefølgen
+    for f in sorted(rapport["lovendringer"], key=lambda f: -f.get("relevans", 0.0)):
+        if f["kategori"] in gruppering:
+            gruppering[f["kategori"]]["lovendringer"].append(
+                (_funn_kategorier(f), _funn_keywords(f), _render_lovendring(f)))
+    for f in sorted(rapport["nyheter"], key=lambda f: -f.get("relevans", 0.0)):
+        if f["kategori"] in gruppering:
+            gruppering[f["kategori"]]["nyheter"].append((_funn_kategorier(f), _funn_keywords(f), _render_nyhet(f)))
+    return gruppering
+
+
+def utvalg_for(gruppering: dict, abonnent: Optional[Abonnent]) -> dict:
+    return {
+        kategori: ([html for kat, kw, html in deler["lovendringer"] if abonnent is None or abonnent.vil_ha(kat, kw)],
+                   [html for kat, kw, html in deler["nyheter"] if abonnent is None or abonnent.vil_ha(kat, kw)])
+        for kategori, deler in gruppering.items()
+    }
+
+
+@maalt("generer_html_rapport")
+def generer_html_rapport(rapport: dict, gruppering: Optional[dict] = None,
+                         abonnent: Optional[Abonnent] = None) -> str:
+    dato = datetime.now().strftime('%d.%m.%Y')
+    utvalg = utvalg_for(gruppering or grupper_rapport(rapport), abonnent)
 
     seksjoner = ""
-    seksjoner += render_seksjon("Miljo, Kjemikalier og Baerekraft", "[MILJO]", lov_miljo, nyheter_miljo, "#28a745")
-    seksjoner += render_seksjon("Bygg og Produktkrav", "[BYGG]", lov_bygg, nyheter_bygg, "#17a2b8")
-    seksjoner += render_seksjon("Handel og Forbruker", "[HANDEL]", lov_handel, nyheter_handel, "#6f42c1")
-    if nyheter_alle:
-        seksjoner += render_seksjon("Generelt (Stortinget)", "[GENERELT]", [], nyheter_alle, "#6c757d")
+    for kategori, tittel, emoji, farge in KATEGORI_SEKSJONER:
+        lovendringer, nyheter = utvalg[kategori]
+        seksjoner += _render_seksjon(tittel, emoji, lovendringer, nyheter, farge)
+    antall_lov = sum(len(lov) for lov, _ in utvalg.values())
+    antall_nyheter = sum(len(nyheter) for _, nyheter in utvalg.values())
 
     if not seksjoner:
         seksjoner = (
@@ -442,8 +2382,8 @@ def generer_html_rapport(rapport: dict) -> str:
 <p style="margin: 10px 0 0 0; font-size: 14px; opacity: 0.8;">Strategisk rapport: """ + dato + """</p>
 </div>
 <div style="background: white; padding: 15px; border-radius: 8px; margin-bottom: 20px; display: flex; justify-content: space-around; text-align: center;">
-<div><div style="font-size: 28px; font-weight: bold; color: #dc3545;">""" + str(stats['lovendringer_funnet']) + """</div><div style="font-size: 12px; color: #666;">Lovendringer</div></div>
-<div><div style="font-size: 28px; font-weight: bold; color: #17a2b8;">""" + str(stats['nyheter_funnet']) + """</div><div style="font-size: 12px; color: #666;">Relevante nyheter</div></div>
+<div><div style="font-size: 28px; font-weight: bold; color: #dc3545;">""" + str(antall_lov) + """</div><div style="font-size: 12px; color: #666;">Lovendringer</div></div>
+<div><div style="font-size: 28px; font-weight: bold; color: #17a2b8;">""" + str(antall_nyheter) + """</div><div style="font-size: 12px; color: #666;">Relevante nyheter</div></div>
 <div><div style="font-size: 28px; font-weight: bold; color: #28a745;">""" + str(stats['lover_sjekket']) + """</div><div style="font-size: 12px; color: #666;">Kilder overvaket</div></div>
 </div>
 <div style="background: white; padding: 20px; border-radius: 8px;">""" + seksjoner + """</div>
@@ -458,12 +2398,112 @@ def generer_html_rapport(rapport: dict) -> str:
     return html
 
 
+def last_abonnenter() -> list:
+    # Abonnentlisten kan gis som JSON i LOVRADAR_ABONNENTER eller i subscribers_file;
+    # uten liste får EMAIL_RECIPIENT (eller avsenderen) hele rapporten som før
+    raa = os.environ.get("LOVRADAR_ABONNENTER", "").strip()
+    try:
+        if raa:
+            data = json.loads(raa)
+        elif os.path.exists(CONFIG["subscribers_file"]):
+            with open(CONFIG["subscribers_file"], 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            mottaker = os.environ.get("EMAIL_RECIPIENT", "").strip() or os.environ.get("EMAIL_USER", "").strip()
+            data = [{"navn": "Standard", "epost": mottaker}] if mottaker else []
+        return [Abonnent(**a) for a in data]
+    except (OSError, ValueError, TypeError) as e:
+        logger.error(f"Kunne ikke lese abonnentlisten: {e}")
+        return []
+
+
+def smtp_innstillinger() -> tuple:
+    return (os.environ.get("SMTP_HOST", CONFIG["smtp_host"]),
+            int(os.environ.get("SMTP_PORT", CONFIG["smtp_port"])),
+            os.environ.get("SMTP_SECURITY", CONFIG["smtp_security"]))
+
+
+class SmtpForbindelse:
+    # Én autentisert forbindelse for hele utsendelsen; kobles opp igjen ved brudd og midlertidige feil
+    def __init__(self, bruker: str, passord: str):
+        self.bruker = bruker
+        self.passord = passord
+        self.server = None
+        self.tilkoblinger = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.lukk()
+
+    def _koble_til(self):
+        import smtplib
+        vert, port, sikkerhet = smtp_innstillinger()
+        if sikkerhet == "ssl":
+            server = smtplib.SMTP_SSL(vert, port, timeout=CONFIG["request_timeout"])
+        else:
+            server = smtplib.SMTP(vert, port, timeout=CONFIG["request_timeout"])
+            if sikkerhet == "starttls":
+                server.starttls()
+        if self.passord:
+            server.login(self.bruker, self.passord)
+        self.server = server
+        self.tilkoblinger += 1
+
+    def send(self, mottakere: list, melding: str) -> list:
+        import smtplib
+        for forsok in range(CONFIG["retry_attempts"]):
+            try:
+                if self.server is None:
+                    self._koble_til()
+                return list(self.server.sendmail(self.bruker, mottakere, melding))
+            except smtplib.SMTPRecipientsRefused as e:
+                return list(e.recipients)
+            except smtplib.SMTPResponseException as e:
+                if not 400 <= e.smtp_code < 500:
+                    raise
+                # sendmail har allerede sendt RSET, så forbindelsen kan brukes videre
+                logger.warning(f"Midlertidig SMTP-feil {e.smtp_code} (forsøk {forsok + 1})")
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                logger.warning(f"SMTP-forbindelsen ble brutt: {e} (forsøk {forsok + 1})")
+                self.server = None
+            if forsok < CONFIG["retry_attempts"] - 1:
+                time.sleep(CONFIG["retry_delay"])
+        raise ConnectionError(f"Ga opp etter {CONFIG['retry_attempts']} forsøk")
+
+    def lukk(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+
+def _lag_melding(html: str, n_lov: int, n_nyheter: int, avsender: str, mottakere: list) -> str:
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    msg = MIMEMultipart("alternative")
+    dato = datetime.now().strftime('%d.%m.%Y')
+    msg["Subject"] = "LovRadar " + dato + ": " + str(n_lov) + " lovendring(er), " + str(n_nyheter) + " nyhet(er)"
+    msg["From"] = avsender
+    # Flere mottakere av samme sammendrag får én felles melding uten å se hverandres adresser
+    msg["To"] = mottakere[0] if len(mottakere) == 1 else "undisclosed-recipients:;"
+    msg.attach(MIMEText(html, "html", "utf-8"))
+    return msg.as_string()
+
+
+@maalt("send_epost_rapport")
 def send_epost_rapport(rapport: dict):
     bruker = os.environ.get("EMAIL_USER", "").strip()
     passord = os.environ.get("EMAIL_PASS", "").strip()
-    mottaker = os.environ.get("EMAIL_RECIPIENT", "").strip() or bruker
+    abonnenter = last_abonnenter()
 
-    if not all([bruker, passord, mottaker]):
+    # Bare et lokalt relé uten kryptering (SMTP_SECURITY=none) kan brukes uten passord
+    trenger_passord = smtp_innstillinger()[2] != "none"
+    if not bruker or not abonnenter or (trenger_passord and not passord):
         logger.warning("E-postkonfigurasjon mangler. Hopper over sending.")
         return False
 
@@ -471,46 +2511,327 @@ def send_epost_rapport(rapport: dict):
         logger.info("Ingen funn a rapportere. Hopper over e-post.")
         return False
 
-    msg = MIMEMultipart("alternative")
-    dato = datetime.now().strftime('%d.%m.%Y')
-    n_lov = rapport['statistikk']['lovendringer_funnet']
-    n_nyheter = rapport['statistikk']['nyheter_funnet']
-
-    msg["Subject"] = "LovRadar " + dato + ": " + str(n_lov) + " lovendring(er), " + str(n_nyheter) + " nyhet(er)"
-    msg["From"] = bruker
-    msg["To"] = mottaker
-
-    html = generer_html_rapport(rapport)
-    msg.attach(MIMEText(html, "html", "utf-8"))
+    # Abonnenter med samme filter får samme sammendrag, som rendres én gang
+    gruppering = grupper_rapport(rapport)
+    per_filter = {}
+    for abonnent in abonnenter:
+        per_filter.setdefault(abonnent.filter(), []).append(abonnent)
+    utsendelser = []
+    for gruppe in per_filter.values():
+        utvalg = utvalg_for(gruppering, gruppe[0])
+        n_lov = sum(len(lov) for lov, _ in utvalg.values())
+        n_nyheter = sum(len(nyheter) for _, nyheter in utvalg.values())
+        if not n_lov and not n_nyheter:
+            continue
+        html = generer_html_rapport(rapport, gruppering, gruppe[0])
+        epost = [a.epost for a in gruppe]
+        for i in range(0, len(epost), CONFIG["smtp_batch_size"]):
+            mottakere = epost[i:i + CONFIG["smtp_batch_size"]]
+            utsendelser.append((mottakere, _lag_melding(html, n_lov, n_nyheter, bruker, mottakere)))
+    if not utsendelser:
+        logger.info("Ingen abonnenter har funn i sine kategorier. Hopper over e-post.")
+        return False
 
+    sendt = 0
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(bruker, passord)
-            server.sendmail(bruker, [mottaker], msg.as_string())
-        logger.info("Rapport sendt til " + mottaker)
-        return True
+        with SmtpForbindelse(bruker, passord) as smtp:
+            for mottakere, melding in utsendelser:
+                avvist = smtp.send(mottakere, melding)
+                for adresse in avvist:
+                    logger.error("E-post avvist for " + adresse)
+                sendt += len(mottakere) - len(avvist)
+        logger.info(f"Rapport sendt til {sendt} mottaker(e) i {len(utsendelser)} melding(er)")
     except Exception as e:
         logger.error("E-postfeil: " + str(e))
-        return False
+    return sendt > 0
 
 
-# --- HOVEDPROGRAM ---
+# --- METRIKKER ---
+
+def _prometheus_etikett(verdi: str) -> str:
+    return str(verdi).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
 
-async def main():
-    radar = LovRadar()
-    rapport = await radar.kjor_skanning()
 
-    rapport_fil = "lovradar_rapport_" + datetime.now().strftime('%Y%m%d_%H%M%S') + ".json"
+def metrikker_som_prometheus(rapport: dict, ytelse: dict) -> str:
+    # Alt gjelder siste kjøring og kan gå ned mellom kjøringene, så verdiene er gauges og ikke
+    # counters; en counter med _total-suffiks ville sett ut som en nullstilling hver gang
+    stats = rapport["statistikk"]
+    linjer = [
+        "# HELP lovradar_fase_sekunder Tid brukt per fase i siste kjøring.",
+        "# TYPE lovradar_fase_sekunder gauge",
+    ]
+    for fase, total in ytelse["faser"].items():
+        linjer.append(f'lovradar_fase_sekunder{{fase="{_prometheus_etikett(fase)}"}} {total["sekunder"]}')
+    linjer += ["# HELP lovradar_fase_kall Antall kall per fase i siste kjøring.", "# TYPE lovradar_fase_kall gauge"]
+    for fase, total in ytelse["faser"].items():
+        linjer.append(f'lovradar_fase_kall{{fase="{_prometheus_etikett(fase)}"}} {total["antall"]}')
+    linjer += ["# HELP lovradar_kilde_sekunder Tid brukt per kilde og fase.", "# TYPE lovradar_kilde_sekunder gauge"]
+    for kilde, faser in ytelse["kilder"].items():
+        for fase, sekunder in faser.items():
+            linjer.append(f'lovradar_kilde_sekunder{{kilde="{_prometheus_etikett(kilde)}",'
+                          f'fase="{_prometheus_etikett(fase)}"}} {sekunder}')
+    for navn, verdi in [
+        ("lovradar_bytes_lastet_ned", ytelse["bytes_lastet_ned"]),
+        ("lovradar_forsok_pa_nytt", ytelse["forsok_pa_nytt"]),
+        ("lovradar_http_429", ytelse["http_429"]),
+        ("lovradar_maks_minne_bytes", int((ytelse["maks_minne_mb"] or 0) * 1024 * 1024)),
+        ("lovradar_lover_sjekket", stats["lover_sjekket"]),
+        ("lovradar_revalidert_uten_nedlasting", stats["revalidert_uten_nedlasting"]),
+        ("lovradar_lover_utsatt", stats.get("lover_utsatt", 0)),
+        ("lovradar_lovendringer_funnet", stats["lovendringer_funnet"]),
+        ("lovradar_nyheter_funnet", stats["nyheter_funnet"]),
+    ]:
+        linjer += [f"# TYPE {navn} gauge", f"{navn} {verdi}"]
+    return "\n".join(linjer) + "\n"
+
+
+def skriv_metrikker(sti: str, rapport: dict, maaler: Maaler):
+    # Tas etter e-postutsendelsen, så rapport- og SMTP-fasene også er med
+    ytelse = maaler.som_dict()
+    with open(sti, 'w', encoding='utf-8') as f:
+        if sti.endswith(".json"):
+            json.dump({"statistikk": {**rapport["statistikk"], "ytelse": ytelse}}, f, indent=2, ensure_ascii=False)
+        else:
+            f.write(metrikker_som_prometheus(rapport, ytelse))
+    logger.info("Metrikker lagret: " + sti)
+
+
+def kjor_med_profil(args: argparse.Namespace):
+    import cProfile
+    import tracemalloc
+
+    profil = cProfile.Profile()
+    tracemalloc.start(25)
+    profil.enable()
+    try:
+        asyncio.run(main(args))
+    finally:
+        profil.disable()
+        profil.dump_stats(args.profil + ".pstats")
+        topp = tracemalloc.take_snapshot().statistics("lineno")[:25]
+        tracemalloc.stop()
+        with open(args.profil + "_minne.txt", 'w', encoding='utf-8') as f:
+            f.write("\n".join(str(linje) for linje in topp) + "\n")
+        logger.info(f"Profil lagret: {args.profil}.pstats og {args.profil}_minne.txt")
+
+
+# --- DAEMON ---
+
+class Vakt:
+    # Langlivet prosess: cache, HTTP-forbindelser, prosesspool og nøkkelordautomat holdes varme,
+    # og skanningen kjøres når noe er forfalt eller når den utløses over HTTP
+    def __init__(self, radar: LovRadar, metrikk_fil: Optional[str] = None):
+        self.radar = radar
+        self.metrikk_fil = metrikk_fil
+        self.alle = radar.alle
+        self.startet = datetime.now()
+        self.kjoringer = 0
+        self.skanner = False
+        self.siste = None
+        self.neste = None
+        self.utlost = asyncio.Event()
+        self.alle_neste = False
+
+    def status(self) -> dict:
+        return {
+            "startet": self.startet.isoformat(),
+            "kjoringer": self.kjoringer,
+            "skanner": self.skanner,
+            "siste_kjoring": self.siste,
+            "neste_kjoring": self.neste.isoformat() if self.neste else None,
+        }
+
+    def utlos(self, alle: bool = False):
+        self.alle_neste = self.alle_neste or alle
+        self.utlost.set()
+
+    async def _runde(self, session):
+        self.skanner = True
+        self.radar.alle = self.alle or self.alle_neste
+        self.alle_neste = False
+        try:
+            rapport = await self.radar.kjor_skanning(session=session)
+        except Exception as e:
+            logger.error(f"Skanning feilet: {e}")
+            return
+        finally:
+            self.skanner = False
+            self.kjoringer += 1
+        self.siste = {"tidspunkt": rapport["tidspunkt"],
+                      "statistikk": {n: v for n, v in rapport["statistikk"].items() if n != "ytelse"},
+                      "feil": len(rapport["feil"])}
+        lagre_i_historikk(rapport)
+        if rapport["lovendringer"] or rapport["nyheter"]:
+            send_epost_rapport(rapport)
+        if self.metrikk_fil:
+            skriv_metrikker(self.metrikk_fil, rapport, self.radar.maaler)
+
+    async def kjor(self, host: str, port: int):
+        from aiohttp import web
+
+        async def status(request):
+            return web.json_response(self.status())
+
+        async def skann(request):
+            self.utlos(alle=request.query.get("alle") == "1")
+            return web.json_response({"utlost": True}, status=202)
+
+        app = web.Application()
+        app.router.add_get("/status", status)
+        app.router.add_post("/skann", skann)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Daemon lytter på http://{host}:{port} (GET /status, POST /skann)")
+        pool = None
+        if CONFIG["extraction_workers"] != 0:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=CONFIG["extraction_workers"])
+        self.radar.prosesspool = pool
+        try:
+            async with ny_http_session() as session:
+                while True:
+                    self.utlost.clear()
+                    await self._runde(session)
+                    self.neste = self.radar.neste_forfall()
+                    vent = min(max((self.neste - datetime.now()).total_seconds(), CONFIG["daemon_min_sleep_seconds"]),
+                               CONFIG["daemon_max_sleep_seconds"])
+                    logger.info(f"Neste skanning om {vent / 60:.0f} min")
+                    try:
+                        await asyncio.wait_for(self.utlost.wait(), vent)
+                    except asyncio.TimeoutError:
+                        pass
+        except asyncio.CancelledError:
+            logger.info("Daemon stoppes")
+        finally:
+            self.radar.prosesspool = None
+            if pool:
+                pool.shutdown()
+            await runner.cleanup()
+
+
+async def kjor_daemon(args: argparse.Namespace):
+    import signal
+
+    radar = LovRadar(shard=args.shard, alle=args.alle)
+    oppgave = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, oppgave.cancel)
+    except (NotImplementedError, RuntimeError):  # Windows
+        pass
+    await Vakt(radar, args.metrics).kjor(CONFIG["daemon_host"], args.port or CONFIG["daemon_port"])
+
+
+# --- HOVEDPROGRAM ---
+
+def les_argumenter(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LovRadar - strategisk regulatorisk overvåkning")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Hent Lovdata-lover fra de åpne datapakkene i stedet for enkeltsider")
+    parser.add_argument("--bulk-kilde", action="append", default=[], metavar="URL_ELLER_FIL",
+                        help="Datapakke (tar-arkiv) som skal leses; kan gis flere ganger")
+    parser.add_argument("--bulk-alle", action="store_true",
+                        help="Overvåk alle dokumenter i datapakkene, ikke bare overvåkningslisten")
+    parser.add_argument("--alle", action="store_true",
+                        help="Skann alle lover, også de som ikke er forfalt etter skanneplanen")
+    parser.add_argument("--fortsett", action="store_true",
+                        help="Fortsett en avbrutt kjøring fra sjekkpunktene i stedet for å starte på nytt")
+    parser.add_argument("--shard", type=les_shard, metavar="I/N",
+                        help="Skann bare del I av N og skriv delvis cache og rapport")
+    parser.add_argument("--merge", action="store_true",
+                        help="Flett delresultatene fra --shard til én rapport og én cache")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Kjør kontinuerlig med varm tilstand og et lokalt HTTP-endepunkt for status og skanning")
+    parser.add_argument("--port", type=int, help="Port for daemon-modus")
+    parser.add_argument("--rapport", metavar="FIL",
+                        help="Skriv også rapporten fra kjøringen som JSON")
+    historikk = parser.add_argument_group("historikk", "Søk i og eksport fra historikkdatabasen")
+    historikk.add_argument("--sok", action="store_true", help="Søk i tidligere funn i stedet for å skanne")
+    historikk.add_argument("--lov", metavar="NAVN", help="Bare funn fra denne kilden")
+    historikk.add_argument("--kategori", help="Bare funn i denne kategorien")
+    historikk.add_argument("--keyword", help="Bare funn som traff dette nøkkelordet")
+    historikk.add_argument("--type", choices=("lov", "rss"), help="Bare lovendringer eller nyheter")
+    historikk.add_argument("--fra", type=les_tidspunkt, metavar="TID", help="Fra og med (ISO-dato eller 30d, 6m, 1y)")
+    historikk.add_argument("--til", type=les_tidspunkt, metavar="TID", help="Til (ISO-dato eller 30d, 6m, 1y)")
+    historikk.add_argument("--grense", type=int, help="Maks antall treff")
+    historikk.add_argument("--format", choices=("tabell", "json"), default="tabell")
+    historikk.add_argument("--eksport", metavar="FIL", help="Eksporter en kjøring som JSON-rapport")
+    historikk.add_argument("--kjoring", type=int, help="Kjøring som eksporteres (standard: siste)")
+    historikk.add_argument("--importer", nargs="+", default=[], metavar="FIL",
+                           help="Importer eldre lovradar_rapport_*.json til historikken")
+    parser.add_argument("--metrics", metavar="FIL",
+                        help="Skriv metrikker til fil (.json, ellers Prometheus-tekstformat)")
+    parser.add_argument("--profil", metavar="PREFIKS",
+                        help="Profiler kjøringen med cProfile og tracemalloc")
+    args = parser.parse_args(argv)
+    if args.shard and args.merge:
+        parser.error("--shard og --merge kan ikke brukes sammen")
+    if args.daemon and (args.merge or args.bulk or args.bulk_alle or args.bulk_kilde):
+        parser.error("--daemon kan ikke kombineres med --merge eller datapakker")
+    return args
+
+
+def skriv_rapport(rapport: dict, rapport_fil: str):
     with open(rapport_fil, 'w', encoding='utf-8') as f:
         json.dump(rapport, f, indent=2, ensure_ascii=False)
     logger.info("Rapport lagret: " + rapport_fil)
 
-    send_epost_rapport(rapport)
+
+def ingenting_forfalt(args: argparse.Namespace) -> bool:
+    # Rask vei: planfilen fra forrige kjøring sier når noe tidligst blir forfalt, så en kjøring
+    # uten forfalte kilder verken leser cachen eller laster aiohttp og parserne. --fortsett går
+    # også den veien; gjeldende_plan avviser planen så lenge en avbrutt kjøring har sjekkpunkter.
+    if args.alle or args.merge or args.shard or args.bulk or args.bulk_alle or args.bulk_kilde:
+        return False
+    plan = lovradar_plan.gjeldende_plan(CONFIG["plan_file"])
+    return plan is not None and plan["kilder"] == kildefingeravtrykk(ALLE_LOVER, RSS_KILDER)
+
+
+async def main(args: Optional[argparse.Namespace] = None):
+    args = args or les_argumenter([])
+    if args.sok or args.eksport or args.importer:
+        kjor_historikk(args)
+        return None
+    if ingenting_forfalt(args):
+        logger.info("Ingen kilder er forfalt, hopper over skanningen")
+        return None
+    bulk_kilder = args.bulk_kilde or (CONFIG["lovdata_bulk_urls"] if args.bulk or args.bulk_alle else [])
+    if args.merge:
+        maaler = Maaler()
+        AKTIV_MAALER.set(maaler)
+        rapport = flett_shards(maaler)
+        if rapport is None:
+            return None
+    else:
+        radar = LovRadar(bulk_kilder=bulk_kilder, bulk_alle=args.bulk_alle, shard=args.shard,
+                         alle=args.alle, fortsett=args.fortsett)
+        rapport = await radar.kjor_skanning()
+        maaler = radar.maaler
+
+    if args.shard:
+        # Delrapporten fra en shard sendes ikke; den lagres i historikken når shardene er flettet
+        skriv_rapport(rapport, shard_fil(CONFIG["shard_report_file"], args.shard))
+    else:
+        lagre_i_historikk(rapport)
+        if args.rapport:
+            skriv_rapport(rapport, args.rapport)
+        send_epost_rapport(rapport)
+    if args.metrics:
+        skriv_metrikker(args.metrics, rapport, maaler)
     return rapport
 
 
+def kjor_kommandolinje(argv: Optional[list] = None):
+    argumenter = les_argumenter(argv)
+    if argumenter.daemon:
+        asyncio.run(kjor_daemon(argumenter))
+    elif argumenter.profil:
+        kjor_med_profil(argumenter)
+    else:
+        asyncio.run(main(argumenter))
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    kjor_kommandolinje()
 
 
 
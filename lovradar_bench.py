@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+LovRadar - Opptak, avspilling og ytelsesmåling
+Kjører skanningen offline mot lagrede eller syntetiske HTTP-svar.
+
+  python lovradar_bench.py opptak fixtures/lovradar.json.gz
+  python lovradar_bench.py avspill fixtures/lovradar.json.gz --forsinkelse 0.05 --feilrate 0.1
+  python lovradar_bench.py bench --lover 1000 --feeds 50 --json bench.json
+  python lovradar_bench.py paritet fixtures/lovradar.json.gz
+"""
+
+import os
+import json
+import gzip
+import time
+import base64
+import random
+import asyncio
+import argparse
+import logging
+import statistics
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from email.utils import formatdate
+
+import aiohttp
+from multidict import CIMultiDict
+
+import lovradar
+from lovradar import CONFIG, KEYWORDS, LovKilde, RSSKilde, LovRadar, logger
+
+
+# --- ARKIV ---
+
+def nytt_arkiv() -> dict:
+    return {"versjon": 1, "opprettet": datetime.now().isoformat(), "svar": {}}
+
+
+def last_arkiv(sti: str) -> dict:
+    with gzip.open(sti, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def lagre_arkiv(arkiv: dict, sti: str):
+    if os.path.dirname(sti):
+        os.makedirs(os.path.dirname(sti), exist_ok=True)
+    with gzip.open(sti, 'wt', encoding='utf-8') as f:
+        json.dump(arkiv, f, ensure_ascii=False)
+
+
+def arkiv_svar(status: int, headers: dict, body: bytes) -> dict:
+    return {
+        "status": status,
+        "headers": headers,
+        "body": base64.b64encode(body).decode("ascii") if body is not None else None,
+    }
+
+
+class Innhold:
+    # Står i stedet for response.content; LovRadar leser kroppen i biter med iter_chunked
+    def __init__(self, les):
+        self._les = les
+
+    async def iter_chunked(self, storrelse: int):
+        body = await self._les()
+        for i in range(0, len(body), storrelse):
+            yield body[i:i + storrelse]
+
+
+# --- OPPTAK ---
+
+class OpptakSvar:
+    def __init__(self, svar: aiohttp.ClientResponse, lagre):
+        self._svar = svar
+        self._lagre = lagre
+        self.status = svar.status
+        self.headers = svar.headers
+        self.content = Innhold(self.read)
+
+    async def read(self) -> bytes:
+        body = await self._svar.read()
+        self._lagre(body)
+        return body
+
+    def get_encoding(self) -> str:
+        return self._svar.get_encoding()
+
+    async def text(self) -> str:
+        body = await self.read()
+        return body.decode(self.get_encoding(), errors="replace")
+
+
+class OpptakSession:
+    # Legger seg rundt en ekte aiohttp-session og tar vare på alle svar i arkivet
+    def __init__(self, session: aiohttp.ClientSession, arkiv: dict):
+        self._session = session
+        self.arkiv = arkiv
+
+    @asynccontextmanager
+    async def get(self, url: str, headers: dict = None, **kwargs):
+        # Betingede forespørsler fjernes, ellers ville arkivet fått 304 uten innhold
+        headers = {k: v for k, v in (headers or {}).items()
+                   if k.lower() not in ("if-none-match", "if-modified-since")}
+        async with self._session.get(url, headers=headers, **kwargs) as svar:
+            def lagre(body: bytes):
+                self.arkiv["svar"][url] = arkiv_svar(svar.status, dict(svar.headers), body)
+
+            lagre(None)
+            yield OpptakSvar(svar, lagre)
+
+
+# --- AVSPILLING ---
+
+class AvspillingSvar:
+    def __init__(self, status: int, headers: dict, body: bytes):
+        self.status = status
+        self.headers = CIMultiDict(headers)
+        self._body = body
+        self.content = Innhold(self.read)
+
+    async def read(self) -> bytes:
+        return self._body
+
+    def get_encoding(self) -> str:
+        return lovradar.tegnsett(self.headers, self._body)
+
+    async def text(self) -> str:
+        return self._body.decode(self.get_encoding(), errors="replace")
+
+
+class AvspillingSession:
+    # Står i stedet for aiohttp.ClientSession og serverer svar fra et arkiv,
+    # med valgfri forsinkelse og tilfeldige feil (timeout, 429, 503)
+    def __init__(self, arkiv: dict, forsinkelse: float = 0.0, feilrate: float = 0.0, seed: int = 0):
+        self.arkiv = arkiv
+        self.forsinkelse = forsinkelse
+        self.feilrate = feilrate
+        self.foresporsler = 0
+        self._rng = random.Random(seed)
+
+    @asynccontextmanager
+    async def get(self, url: str, headers: dict = None, **kwargs):
+        self.foresporsler += 1
+        if self.forsinkelse:
+            await asyncio.sleep(self.forsinkelse * self._rng.uniform(0.5, 1.5))
+        if self.feilrate and self._rng.random() < self.feilrate:
+            feil = self._rng.choice(("timeout", 429, 503))
+            if feil == "timeout":
+                raise asyncio.TimeoutError()
+            yield AvspillingSvar(feil, {}, b"")
+            return
+        opptak = self.arkiv["svar"].get(url)
+        if opptak is None:
+            yield AvspillingSvar(404, {}, b"")
+            return
+        svar_headers = CIMultiDict(opptak["headers"])
+        headers = CIMultiDict(headers or {})
+        etag = svar_headers.get("ETag")
+        endret = svar_headers.get("Last-Modified")
+        # Som i HTTP: If-None-Match går foran If-Modified-Since når begge er sendt
+        if "If-None-Match" in headers:
+            uendret = bool(etag) and headers["If-None-Match"] == etag
+        else:
+            uendret = bool(endret) and headers.get("If-Modified-Since") == endret
+        if uendret:
+            yield AvspillingSvar(304, {k: v for k, v in svar_headers.items() if k in ("ETag", "Last-Modified")}, b"")
+            return
+        body = base64.b64decode(opptak["body"]) if opptak["body"] is not None else b""
+        yield AvspillingSvar(opptak["status"], opptak["headers"], body)
+
+
+# --- SYNTETISK KORPUS ---
+
+ALLE_ORD = [kw for ordliste in KEYWORDS.values() for kw in ordliste]
+FYLLORD = ("bestemmelsen", "gjelder", "for", "virksomhet", "som", "omsetter", "produkter",
+           "departementet", "kan", "gi", "forskrift", "om", "og", "plikt", "til", "å", "sørge",
+           "ansvarlig", "myndighet", "tilsyn", "med", "etter", "denne", "loven")
+
+
+def _setning(rng: random.Random) -> str:
+    ord_ = [rng.choice(FYLLORD) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.3:
+        ord_.insert(rng.randrange(len(ord_)), rng.choice(ALLE_ORD))
+    return " ".join(ord_).capitalize() + "."
+
+
+def syntetisk_lov_html(i: int, paragrafer: int, endret: bool) -> str:
+    rng = random.Random(i)
+    deler = []
+    for p in range(1, paragrafer + 1):
+        ledd = " ".join(_setning(rng) for _ in range(rng.randint(2, 6)))
+        if endret and p == paragrafer // 2:
+            ledd += " Nytt ledd om " + " og ".join(rng.sample(ALLE_ORD, 3)) + " gjelder fra neste år."
+        deler.append(
+            "<article class='legalArticle'><h3 class='legalArticleHeader'>"
+            f"<span class='legalArticleValue'>§ {p}.</span> Overskrift {p}</h3>"
+            f"<div class='legalP'>{ledd}</div></article>"
+        )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Forskrift " + str(i) + "</title>"
+        "<script>var sporing = 1;</script><link rel='stylesheet' href='/s.css'></head><body>"
+        "<header>Lovdata</header><nav><ul><li>Hjem</li><li>Søk</li></ul></nav>"
+        "<div class='breadcrumb'>Hjem / Forskrifter</div>"
+        "<div class='dokumentBeholder'><h1>Forskrift om syntetiske krav nr. " + str(i) + "</h1>"
+        "<p>Sist endret 01.02.2024 ved forskrift 2024-02-01-123</p>"
+        + "".join(deler) +
+        "</div><footer>Versjon 3.2 | Stiftelsen Lovdata</footer></body></html>"
+    )
+
+
+def syntetisk_rss(j: int, oppforinger: int, forskyvning: int) -> str:
+    rng = random.Random(j * 7919 + forskyvning)
+    items = []
+    for n in range(forskyvning, forskyvning + oppforinger):
+        tittel = _setning(rng)[:90]
+        items.append(
+            f"<item><title>{tittel}</title><link>https://feed{j}.example.no/sak/{n}</link>"
+            f"<guid>feed{j}-{n}</guid><description>{_setning(rng)} {_setning(rng)}</description></item>"
+        )
+    return ("<?xml version='1.0' encoding='utf-8'?><rss version='2.0'><channel>"
+            f"<title>Feed {j}</title>" + "".join(items) + "</channel></rss>")
+
+
+def _html_svar(body: str, versjon: str) -> dict:
+    return arkiv_svar(200, {
+        "Content-Type": "text/html; charset=utf-8",
+        "ETag": '"' + versjon + '"',
+        "Last-Modified": formatdate(usegmt=True),
+    }, body.encode())
+
+
+def syntetisk_korpus(n_lover: int, n_feeds: int, paragrafer: int = 40,
+                     endringsandel: float = 0.1, nye_per_feed: int = 5, seed: int = 1) -> tuple:
+    rng = random.Random(seed)
+    kategorier = list(KEYWORDS)
+    lover = [LovKilde(f"Syntetisk lov {i}", f"https://lovdata.no/dokument/SF/forskrift/bench-{i}",
+                      kategorier[i % len(kategorier)], f"Syntetisk {i}") for i in range(n_lover)]
+    rss_kilder = [RSSKilde(f"Syntetisk feed {j}", f"https://feed{j}.example.no/rss", "alle")
+                  for j in range(n_feeds)]
+    arkiv_for, arkiv_etter = nytt_arkiv(), nytt_arkiv()
+    endrede = set(rng.sample(range(n_lover), int(n_lover * endringsandel)))
+    for i, lov in enumerate(lover):
+        arkiv_for["svar"][lov.url] = _html_svar(syntetisk_lov_html(i, paragrafer, False), f"{i}-a")
+        if i in endrede:
+            arkiv_etter["svar"][lov.url] = _html_svar(syntetisk_lov_html(i, paragrafer, True), f"{i}-b")
+        else:
+            arkiv_etter["svar"][lov.url] = arkiv_for["svar"][lov.url]
+    oppforinger = CONFIG["max_rss_entries"]
+    for j, rss in enumerate(rss_kilder):
+        arkiv_for["svar"][rss.url] = arkiv_svar(200, {"Content-Type": "application/rss+xml"},
+                                           syntetisk_rss(j, oppforinger, 0).encode())
+        arkiv_etter["svar"][rss.url] = arkiv_svar(200, {"Content-Type": "application/rss+xml"},
+                                            syntetisk_rss(j, oppforinger, nye_per_feed).encode())
+    return lover, rss_kilder, arkiv_for, arkiv_etter
+
+
+# --- MÅLING ---
+
+def mal(funksjon, *args, gjentak: int = 3) -> dict:
+    tider = []
+    for _ in range(gjentak):
+        start = time.perf_counter()
+        funksjon(*args)
+        tider.append(time.perf_counter() - start)
+    return {"min": min(tider), "median": statistics.median(tider), "gjentak": gjentak}
+
+
+def _html_fra_arkiv(arkiv: dict, urler: list) -> list:
+    return [base64.b64decode(arkiv["svar"][u]["body"]).decode() for u in urler]
+
+
+async def _kjor_med_session(session, lover: list, rss_kilder: list) -> dict:
+    # Hele korpuset måles hver gang, uavhengig av skanneplanen
+    radar = LovRadar(lover, rss_kilder, alle=True)
+    return await radar.kjor_skanning(session=session)
+
+
+@contextmanager
+def i_midlertidig_mappe():
+    # Cache, snapshots, sjekkpunkter og seen-indeks skrives i en egen mappe, så opptak og
+    # målinger aldri rører tilstanden til den virkelige overvåkningen
+    mappe = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(mappe)
+
+
+def _uten_ratelimit():
+    CONFIG["host_rate_limits"] = {}
+    CONFIG["rate_limit_delay"] = 1e-6
+    CONFIG["retry_delay"] = 0
+
+
+def kjor_bench(n_lover: int, n_feeds: int, paragrafer: int, utvalg: int, forsinkelse: float,
+               gjentak: int) -> dict:
+    logger.info(f"Syntetiserer korpus: {n_lover} lover, {n_feeds} feeder")
+    lover, rss_kilder, arkiv_for, arkiv_etter = syntetisk_korpus(n_lover, n_feeds, paragrafer)
+    urler = [lov.url for lov in lover[:utvalg]]
+    html_for = _html_fra_arkiv(arkiv_for, urler)
+    html_etter = _html_fra_arkiv(arkiv_etter, urler)
+    raa = [lovradar._ekstraher_bs4(h) for h in html_for]
+    normalisert_for = [lovradar.ekstraher_lovtekst(h) for h in html_for]
+    normalisert_etter = [lovradar.ekstraher_lovtekst(h) for h in html_etter]
+    par = [(a, b) for a, b in zip(normalisert_for, normalisert_etter) if a != b] or \
+        list(zip(normalisert_for, normalisert_etter))
+
+    resultater = {}
+    resultater["normaliser_tekst"] = mal(lambda: [lovradar.normaliser_tekst(t) for t in raa], gjentak=gjentak)
+    for motor in lovradar.EKSTRAKSJON_MOTORER:
+        if motor == lovradar.velg_ekstraksjon_motor(motor):
+            resultater["ekstraher_lovtekst[" + motor + "]"] = mal(
+                lambda: [lovradar.ekstraher_lovtekst(h, motor) for h in html_for], gjentak=gjentak)
+    resultater["beregn_endring"] = mal(lambda: [lovradar.beregn_endring(a, b) for a, b in par], gjentak=gjentak)
+
+    with i_midlertidig_mappe():
+        start = time.perf_counter()
+        asyncio.run(_kjor_med_session(AvspillingSession(arkiv_for, forsinkelse), lover, rss_kilder))
+        resultater["kjor_skanning[baseline]"] = {"min": time.perf_counter() - start, "gjentak": 1}
+        start = time.perf_counter()
+        rapport = asyncio.run(_kjor_med_session(AvspillingSession(arkiv_etter, forsinkelse), lover, rss_kilder))
+        resultater["kjor_skanning[endring]"] = {"min": time.perf_counter() - start, "gjentak": 1}
+    resultater["generer_html_rapport"] = mal(lovradar.generer_html_rapport, rapport, gjentak=gjentak)
+    return {
+        "tidspunkt": datetime.now().isoformat(),
+        "parametre": {"lover": n_lover, "feeds": n_feeds, "paragrafer": paragrafer,
+                      "utvalg": len(urler), "forsinkelse": forsinkelse},
+        "statistikk": rapport["statistikk"],
+        "resultater": resultater,
+    }
+
+
+def skriv_tabell(resultat: dict, forrige: dict = None):
+    print(f"{'Måling':<34}{'min (s)':>12}{'median (s)':>12}{'endring':>10}")
+    for navn, maling in resultat["resultater"].items():
+        median = maling.get("median", maling["min"])
+        endring = ""
+        if forrige and navn in forrige.get("resultater", {}):
+            endring = f"{maling['min'] / forrige['resultater'][navn]['min']:.2f}x"
+        print(f"{navn:<34}{maling['min']:>12.4f}{median:>12.4f}{endring:>10}")
+
+
+# --- PARITET ---
+
+def sjekk_paritet(arkiv: dict) -> list:
+    avvik = []
+    for url, opptak in sorted(arkiv["svar"].items()):
+        if opptak["status"] != 200 or not opptak["body"]:
+            continue
+        if "html" not in CIMultiDict(opptak["headers"]).get("Content-Type", "html"):
+            continue
+        body = base64.b64decode(opptak["body"])
+        html = body.decode(lovradar.tegnsett(CIMultiDict(opptak["headers"]), body), errors="replace")
+        referanse = lovradar.ekstraher_lovtekst(html, "bs4")
+        for motor in lovradar.EKSTRAKSJON_MOTORER:
+            if motor != "bs4" and lovradar.ekstraher_lovtekst(html, motor) != referanse:
+                avvik.append((url, motor))
+    return avvik
+
+
+# --- HOVEDPROGRAM ---
+
+async def opptak(sti: str):
+    arkiv = nytt_arkiv()
+    headers = {"User-Agent": CONFIG["user_agent"]}
+    async with aiohttp.ClientSession(headers=headers) as session:
+        await _kjor_med_session(OpptakSession(session, arkiv), lovradar.ALLE_LOVER, lovradar.RSS_KILDER)
+    lagre_arkiv(arkiv, sti)
+    logger.info(f"Lagret {len(arkiv['svar'])} svar i {sti}")
+
+
+async def avspill(sti: str, forsinkelse: float, feilrate: float):
+    session = AvspillingSession(last_arkiv(sti), forsinkelse, feilrate)
+    start = time.perf_counter()
+    rapport = await _kjor_med_session(session, lovradar.ALLE_LOVER, lovradar.RSS_KILDER)
+    logger.info(f"Avspilling: {session.foresporsler} foresporsler på {time.perf_counter() - start:.2f} s")
+    print(json.dumps(rapport["statistikk"], indent=2, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opptak, avspilling og ytelsesmåling for LovRadar")
+    kommandoer = parser.add_subparsers(dest="kommando", required=True)
+    p = kommandoer.add_parser("opptak", help="Kjør en ekte skanning og lagre alle svar")
+    p.add_argument("arkiv")
+    p = kommandoer.add_parser("avspill", help="Kjør skanningen mot et lagret arkiv")
+    p.add_argument("arkiv")
+    p.add_argument("--forsinkelse", type=float, default=0.0, help="Gjennomsnittlig svartid i sekunder")
+    p.add_argument("--feilrate", type=float, default=0.0, help="Andel foresporsler som feiler")
+    p = kommandoer.add_parser("bench", help="Mål ytelsen på et syntetisk korpus")
+    p.add_argument("--lover", type=int, default=200)
+    p.add_argument("--feeds", type=int, default=10)
+    p.add_argument("--paragrafer", type=int, default=40)
+    p.add_argument("--utvalg", type=int, default=50, help="Antall dokumenter i enkeltfunksjonsmålingene")
+    p.add_argument("--forsinkelse", type=float, default=0.0)
+    p.add_argument("--gjentak", type=int, default=3)
+    p.add_argument("--json", help="Skriv resultatet til fil")
+    p.add_argument("--sammenlign", help="Tidligere resultatfil å sammenligne med")
+    p = kommandoer.add_parser("paritet", help="Sammenlign ekstraksjonsmotorene på et arkiv")
+    p.add_argument("arkiv")
+    args = parser.parse_args()
+
+    if args.kommando == "opptak":
+        sti = os.path.abspath(args.arkiv)
+        with i_midlertidig_mappe():
+            asyncio.run(opptak(sti))
+    elif args.kommando == "avspill":
+        _uten_ratelimit()
+        sti = os.path.abspath(args.arkiv)
+        with i_midlertidig_mappe():
+            asyncio.run(avspill(sti, args.forsinkelse, args.feilrate))
+    elif args.kommando == "bench":
+        _uten_ratelimit()
+        logger.setLevel(logging.WARNING)
+        resultat = kjor_bench(args.lover, args.feeds, args.paragrafer, args.utvalg,
+                              args.forsinkelse, args.gjentak)
+        forrige = None
+        if args.sammenlign:
+            with open(args.sammenlign, 'r', encoding='utf-8') as f:
+                forrige = json.load(f)
+        skriv_tabell(resultat, forrige)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(resultat, f, indent=2, ensure_ascii=False)
+    elif args.kommando == "paritet":
+        avvik = sjekk_paritet(last_arkiv(args.arkiv))
+        for url, motor in avvik:
+            print(f"Avvik ({motor}): {url}")
+        print(f"{len(avvik)} avvik")
+        raise SystemExit(1 if avvik else 0)
+
+
+if __name__ == "__main__":
+    main()
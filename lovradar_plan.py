@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+LovRadar - Skanneplan og rask oppstart
+Leser planfilen fra forrige kjøring før lovradar.py lastes, så en kjøring uten forfalte
+kilder er ferdig på millisekunder. Ellers startes en vanlig kjøring med de samme argumentene.
+
+  python lovradar_plan.py --fortsett
+"""
+
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+PLAN_FIL = "lovradar_plan.json"
+KODE_FIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lovradar.py")
+
+# Argumenter som kan gå den raske veien; alt annet (--alle, --shard, datapakker ...) skal skanne
+RASKE_ARGUMENTER = {"--fortsett"}
+
+
+def filhash(sti: str) -> Optional[str]:
+    # Innholdet og ikke endringstiden avgjør, så planen gjelder også etter en ny utsjekk i CI
+    try:
+        with open(sti, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def gjeldende_plan(plan_fil: str = PLAN_FIL, naa: Optional[datetime] = None) -> Optional[dict]:
+    # Planen gjelder bare for samme kode og samme cache, og ikke mens en avbrutt kjøring venter
+    try:
+        with open(plan_fil, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan["kode"] != filhash(KODE_FIL) or plan["cache_hash"] != filhash(plan["cache"]):
+            return None
+        if os.path.exists(os.path.join(plan["sjekkpunkt"], "kjoring.json")):
+            return None
+        if (naa or datetime.now()) >= datetime.fromisoformat(plan["neste_forfall"]):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return plan
+
+
+def main(argv: Optional[list] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if set(argv) <= RASKE_ARGUMENTER:
+        plan = gjeldende_plan()
+        if plan is not None and plan.get("standard"):
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} [INFO] LovRadar: Ingen kilder er forfalt, "
+                  f"hopper over skanningen (neste forfall {plan['neste_forfall'][:16]})")
+            return
+    import lovradar
+    lovradar.kjor_kommandolinje(argv)
+
+
+if __name__ == "__main__":
+    main()
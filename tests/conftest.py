@@ -0,0 +1,55 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lovradar_bench  # noqa: E402
+from lovradar import CONFIG, LovRadar  # noqa: E402
+
+
+@pytest.fixture
+def avspill(tmp_path, monkeypatch):
+    # Kjører skanningen mot en AvspillingSession i tmp_path, uten ratebegrensning og prosesspool
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "extraction_workers", 0)
+    monkeypatch.setitem(CONFIG, "host_rate_limits", {})
+    monkeypatch.setitem(CONFIG, "rate_limit_delay", 1e-6)
+    monkeypatch.setitem(CONFIG, "retry_delay", 0)
+
+    def kjor(session, lover: list, rss_kilder: list, **kwargs) -> dict:
+        kwargs.setdefault("alle", True)
+        return asyncio.run(LovRadar(lover, rss_kilder, **kwargs).kjor_skanning(session=session))
+    return kjor
+
+
+@pytest.fixture
+def mappe(tmp_path, monkeypatch):
+    # Egen arbeidsmappe under tmp_path, så to kjøringer kan sammenlignes side om side
+    def mappe(navn: str):
+        (tmp_path / navn).mkdir()
+        monkeypatch.chdir(tmp_path / navn)
+    return mappe
+
+
+@pytest.fixture
+def korpus():
+    # Halvparten av lovene endres mellom arkiv_for og arkiv_etter
+    return lovradar_bench.syntetisk_korpus(8, 3, paragrafer=6, endringsandel=0.5)
+
+
+def tilstand(rapport: dict, relevans: bool = True) -> tuple:
+    # Det en kjøring etterlater seg: funn, statistikk og cachen. Uten relevans tas poeng og
+    # stikkordrekkefølge ut av funnene, f.eks. når de er regnet med ulik statistikk per shard.
+    def funn(liste: list) -> list:
+        return liste if relevans else [{n: v for n, v in f.items() if n not in ("relevans", "keywords")} for f in liste]
+    with open(CONFIG["cache_file"], 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    lover = {navn: (o["hash"], o["raa_hash"], [v["hash"] for v in o["historikk"]])
+             for navn, o in cache["lover"].items()}
+    statistikk = {n: v for n, v in rapport["statistikk"].items() if n not in ("ytelse", "shards")}
+    return (funn(rapport["lovendringer"]), funn(rapport["nyheter"]), rapport["feil"], statistikk, lover,
+            sorted(cache["rss_sett"]), sorted(cache["rss_likhet"]), sorted(cache["rss_kilder"]), cache["relevans"])
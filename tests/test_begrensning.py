@@ -0,0 +1,88 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+import pytest
+
+import lovradar
+from lovradar import CONFIG, HostBegrenser
+
+
+class Klokke:
+    # Simulert tid: sleep() venter til klokken er stilt frem, og klokken stilles bare frem når
+    # alle oppgavene står og venter
+    def __init__(self):
+        self.tid = 0.0
+        self._ventende = []
+        self._nr = itertools.count()
+
+    def __getattr__(self, navn):
+        return getattr(time, navn)
+
+    def monotonic(self) -> float:
+        return self.tid
+
+    async def sleep(self, sekunder: float):
+        fremtid = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._ventende, (self.tid + sekunder, next(self._nr), fremtid))
+        await fremtid
+
+    async def driv(self, oppgaver: list, ekte_sleep):
+        while not all(o.done() for o in oppgaver):
+            for _ in range(20):
+                await ekte_sleep(0)
+            if self._ventende:
+                self.tid, _, fremtid = heapq.heappop(self._ventende)
+                fremtid.set_result(None)
+
+
+@pytest.fixture
+def klokke(monkeypatch):
+    klokke = Klokke()
+    monkeypatch.setattr(lovradar, "time", klokke)
+    monkeypatch.setitem(CONFIG, "host_rate_limits", {"lovdata.no": 2.0, "dibk.no": 1.0})
+    monkeypatch.setitem(CONFIG, "host_burst", 2)
+    monkeypatch.setitem(CONFIG, "max_concurrent_requests", 2)
+    return klokke
+
+
+def kjor(klokke: Klokke, monkeypatch, urler: list) -> tuple:
+    starter = {}
+    aktive = [0, 0]
+    ekte_sleep = asyncio.sleep
+
+    async def hent(begrenser: HostBegrenser, url: str):
+        async with begrenser.plass(url):
+            aktive[0] += 1
+            aktive[1] = max(aktive)
+            starter.setdefault(lovradar.host_for(url), []).append(klokke.tid)
+            await klokke.sleep(0.1)
+            aktive[0] -= 1
+
+    async def alle():
+        monkeypatch.setattr(asyncio, "sleep", klokke.sleep)
+        begrenser = HostBegrenser()
+        oppgaver = [asyncio.ensure_future(hent(begrenser, url)) for url in urler]
+        await klokke.driv(oppgaver, ekte_sleep)
+        await asyncio.gather(*oppgaver)
+    asyncio.run(alle())
+    return starter, aktive[1]
+
+
+def test_foresporsler_spres_per_host(klokke, monkeypatch):
+    urler = [f"https://www.lovdata.no/dokument/{n}" for n in range(6)] + [f"https://dibk.no/{n}" for n in range(6)]
+    starter, samtidige = kjor(klokke, monkeypatch, urler)
+    assert samtidige == 2
+    for host, rate in (("lovdata.no", 2.0), ("dibk.no", 1.0)):
+        # Etter de to første (burst) kommer én forespørsel per token, aldri raskere
+        assert all(t >= (k - 1) / rate - 1e-9 for k, t in enumerate(starter[host]))
+        assert starter[host][-1] == pytest.approx(4 / rate, abs=0.15)
+
+
+def test_treg_host_holder_ikke_igjen_andre(klokke, monkeypatch):
+    # dibk.no venter på tokens uten å holde plass i semaforen, så lovdata.no går fullt
+    urler = [f"https://dibk.no/{n}" for n in range(6)] + [f"https://lovdata.no/{n}" for n in range(4)]
+    starter, _ = kjor(klokke, monkeypatch, urler)
+    assert starter["lovdata.no"][-1] <= 1.0 + 0.15
+    assert starter["dibk.no"][-1] == pytest.approx(4.0, abs=0.15)
@@ -0,0 +1,148 @@
+import asyncio
+import http.client
+import io
+import json
+import re
+import tarfile
+
+import pytest
+
+import lovradar
+from lovradar import CONFIG, LovKilde, LovRadar
+
+URL = "https://lovdata.no/dokument/NL/lov/2002-06-21-34"
+
+
+def dokument(endret: bool = False, stempel: str = "") -> bytes:
+    # Som i datapakkene: ingen sideramme, ett <article> per paragraf
+    paragrafer = "".join(
+        f"<article class='legalArticle'><h2>§ {n}. Overskrift {n}</h2>"
+        f"<p>Første ledd i paragraf {n} om krav til emballasje og avfall.</p>"
+        + ("<p>Nytt ledd om produktpass og sporbarhet.</p>" if endret and n == 3 else "")
+        + "</article>"
+        for n in range(1, 6)
+    )
+    return ("<html><head><title>Lov om syntetiske krav</title></head><body><main class='documentBody'>"
+            "<h1>Lov om syntetiske krav</h1>" + stempel + paragrafer + "</main></body></html>").encode("utf-8")
+
+
+def lag_datapakke(sti, data: bytes, antall: int = 1):
+    with tarfile.open(sti, "w:bz2") as tar:
+        for n in range(34, 34 + antall):
+            info = tarfile.TarInfo(f"gjeldende-lover/nl/nl-20020621-{n:03d}.xml")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def radar_i(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "extraction_workers", 0)
+
+    def radar(pakke) -> dict:
+        lov = LovKilde("Syntetisk lov", URL, "miljø", "Syntetisk")
+        return asyncio.run(LovRadar([lov], [], bulk_kilder=[str(pakke)], alle=True).kjor_skanning())
+    return radar
+
+
+@pytest.mark.parametrize("motor", [m for m in lovradar.EKSTRAKSJON_MOTORER if lovradar.velg_ekstraksjon_motor(m) == m])
+def test_hele_dokumentet_leses(motor):
+    tekst = lovradar.ekstraher_lovtekst(dokument().decode(), motor, dokument=True)
+    assert [e for e, _ in lovradar.del_i_seksjoner(tekst)] == ["Innledning", "§ 1", "§ 2", "§ 3", "§ 4", "§ 5"]
+    assert "syntetiske krav" in tekst and tekst.count("lov om syntetiske krav") == 1
+
+
+def test_endring_i_senere_paragraf_oppdages(tmp_path, radar_i):
+    pakke = tmp_path / "gjeldende-lover.tar.bz2"
+    lag_datapakke(pakke, dokument())
+    assert radar_i(pakke)["lovendringer"] == []
+    lag_datapakke(pakke, dokument(endret=True))
+    rapport = radar_i(pakke)
+    assert len(rapport["lovendringer"]) == 1
+    assert [e.split(" endret")[0] for e in rapport["lovendringer"][0]["endringer"]] == ["§ 3"]
+
+
+STEMPEL = "<p>Sist endret ved lov 12. mai 2023 nr. 4 om endringer i avfallsregelverket</p>\n"
+
+
+def forrige_normalisering(m):
+    # Som om forrige versjon av reglene bare fjernet ordene "Sist endret", ikke resten av linjen
+    m.setattr(lovradar, "NORMALISERING_VERSJON", lovradar.NORMALISERING_VERSJON - 1)
+    m.setattr(lovradar, "STEMPEL_MONSTER", re.compile(r'(?i:sist\s+endret)'))
+
+
+def test_ny_normalisering_gir_ingen_varsel(tmp_path, radar_i, monkeypatch):
+    pakke = tmp_path / "gjeldende-lover.tar.bz2"
+    lag_datapakke(pakke, dokument(stempel=STEMPEL))
+    with monkeypatch.context() as m:
+        forrige_normalisering(m)
+        assert radar_i(pakke)["lovendringer"] == []
+    assert radar_i(pakke)["lovendringer"] == []
+    oppforing = json.load(open("lovradar_cache.json"))["lover"]["Syntetisk lov"]
+    assert oppforing["norm_versjon"] == lovradar.NORMALISERING_VERSJON
+    assert len(oppforing["historikk"]) == 1
+
+
+def test_lovendring_samtidig_med_ny_normalisering_meldes(tmp_path, radar_i, monkeypatch):
+    pakke = tmp_path / "gjeldende-lover.tar.bz2"
+    lag_datapakke(pakke, dokument(stempel=STEMPEL))
+    with monkeypatch.context() as m:
+        forrige_normalisering(m)
+        radar_i(pakke)
+    lag_datapakke(pakke, dokument(endret=True, stempel=STEMPEL))
+    rapport = radar_i(pakke)
+    assert [e.split(" endret")[0] for e in rapport["lovendringer"][0]["endringer"]] == ["§ 3"]
+
+
+def test_nytt_stempel_gir_ingen_ny_raatekst(tmp_path, radar_i):
+    # Stempelet normaliseres bort; bare en endring i selve teksten lagrer ny råtekst
+    pakke = tmp_path / "gjeldende-lover.tar.bz2"
+    lag_datapakke(pakke, dokument(stempel=STEMPEL))
+    radar_i(pakke)
+    forste = json.load(open("lovradar_cache.json"))["lover"]["Syntetisk lov"]["raa_hash"]
+    snapshots = sorted(p.name for p in (tmp_path / CONFIG["snapshot_dir"]).rglob("*") if p.is_file())
+    lag_datapakke(pakke, dokument(stempel=STEMPEL.replace("12. mai 2023 nr. 4", "2. juni 2024 nr. 31")))
+    assert radar_i(pakke)["lovendringer"] == []
+    assert json.load(open("lovradar_cache.json"))["lover"]["Syntetisk lov"]["raa_hash"] == forste
+    assert sorted(p.name for p in (tmp_path / CONFIG["snapshot_dir"]).rglob("*") if p.is_file()) == snapshots
+    lag_datapakke(pakke, dokument(endret=True))
+    radar_i(pakke)
+    assert json.load(open("lovradar_cache.json"))["lover"]["Syntetisk lov"]["raa_hash"] != forste
+
+
+def test_feil_i_arbeider_stopper_leseren(tmp_path, monkeypatch):
+    # Flere dokumenter enn køen og arbeiderne rommer, så leseren står og venter når feilen kommer
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "extraction_workers", 0)
+    pakke = tmp_path / "gjeldende-lover.tar.bz2"
+    lag_datapakke(pakke, dokument(), antall=CONFIG["bulk_queue_size"] + 40)
+
+    def feiler(*_):
+        raise OSError("disken er full")
+    monkeypatch.setattr(LovRadar, "_behandle_lovtekst", feiler)
+    with pytest.raises(OSError, match="disken er full"):
+        asyncio.run(LovRadar([], [], bulk_kilder=[str(pakke)], bulk_alle=True, alle=True).kjor_skanning())
+
+
+def test_feil_i_leseren_avslutter_skanningen(tmp_path, monkeypatch):
+    # Som en nedlasting som brytes midt i arkivet; arbeiderne må likevel få sluttmerket
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "extraction_workers", 0)
+    pakke = tmp_path / "gjeldende-lover.tar.bz2"
+    lag_datapakke(pakke, dokument(), antall=6)
+    les = lovradar.les_lovdata_arkiv
+
+    def brutt(fil, onsket, lever):
+        levert = []
+
+        def lever_to(nokkel, data):
+            if len(levert) == 2:
+                raise http.client.IncompleteRead(b"", 4096)
+            levert.append(nokkel)
+            lever(nokkel, data)
+        les(fil, onsket, lever_to)
+    monkeypatch.setattr(lovradar, "les_lovdata_arkiv", brutt)
+    radar = LovRadar([], [], bulk_kilder=[str(pakke)], bulk_alle=True, alle=True)
+    rapport = asyncio.run(asyncio.wait_for(radar.kjor_skanning(), 20))
+    assert rapport["feil"] == [f"Kunne ikke lese datapakke: {pakke}"]
+    assert len(json.load(open("lovradar_cache.json"))["lover"]) == 2
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+
+import lovradar
+import lovradar_bench
+
+MOTORER = [m for m in lovradar.EKSTRAKSJON_MOTORER if m != "bs4" and lovradar.velg_ekstraksjon_motor(m) == m]
+
+# Tilfeller der motorene lett sprikte: støy midt i en setning, kommentarer, entiteter og beholdere
+SIDER = [
+    "<html><body><p>linje<!-- x -->slutt</p></body></html>",
+    "<html><body><div class='content'>før<form><input name='q'>søk</form>etter</div></body></html>",
+    "<html><body><nav>meny</nav><div class='x LovdataLov'>Lov om <b>ting</b>en &amp; sånt"
+    "<script>x = 1;</script><div class='footer'>bunn</div> slutt</div></body></html>",
+    "<html><body><main>hoved <p>a<p>b</main><article>art <span>x</span></article></body></html>",
+    "<html><body><div class='menu'><article>skjult</article></div><div role='main'>rolle<br>etter</div></body></html>",
+    "<html><body><div class='content'>c</div><div id='LovdataDokument'>dok<!-- k -->ument</div></body></html>",
+    "<p>ingen body</p>",
+    "<html><body><main><p>Sist endret ved lov 12. mai 2023 nr. 4</p>\n<p>§ 1. Formål</p>"
+    "<span>Sist endret <b>01.02.2024</b> av</span> Lovdata</main></body></html>",
+]
+
+
+def arkivsider() -> list:
+    # Et opptak fra `lovradar_bench.py opptak` kan pekes ut med LOVRADAR_ARKIV
+    sti = os.environ.get("LOVRADAR_ARKIV")
+    if not sti:
+        return []
+    arkiv = lovradar_bench.last_arkiv(sti)
+    urler = [url for url, svar in arkiv["svar"].items()
+             if svar["body"] and "html" in svar["headers"].get("Content-Type", "")]
+    return lovradar_bench._html_fra_arkiv(arkiv, urler)
+
+
+@pytest.mark.parametrize("motor", MOTORER)
+def test_motorene_gir_samme_tekst_som_bs4(motor):
+    sider = SIDER + [lovradar_bench.syntetisk_lov_html(i, 12, i % 2 == 1) for i in range(6)] + arkivsider()
+    for html in sider:
+        assert lovradar.ekstraher_lovtekst(html, motor) == lovradar.ekstraher_lovtekst(html, "bs4"), html[:80]
+
+
+def test_tegnsett_fra_header_og_meta():
+    side = "<html><head><meta charset='iso-8859-1'><title>Miljø</title></head>".encode("latin-1")
+    assert lovradar.tegnsett({"Content-Type": "text/html"}, side) == "iso8859-1"
+    assert lovradar.tegnsett({"Content-Type": "text/html; charset=utf-8"}, side) == "utf-8"
+    eldre = b'<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">'
+    assert lovradar.tegnsett({}, eldre) == "cp1252"
+    assert lovradar.tegnsett({}, b"<html>") == "utf-8"
+
+
+@pytest.mark.parametrize("motor", [m for m in lovradar.EKSTRAKSJON_MOTORER if lovradar.velg_ekstraksjon_motor(m) == m])
+def test_side_uten_tegnsett_i_header(motor, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(lovradar.CONFIG, "extraction_engine", motor)
+    monkeypatch.setitem(lovradar.CONFIG, "extraction_workers", 0)
+    lov = lovradar.LovKilde("Latin-1", "https://lovdata.no/dokument/NL/lov/2002-06-21-34", "miljø")
+    side = ("<html><head><meta charset='iso-8859-1'></head><body><main>"
+            "§ 1. Krav til miljøgift og bærekraft</main></body></html>").encode("latin-1")
+    arkiv = lovradar_bench.nytt_arkiv()
+    arkiv["svar"][lov.url] = lovradar_bench.arkiv_svar(200, {"Content-Type": "text/html"}, side)
+    radar = lovradar.LovRadar([lov], [], alle=True)
+    asyncio.run(radar.kjor_skanning(session=lovradar_bench.AvspillingSession(arkiv)))
+    tekst = radar.snapshots.hent(radar.cache["lover"][lov.navn]["hash"])
+    assert tekst == "§ 1. krav til miljøgift og bærekraft"
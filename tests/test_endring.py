@@ -0,0 +1,77 @@
+from lovradar import beregn_endring, del_i_seksjoner, normaliser_tekst
+
+
+def lov(*paragrafer: str) -> str:
+    return normaliser_tekst("Lov om syntetiske krav. " + " ".join(paragrafer))
+
+
+def etiketter(tekst: str) -> list:
+    return [e for e, _ in del_i_seksjoner(tekst)]
+
+
+def elleve_paragrafer(femte: str = "Femte ledd om krav.") -> str:
+    paragrafer = [f"§ {n}. Overskrift {n}. Tekst i paragraf {n}." for n in range(1, 12)]
+    paragrafer[1] = "§ 2. Virkeområde. Reglene gjelder tilsvarende for forskriften § 9."
+    paragrafer[4] = "§ 5. Overskrift 5. " + femte
+    return lov(*paragrafer)
+
+
+def test_henvisning_etter_referanseord_er_ingen_overskrift():
+    tekst = lov("§ 1. Formål. Se også § 7.", "§ 2. Krav. Plikten etter § 5. gjelder ikke.", "§ 3. Tilsyn.")
+    assert etiketter(tekst) == ["Innledning", "§ 1", "§ 2", "§ 3"]
+
+
+def test_henvisning_fremover_sluker_ikke_senere_overskrifter():
+    assert etiketter(elleve_paragrafer()) == ["Innledning"] + [f"§ {n}" for n in range(1, 12)]
+    _, endringer = beregn_endring(elleve_paragrafer(), elleve_paragrafer("Femte ledd om nye krav til emballasje."))
+    assert [e.split(" endret")[0] for e in endringer] == ["§ 5"]
+
+
+def test_henvisning_foran_overskriften_gir_ikke_feil_start():
+    tekst = lov("§ 1. Formål. Nærmere regler står i § 2.", "§ 2. Krav. Tekst.", "§ 3. Tilsyn.")
+    seksjoner = dict(del_i_seksjoner(tekst))
+    assert seksjoner["§ 1"].endswith("nærmere regler står i § 2.")
+    assert seksjoner["§ 2"] == "§ 2. krav. tekst."
+
+
+def test_bokstavparagraf():
+    tekst = lov("§ 3. Krav.", "§ 3 a. Unntak.", "§ 4. Tilsyn.")
+    assert etiketter(tekst) == ["Innledning", "§ 3", "§ 3 a", "§ 4"]
+
+
+def test_kapitler_og_kapittelnummererte_paragrafer():
+    tekst = lov("Kapittel 1. Innledende bestemmelser.", "§ 1-1. Formål.", "§ 1-2. Virkeområde.",
+                "Kapittel 2. Krav.", "§ 2-1. Dokumentasjon.", "§ 2-2. Sporbarhet.")
+    assert etiketter(tekst) == ["Innledning", "Kapittel 1", "§ 1-1", "§ 1-2", "Kapittel 2", "§ 2-1", "§ 2-2"]
+
+
+def test_ny_og_fjernet_paragraf():
+    gammel = lov("§ 1. Formål.", "§ 2. Krav.", "§ 3. Tilsyn.")
+    ny = lov("§ 1. Formål.", "§ 3. Tilsyn.", "§ 4. Sanksjoner ved brudd.")
+    prosent, endringer = beregn_endring(gammel, ny)
+    assert prosent > 0
+    assert sorted(e.split(":")[0] for e in endringer) == ["§ 2 fjernet", "§ 4 lagt til"]
+
+
+def test_uendret_tekst():
+    tekst = elleve_paragrafer()
+    assert beregn_endring(tekst, tekst) == (0.0, [])
+
+
+def lang_lov(endret: bool = False) -> str:
+    # 300 paragrafer i kapittel 8 og 9, om lag 250 000 tegn
+    paragrafer = []
+    for kapittel in (8, 9):
+        paragrafer.append(f"Kapittel {kapittel}. Bestemmelser {kapittel}.")
+        for n in range(1, 151):
+            tekst = f"Tekst i paragraf {kapittel}-{n} om krav til dokumentasjon og sporbarhet. " * 13
+            if endret and (kapittel, n) == (9, 150):
+                tekst += "Produsenten skal oppgi gjenvunnet andel."
+            paragrafer.append(f"§ {kapittel}-{n}. Overskrift. {tekst}")
+    return lov(*paragrafer)
+
+
+def test_ny_setning_i_lang_lov_finnes():
+    prosent, endringer = beregn_endring(lang_lov(), lang_lov(endret=True))
+    assert len(lang_lov()) > 250_000 and prosent < 0.1
+    assert endringer == ["§ 9-150 endret. Nytt: produsenten skal oppgi gjenvunnet andel...."]
@@ -0,0 +1,110 @@
+import json
+import socket
+
+import pytest
+
+import lovradar
+from lovradar import CONFIG, Abonnent, grupper_rapport, send_epost_rapport, utvalg_for
+
+
+class Mottak:
+    def __init__(self):
+        self.meldinger = []
+        self.forbindelser = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.forbindelser += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.meldinger.append((sorted(envelope.rcpt_tos), envelope.content.decode("utf-8", "replace")))
+        return "250 OK"
+
+
+def rapport() -> dict:
+    return {
+        "tidspunkt": "2026-01-01T06:00:00",
+        "lovendringer": [{"type": "lov", "kilde": "Produktkontrolloven", "url": "https://lovdata.no/a",
+                          "kategori": "miljø", "endring_prosent": 2.5, "endringer": ["§ 3"]}],
+        "nyheter": [{"type": "rss", "kilde": "Regjeringen", "tittel": "Nye krav til bygg",
+                     "url": "https://regjeringen.no/b", "kategori": "bygg", "keywords": ["epd"]}],
+        "feil": [],
+        "statistikk": {"lover_sjekket": 1, "rss_sjekket": 1},
+    }
+
+
+def ledig_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    controller = pytest.importorskip("aiosmtpd.controller")
+    mottak = Mottak()
+    port = ledig_port()
+    server = controller.Controller(mottak, hostname="127.0.0.1", port=port)
+    server.start()
+    monkeypatch.setenv("EMAIL_USER", "radar@example.no")
+    monkeypatch.delenv("EMAIL_PASS", raising=False)
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_SECURITY", "none")
+    monkeypatch.setitem(CONFIG, "retry_delay", 0)
+    yield mottak
+    server.stop()
+
+
+def test_abonnenter_grupperes_per_filter_over_en_forbindelse(smtp, monkeypatch):
+    abonnenter = [
+        {"navn": "Miljø 1", "epost": "m1@example.no", "kategorier": ["miljø"]},
+        {"navn": "Miljø 2", "epost": "m2@example.no", "kategorier": ["miljø"]},
+        {"navn": "Bygg", "epost": "b@example.no", "kategorier": ["bygg"]},
+        {"navn": "Alle", "epost": "alle@example.no"},
+        {"navn": "Handel", "epost": "h@example.no", "kategorier": ["handel"]},
+    ]
+    monkeypatch.setenv("LOVRADAR_ABONNENTER", json.dumps(abonnenter))
+
+    assert send_epost_rapport(rapport())
+    assert smtp.forbindelser == 1
+    mottatt = {tuple(mottakere): innhold for mottakere, innhold in smtp.meldinger}
+    # Handel har ingen funn og får ingenting
+    assert set(mottatt) == {("m1@example.no", "m2@example.no"), ("b@example.no",), ("alle@example.no",)}
+    assert "1 lovendring(er), 0 nyhet(er)" in mottatt[("m1@example.no", "m2@example.no")]
+    assert "0 lovendring(er), 1 nyhet(er)" in mottatt[("b@example.no",)]
+    assert "1 lovendring(er), 1 nyhet(er)" in mottatt[("alle@example.no",)]
+
+
+def test_uten_passord_hoppes_det_over_naar_serveren_krever_innlogging(smtp, monkeypatch):
+    monkeypatch.setenv("SMTP_SECURITY", "ssl")
+    monkeypatch.setenv("LOVRADAR_ABONNENTER", json.dumps([{"navn": "Alle", "epost": "alle@example.no"}]))
+
+    def ingen_forbindelse(*_):
+        raise AssertionError("skal ikke koble til")
+
+    monkeypatch.setattr(lovradar.SmtpForbindelse, "_koble_til", ingen_forbindelse)
+    assert not send_epost_rapport(rapport())
+    assert smtp.forbindelser == 0
+
+
+def test_funn_i_alle_rutes_etter_kategoriene_nokkelordene_traff_i():
+    rapport = {
+        "lovendringer": [{"type": "lov", "kilde": "2002-6-21-34", "url": "https://lovdata.no/c", "kategori": "alle",
+                          "endring_prosent": 0.1, "endringer": ["§ 3"], "keyword_treff": {"miljø": {"avfall": 2}}}],
+        "nyheter": [{"type": "rss", "kilde": "Regjeringen: Nyheter", "tittel": "Krav om EPD for byggevarer",
+                     "url": "https://regjeringen.no/d", "kategori": "alle", "keyword_treff": {"bygg": {"epd": 1}}},
+                    {"type": "rss", "kilde": "Regjeringen: Nyheter", "tittel": "Statsbudsjettet",
+                     "url": "https://regjeringen.no/e", "kategori": "alle", "keyword_treff": {}}],
+    }
+    gruppering = grupper_rapport(rapport)
+
+    def antall(abonnent: Abonnent) -> tuple:
+        lov, nyheter = utvalg_for(gruppering, abonnent)["alle"]
+        return len(lov), len(nyheter)
+    assert antall(Abonnent("Innkjøp", "i@example.no", ["bygg", "handel"])) == (0, 1)
+    assert antall(Abonnent("Innkjøp", "i@example.no", ["bygg", "handel"], ["avfall"])) == (0, 0)
+    assert antall(Abonnent("Miljø", "m@example.no", ["miljø"])) == (1, 0)
+    assert antall(Abonnent("Generelt", "g@example.no", ["alle"])) == (1, 2)
+    assert antall(Abonnent("Alle", "a@example.no")) == (1, 2)
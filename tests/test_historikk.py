@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from lovradar import CONFIG, HistorikkLager, les_argumenter, les_tidspunkt, main
+
+
+def rapport(tidspunkt: str, *funn: dict) -> dict:
+    return {
+        "tidspunkt": tidspunkt,
+        "lovendringer": [f for f in funn if f["type"] == "lov"],
+        "nyheter": [f for f in funn if f["type"] == "rss"],
+        "feil": ["Kunne ikke hente: Plan- og bygningsloven"],
+        "statistikk": {"lover_sjekket": 2, "rss_sjekket": 1, "ytelse": {"faser": {}}},
+    }
+
+
+def lov(kilde: str, kategori: str, treff: dict) -> dict:
+    return {"type": "lov", "kilde": kilde, "kategori": kategori, "tittel": kilde, "url": "https://lovdata.no/" + kilde,
+            "endring_prosent": 1.5, "endringer": ["§ 3 endret."], "keyword_treff": treff}
+
+
+def nyhet(tittel: str, keywords: list) -> dict:
+    # Eldre rapporter har bare keywords, ikke keyword_treff
+    return {"type": "rss", "kilde": "Regjeringen", "kategori": "alle", "tittel": tittel,
+            "url": "https://regjeringen.no/" + tittel, "keywords": keywords}
+
+
+JANUAR = rapport("2026-01-05T06:00:00", lov("Produktkontrolloven", "miljø", {"miljø": {"avfall": 2}}),
+                 nyhet("Krav til byggevarer", ["EPD", "byggevare"]))
+MARS = rapport("2026-03-05T06:00:00", lov("Byggteknisk forskrift", "bygg", {"bygg": {"epd": 1}, "miljø": {"avfall": 1}}))
+
+
+@pytest.fixture
+def lager(tmp_path):
+    lager = HistorikkLager(str(tmp_path / "historikk.db"))
+    lager.lagre_rapport(JANUAR)
+    lager.lagre_rapport(MARS)
+    yield lager
+    lager.lukk()
+
+
+def titler(treff: list) -> list:
+    return [f["tittel"] for f in treff]
+
+
+def test_sok(lager):
+    assert titler(lager.sok()) == ["Byggteknisk forskrift", "Produktkontrolloven", "Krav til byggevarer"]
+    assert titler(lager.sok(kilde="Produktkontrolloven")) == ["Produktkontrolloven"]
+    assert titler(lager.sok(kategori="alle")) == ["Krav til byggevarer"]
+    assert titler(lager.sok(type_="lov")) == ["Byggteknisk forskrift", "Produktkontrolloven"]
+    assert titler(lager.sok(keyword="Epd")) == ["Byggteknisk forskrift", "Krav til byggevarer"]
+    assert titler(lager.sok(keyword="avfall", fra="2026-02-01")) == ["Byggteknisk forskrift"]
+    assert titler(lager.sok(til="2026-03-05T06:00:00")) == ["Produktkontrolloven", "Krav til byggevarer"]
+    assert titler(lager.sok(grense=1)) == ["Byggteknisk forskrift"]
+    assert lager.sok(kilde="Produktkontrolloven", keyword="epd") == []
+    assert lager.sok()[0]["tidspunkt"] == MARS["tidspunkt"]
+
+
+def test_rapport_gjenskapes(lager):
+    assert lager.siste_kjoring() == 2
+    gjenskapt = lager.rapport(1)
+    assert gjenskapt == {**JANUAR, "statistikk": {"lover_sjekket": 2, "rss_sjekket": 1}}
+    assert lager.rapport(3) is None
+
+
+def test_les_tidspunkt():
+    assert les_tidspunkt("2026-01-05") == "2026-01-05T00:00:00"
+    for verdi, dager in (("30d", 30), ("6M", 180), ("1y", 365)):
+        forventet = datetime.now() - timedelta(days=dager)
+        assert abs(datetime.fromisoformat(les_tidspunkt(verdi)) - forventet) < timedelta(minutes=1)
+    with pytest.raises(argparse.ArgumentTypeError):
+        les_tidspunkt("forrige uke")
+
+
+def test_import_eksport_og_sok_fra_kommandolinjen(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "history_db", str(tmp_path / "historikk.db"))
+    for navn, innhold in (("januar.json", JANUAR), ("mars.json", MARS)):
+        (tmp_path / navn).write_text(json.dumps(innhold), encoding="utf-8")
+    asyncio.run(main(les_argumenter(["--importer", "januar.json", "mars.json"])))
+
+    asyncio.run(main(les_argumenter(["--eksport", "siste.json"])))
+    asyncio.run(main(les_argumenter(["--eksport", "forste.json", "--kjoring", "1"])))
+    assert json.loads((tmp_path / "siste.json").read_text(encoding="utf-8"))["lovendringer"] == MARS["lovendringer"]
+    assert json.loads((tmp_path / "forste.json").read_text(encoding="utf-8"))["nyheter"] == JANUAR["nyheter"]
+
+    capsys.readouterr()
+    asyncio.run(main(les_argumenter(["--sok", "--keyword", "epd", "--type", "rss", "--format", "json"])))
+    assert titler(json.loads(capsys.readouterr().out)) == ["Krav til byggevarer"]
+    asyncio.run(main(les_argumenter(["--sok", "--fra", "2026-02-01"])))
+    utskrift = capsys.readouterr().out.splitlines()
+    assert utskrift[0].startswith("2026-03-05  bygg       1.5%  Byggteknisk forskrift")
+    assert utskrift[-1] == "1 funn"
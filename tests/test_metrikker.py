@@ -0,0 +1,66 @@
+import json
+import pstats
+import re
+
+import lovradar_bench
+from lovradar import CONFIG, Maaler, kjor_med_profil, les_argumenter, metrikker_som_prometheus, skriv_metrikker
+from lovradar_bench import AvspillingSession
+
+PROVE = re.compile(r'^([a-z_][a-z0-9_]*)(?:\{(.*)\})? (-?[0-9.e+-]+)$')
+
+
+def les_prometheus(tekst: str) -> dict:
+    typer, verdier = {}, {}
+    for linje in tekst.splitlines():
+        if linje.startswith("# TYPE "):
+            _, _, navn, type_ = linje.split(" ")
+            typer[navn] = type_
+        elif not linje.startswith("#"):
+            treff = PROVE.match(linje)
+            assert treff, linje
+            navn, etiketter, verdi = treff.groups()
+            assert navn in typer, f"{navn} mangler TYPE"
+            verdier[(navn, etiketter)] = float(verdi)
+    return typer, verdier
+
+
+def test_prometheus_utdata(avspill):
+    lover, rss_kilder, arkiv, _ = lovradar_bench.syntetisk_korpus(3, 1, paragrafer=4)
+    rapport = avspill(AvspillingSession(arkiv), lover, rss_kilder)
+    ytelse = rapport["statistikk"]["ytelse"]
+    typer, verdier = les_prometheus(metrikker_som_prometheus(rapport, ytelse))
+
+    # Verdiene gjelder én kjøring og er gauges; ingen _total-navn som lover en counter
+    assert set(typer.values()) == {"gauge"}
+    assert not [navn for navn in typer if navn.endswith("_total")]
+    assert verdier[("lovradar_lover_sjekket", None)] == rapport["statistikk"]["lover_sjekket"] == 3
+    assert verdier[("lovradar_bytes_lastet_ned", None)] == ytelse["bytes_lastet_ned"] > 0
+    assert verdier[("lovradar_fase_kall", 'fase="ekstraher_lovtekst"')] == 3
+    kilde = lover[0].navn
+    for fase, sekunder in ytelse["kilder"][kilde].items():
+        assert verdier[("lovradar_kilde_sekunder", f'kilde="{kilde}",fase="{fase}"')] == sekunder
+
+
+def test_etiketter_escapes():
+    ytelse = {**Maaler().som_dict(), "kilder": {'Lov "A"\\ny': {"hent": 0.5}}}
+    statistikk = {"lover_sjekket": 1, "revalidert_uten_nedlasting": 0, "lovendringer_funnet": 0, "nyheter_funnet": 0}
+    tekst = metrikker_som_prometheus({"statistikk": statistikk}, ytelse)
+    assert 'lovradar_kilde_sekunder{kilde="Lov \\"A\\"\\\\ny",fase="hent"} 0.5' in tekst
+
+
+def test_metrikker_som_json(tmp_path):
+    maaler = Maaler()
+    maaler.registrer("hent", 0.25, kilde="Produktkontrolloven")
+    skriv_metrikker(str(tmp_path / "m.json"), {"statistikk": {"lover_sjekket": 1}}, maaler)
+    data = json.loads((tmp_path / "m.json").read_text(encoding="utf-8"))
+    assert data["statistikk"]["lover_sjekket"] == 1
+    assert data["statistikk"]["ytelse"]["faser"]["hent"] == {"antall": 1, "sekunder": 0.25}
+
+
+def test_profil(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "history_db", str(tmp_path / "historikk.db"))
+    kjor_med_profil(les_argumenter(["--sok", "--profil", "profil"]))
+    funksjoner = {navn for _, _, navn in pstats.Stats(str(tmp_path / "profil.pstats")).stats}
+    assert "kjor_historikk" in funksjoner
+    assert (tmp_path / "profil_minne.txt").read_text(encoding="utf-8").strip()
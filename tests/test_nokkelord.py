@@ -0,0 +1,35 @@
+import pytest
+
+from lovradar import KEYWORDS, NokkelordMatcher, keywords_fra_treff, normaliser_tekst
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return NokkelordMatcher(KEYWORDS)
+
+
+def ord_i(treff: dict) -> set:
+    return {kw for per_kategori in treff.values() for kw in per_kategori}
+
+
+@pytest.mark.parametrize("tekst", ["Krav om CE-merking og U-verdi", "Krav om CE–merking og U verdi"])
+def test_bindestrek_og_mellomrom_er_like(matcher, tekst):
+    assert ord_i(matcher.finn(tekst)) == {"ce-merking", "u-verdi"}
+    assert ord_i(matcher.finn(normaliser_tekst(tekst + " for byggevare"))) == {"ce-merking", "u-verdi", "byggevare"}
+
+
+def test_korte_ord_krever_ordgrense_i_begge_ender(matcher):
+    assert ord_i(matcher.finn("Ny EPD, krav til ESG og HMS.")) == {"epd", "esg", "hms"}
+    assert ord_i(matcher.finn("epdene esgrapport hmsk tepd")) == set()
+
+
+def test_lange_ord_kan_vaere_forsteledd(matcher):
+    assert ord_i(matcher.finn("En avfallsplan for byggeplassen")) == {"avfall", "byggeplass"}
+    # Men treffet må starte på en ordgrense
+    assert ord_i(matcher.finn("restavfall og ikkeimport")) == set()
+
+
+def test_treff_telles_per_kategori(matcher):
+    treff = matcher.finn("Avfall, avfall og emballasje")
+    assert treff == {"miljø": {"avfall": 2}, "handel": {"emballasje": 1}}
+    assert keywords_fra_treff(treff) == ["avfall", "emballasje"]
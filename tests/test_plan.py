@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import lovradar
+import lovradar_bench
+import lovradar_plan
+from lovradar import CONFIG, ingenting_forfalt, les_argumenter
+from lovradar_bench import AvspillingSession
+
+
+@pytest.fixture
+def skannet(avspill, monkeypatch):
+    # En fullført kjøring der kildene i korpuset er overvåkningslisten, så planen er "standard"
+    lover, rss_kilder, arkiv, _ = lovradar_bench.syntetisk_korpus(3, 1, paragrafer=4)
+    monkeypatch.setattr(lovradar, "ALLE_LOVER", lover)
+    monkeypatch.setattr(lovradar, "RSS_KILDER", rss_kilder)
+    avspill(AvspillingSession(arkiv), lover, rss_kilder)
+
+
+def idle(*argv: str) -> bool:
+    return ingenting_forfalt(les_argumenter(list(argv)))
+
+
+def test_ingenting_forfalt_etter_en_kjoring(skannet):
+    assert idle() and idle("--fortsett")
+    for argv in (["--alle"], ["--shard", "1/2"], ["--merge"], ["--bulk"], ["--bulk-kilde", "pakke.tar.bz2"]):
+        assert not idle(*argv)
+    plan = lovradar_plan.gjeldende_plan(CONFIG["plan_file"])
+    assert plan["standard"] and plan["cache"] == CONFIG["cache_file"]
+
+
+def test_planen_gjelder_samme_innhold_ikke_samme_endringstid(skannet):
+    # En ny utsjekk i CI gir ny endringstid, men samme innhold
+    os.utime(CONFIG["cache_file"], (0, 0))
+    assert idle()
+    with open(CONFIG["cache_file"], 'a', encoding='utf-8') as f:
+        f.write(" ")
+    assert not idle()
+
+
+def test_planen_avvises(skannet, monkeypatch, tmp_path):
+    plan = lovradar_plan.gjeldende_plan(CONFIG["plan_file"])
+    assert lovradar_plan.gjeldende_plan(CONFIG["plan_file"], naa=lovradar.datetime.fromisoformat(plan["neste_forfall"])) is None
+    with monkeypatch.context() as m:
+        (tmp_path / "annen_kode.py").write_text("# endret\n")
+        m.setattr(lovradar_plan, "KODE_FIL", str(tmp_path / "annen_kode.py"))
+        assert not idle()
+    with monkeypatch.context() as m:
+        m.setattr(lovradar, "RSS_KILDER", [])
+        assert not idle()
+    # En avbrutt kjøring venter på --fortsett
+    os.makedirs(CONFIG["checkpoint_dir"])
+    (tmp_path / CONFIG["checkpoint_dir"] / "kjoring.json").write_text("{}")
+    assert not idle("--fortsett")
+
+
+def test_oppstarteren_laster_ikke_lovradar_naar_ingenting_er_forfalt(skannet, monkeypatch, capsys):
+    kjort = []
+    monkeypatch.setattr(lovradar, "kjor_kommandolinje", kjort.append)
+    lovradar_plan.main(["--fortsett"])
+    assert kjort == [] and "Ingen kilder er forfalt" in capsys.readouterr().out
+    lovradar_plan.main(["--fortsett", "--alle"])
+    os.remove(CONFIG["plan_file"])
+    lovradar_plan.main([])
+    assert kjort == [["--fortsett", "--alle"], []]
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from lovradar import CONFIG, Funn, LovRadar, beregn_relevans
+
+
+def funn(kategori: str, treff: dict, ord_antall: int = 20, type_: str = "rss") -> Funn:
+    return Funn(type=type_, kilde="Kilde", kategori=kategori, tittel=kategori, url="https://example.no/",
+                keyword_treff=treff, ord_antall=ord_antall)
+
+
+def bm25(idf: float, tf: float, vekt: float, k1: float = 1.2) -> float:
+    # Alle funn har samme lengde, så lengdenormaliseringen blir bare k1
+    return vekt * idf * tf * (k1 + 1) / (tf + k1)
+
+
+def test_poeng_for_ett_funn():
+    f = funn("miljø", {"miljø": {"epd": 2}}, ord_antall=10)
+    beregn_relevans([f], {})
+    assert f.relevans == round(bm25(math.log1p(0.5 / 1.5), 2, 1.5), 3)
+    assert f.keywords == ["epd"]
+
+
+def test_sjeldne_ord_og_egen_kategori_rangeres_hoyest():
+    treff = {"miljø": {"avfall": 1, "svhc": 1}}
+    egen, alle, annen = funn("miljø", treff), funn("alle", treff), funn("handel", treff)
+    vanlig, ingen = funn("miljø", {"miljø": {"avfall": 1}}), funn("miljø", {})
+    statistikk = {}
+    beregn_relevans([egen, alle, annen, vanlig, ingen], statistikk)
+
+    assert statistikk["dokumenter"] == 5 and statistikk["df"] == {"avfall": 4, "svhc": 3}
+    assert egen.relevans > alle.relevans == annen.relevans > vanlig.relevans > ingen.relevans == 0.0
+    assert egen.relevans == pytest.approx(1.5 * alle.relevans, abs=1e-3)
+    # Det sjeldne ordet bidrar mest og står først
+    assert egen.keywords == ["svhc", "avfall"]
+
+
+def test_kategorivekter(monkeypatch):
+    monkeypatch.setitem(CONFIG, "relevance_category_weights", {"miljø": 1.0, "bygg": 2.0, "handel": 1.0})
+    bygg, miljo = funn("alle", {"bygg": {"byggevare": 1}}), funn("alle", {"miljø": {"avfall": 1}})
+    beregn_relevans([bygg, miljo], {})
+    assert bygg.relevans == pytest.approx(2 * miljo.relevans, abs=1e-3)
+
+
+def test_statistikken_samles_over_kjoringer(monkeypatch):
+    statistikk = {}
+    forste, andre = funn("miljø", {"miljø": {"avfall": 1}}), funn("miljø", {"miljø": {"avfall": 1}})
+    beregn_relevans([forste], statistikk)
+    beregn_relevans([andre], statistikk)
+    # Ordet er nå sett i begge dokumentene og er mindre informativt
+    assert statistikk == {"df": {"avfall": 2}, "dokumenter": 2, "ord": 40}
+    assert andre.relevans == round(bm25(math.log1p(0.5 / 2.5), 1, 1.5), 3) < forste.relevans
+
+    monkeypatch.setitem(CONFIG, "relevance_corpus_max", 2)
+    beregn_relevans([funn("miljø", {"miljø": {"avfall": 1}})], statistikk)
+    assert statistikk == {"df": {"avfall": 1.5}, "dokumenter": 1.5, "ord": 30}
+
+
+def test_terskelen_gjelder_bare_nyheter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(CONFIG, "relevance_threshold", 1.0)
+    radar = LovRadar([], [])
+    sterk = funn("miljø", {"miljø": {"svhc": 3, "avfall": 2}})
+    svak = funn("miljø", {"miljø": {"avfall": 1}})
+    lov = funn("miljø", {}, type_="lov")
+    radar.funn = [sterk, svak, lov]
+    radar._vurder_relevans()
+    assert radar.funn == [sterk, lov] and svak.relevans < 1.0 <= sterk.relevans
+    assert radar.cache["relevans"]["dokumenter"] == 3
@@ -0,0 +1,87 @@
+import shutil
+
+import pytest
+
+import lovradar_bench
+from lovradar import CONFIG, LovKilde
+from lovradar_bench import AvspillingSession, arkiv_svar, nytt_arkiv, syntetisk_lov_html
+
+LOV = LovKilde("Syntetisk lov", "https://lovdata.no/dokument/SF/forskrift/2004-06-01-930", "miljø", "Syntetisk")
+
+
+def arkiv(endret: bool = False, validatorer: bool = True, html: str = "") -> dict:
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    if validatorer:
+        headers.update({"ETag": '"b"' if endret else '"a"', "Last-Modified": "Mon, 02 Feb 2026 10:00:00 GMT"})
+    arkiv = nytt_arkiv()
+    arkiv["svar"][LOV.url] = arkiv_svar(200, headers, (html or syntetisk_lov_html(1, 12, endret)).encode())
+    return arkiv
+
+
+def parset(rapport: dict) -> bool:
+    return "ekstraher_lovtekst" in rapport["statistikk"]["ytelse"]["faser"]
+
+
+@pytest.fixture
+def kjor(avspill):
+    def kjor(arkiv: dict) -> dict:
+        return avspill(AvspillingSession(arkiv), [LOV], [])
+    return kjor
+
+
+def test_304_hopper_over_parsing_og_diff(kjor):
+    kjor(arkiv())
+    rapport = kjor(arkiv())
+    assert rapport["statistikk"]["revalidert_uten_nedlasting"] == 1
+    assert rapport["lovendringer"] == [] and not parset(rapport)
+    assert rapport["statistikk"]["ytelse"]["bytes_lastet_ned"] == 0
+
+
+def test_ny_etag_gir_endring(kjor):
+    kjor(arkiv())
+    rapport = kjor(arkiv(endret=True))
+    assert rapport["statistikk"]["revalidert_uten_nedlasting"] == 0
+    assert len(rapport["lovendringer"]) == 1
+
+
+def test_liten_endring_i_lang_lov_meldes(kjor):
+    # Endringen er langt under en promille av teksten, men må meldes: neste kjøring diffes mot den nye
+    html = syntetisk_lov_html(1, 800, False)
+    kjor(arkiv(validatorer=False, html=html))
+    overskrift = "Overskrift 400</h3><div class='legalP'>"
+    ny = html.replace(overskrift, overskrift + "Produsenten skal oppgi gjenvunnet andel. ")
+    rapport = kjor(arkiv(validatorer=False, html=ny))
+    assert [e.split(" endret")[0] for e in rapport["lovendringer"][0]["endringer"]] == ["§ 400"]
+    assert rapport["lovendringer"][0]["endring_prosent"] < 0.1
+
+
+def test_lik_sha256_uten_validatorer_hopper_over_parsing(kjor):
+    kjor(arkiv(validatorer=False))
+    rapport = kjor(arkiv(validatorer=False))
+    assert rapport["statistikk"]["revalidert_uten_nedlasting"] == 0
+    assert rapport["statistikk"]["ytelse"]["bytes_lastet_ned"] > 0
+    assert rapport["lovendringer"] == [] and not parset(rapport)
+
+
+def test_endret_side_uten_validatorer_meldes(kjor):
+    kjor(arkiv(validatorer=False))
+    rapport = kjor(arkiv(endret=True, validatorer=False))
+    assert parset(rapport) and len(rapport["lovendringer"]) == 1
+
+
+def test_uten_snapshot_hentes_siden_paa_nytt(kjor):
+    # Uten baseline å diffe mot sendes ingen validatorer; en 304 ville latt loven stå uten snapshot
+    kjor(arkiv())
+    shutil.rmtree(CONFIG["snapshot_dir"])
+    rapport = kjor(arkiv(endret=True))
+    assert rapport["statistikk"]["revalidert_uten_nedlasting"] == 0
+    assert parset(rapport) and rapport["lovendringer"] == []
+    assert kjor(arkiv(endret=True))["statistikk"]["revalidert_uten_nedlasting"] == 1
+
+
+def test_korpus_uten_endringer_revalideres_helt(avspill):
+    lover, rss_kilder, arkiv_for, _ = lovradar_bench.syntetisk_korpus(6, 0, paragrafer=4)
+    avspill(AvspillingSession(arkiv_for), lover, rss_kilder)
+    rapport = avspill(AvspillingSession(arkiv_for), lover, rss_kilder)
+    assert rapport["statistikk"]["revalidert_uten_nedlasting"] == len(lover)
+    assert rapport["lovendringer"] == []
@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from lovradar import CONFIG, LikhetsIndeks, RSSKilde, SettIndeks, rydd_tidsindeks, simhash
+from lovradar_bench import AvspillingSession, arkiv_svar, nytt_arkiv
+
+A = RSSKilde("Feed A", "https://a.example.no/rss", "miljø")
+B = RSSKilde("Feed B", "https://b.example.no/rss", "bygg")
+
+SAK = ("Nye krav til emballasje og avfall", "Regjeringen foreslår strengere krav til gjenvinning av emballasje.")
+ANNEN_SAK = ("Produktpass for byggevarer", "EU innfører digitalt produktpass og krav om sporbarhet for byggevarer.")
+UTEN_TREFF = ("Statsråden på besøk", "Statsråden besøkte fylket i dag.")
+
+
+def feed(*saker) -> bytes:
+    items = "".join(f"<item><title>{tittel}</title><link>{link}</link><guid>{link}</guid>"
+                    f"<description>{tekst}</description></item>" for (tittel, tekst), link in saker)
+    return ("<?xml version='1.0' encoding='utf-8'?><rss version='2.0'><channel><title>Feed</title>"
+            + items + "</channel></rss>").encode("utf-8")
+
+
+def arkiv(a: tuple = (), b: tuple = ()) -> dict:
+    arkiv = nytt_arkiv()
+    for kilde, saker in ((A, a), (B, b)):
+        arkiv["svar"][kilde.url] = arkiv_svar(200, {"Content-Type": "application/rss+xml"}, feed(*saker))
+    return arkiv
+
+
+@pytest.fixture
+def kjor(avspill):
+    def kjor(**feeder) -> list:
+        return avspill(AvspillingSession(arkiv(**feeder)), [], [A, B])["nyheter"]
+    return kjor
+
+
+def kilder(nyhet: dict) -> list:
+    return [k["kilde"] for k in nyhet.get("kilder") or [{"kilde": nyhet["kilde"]}]]
+
+
+def test_samme_sak_meldes_bare_en_gang(kjor):
+    assert len(kjor(a=[(SAK, "https://a.example.no/sak/1")])) == 1
+    assert kjor(a=[(SAK, "https://a.example.no/sak/1")]) == []
+    # Sporingsparametre og skråstrek på slutten gjør ikke lenken ny
+    assert kjor(a=[(SAK, "https://a.example.no/sak/1/?utm_source=nyhetsbrev")]) == []
+    # En oppdatert sak under samme lenke er fortsatt sett
+    assert kjor(a=[(ANNEN_SAK, "https://a.example.no/sak/1")]) == []
+    nyheter = kjor(a=[(SAK, "https://a.example.no/sak/1"), (ANNEN_SAK, "https://a.example.no/sak/3")])
+    assert [n["url"] for n in nyheter] == ["https://a.example.no/sak/3"]
+
+
+def test_oppforing_uten_treff_skjuler_ikke_lenken_i_en_annen_feed(kjor):
+    nyheter = kjor(a=[(UTEN_TREFF, "https://regjeringen.no/sak/1")], b=[(SAK, "https://regjeringen.no/sak/1")])
+    assert [n["kilde"] for n in nyheter] == ["Feed B"]
+
+
+def test_nokler_for_lenke_og_guid():
+    assert SettIndeks.nokler("https://WWW.Example.no/sak/1/?utm_source=x&id=2", "") == ["l:https://www.example.no/sak/1?id=2"]
+    assert SettIndeks.nokler("https://example.no/sak/1", "https://example.no/sak/1") == ["l:https://example.no/sak/1"]
+    assert SettIndeks.nokler("", " urn:sak:1 ") == ["g:urn:sak:1"]
+    sett = SettIndeks({})
+    sett.merk(SettIndeks.nokler("https://example.no/a", "urn:sak:1"), "2026-01-01T06:00:00")
+    # Samme guid under ny lenke er sett, og omvendt
+    assert sett.er_sett(SettIndeks.nokler("https://example.no/b", "urn:sak:1"))
+    assert sett.er_sett(SettIndeks.nokler("https://example.no/a/", "urn:sak:2"))
+    assert not sett.er_sett(SettIndeks.nokler("https://example.no/c", "urn:sak:3"))
+
+
+def test_samme_lenke_i_to_feeder_gir_ett_funn(kjor):
+    nyheter = kjor(a=[(SAK, "https://regjeringen.no/sak/1")], b=[(SAK, "https://regjeringen.no/sak/1")])
+    assert len(nyheter) == 1 and kilder(nyheter[0]) == ["Feed A", "Feed B"]
+
+
+def test_nesten_lik_sak_i_to_feeder_gir_ett_funn(kjor):
+    nyheter = kjor(a=[(SAK, "https://a.example.no/sak/1"), (ANNEN_SAK, "https://a.example.no/sak/2")],
+                   b=[(SAK, "https://b.example.no/nyhet/9")])
+    assert [kilder(n) for n in nyheter] == [["Feed A", "Feed B"], ["Feed A"]]
+
+
+def test_sak_meldt_tidligere_meldes_ikke_under_ny_lenke(kjor):
+    assert len(kjor(a=[(SAK, "https://a.example.no/sak/1")])) == 1
+    nyheter = kjor(b=[(SAK, "https://b.example.no/nyhet/9"), (ANNEN_SAK, "https://b.example.no/nyhet/10")])
+    assert [n["url"] for n in nyheter] == ["https://b.example.no/nyhet/10"]
+    with open(CONFIG["cache_file"], 'r', encoding='utf-8') as f:
+        assert simhash(" ".join(SAK)) in json.load(f)["rss_likhet"]
+
+
+def test_likhetsindeks_finner_innenfor_avstanden():
+    indeks = LikhetsIndeks({})
+    avtrykk = simhash(" ".join(SAK))
+    indeks.merk(avtrykk, datetime.now().isoformat())
+    naer = format(int(avtrykk, 16) ^ 0b101, "016x")
+    fjern = format(int(avtrykk, 16) ^ 0b1111, "016x")
+    assert indeks.finn(naer) == avtrykk
+    assert indeks.finn(fjern) is None
+    assert indeks.finn(simhash(" ".join(ANNEN_SAK))) is None
+
+
+def test_indeksene_ryddes_etter_alder_og_antall(monkeypatch):
+    monkeypatch.setitem(CONFIG, "rss_seen_ttl_days", 30)
+    monkeypatch.setitem(CONFIG, "rss_seen_max_entries", 2)
+    naa = datetime.now()
+    data = {f"l:{n}": (naa - timedelta(days=dager)).isoformat() for n, dager in enumerate((40, 3, 2, 1))}
+    assert rydd_tidsindeks(data) == 2
+    assert sorted(data) == ["l:2", "l:3"]
+    sett = SettIndeks(data)
+    assert sett.er_sett(SettIndeks.nokler("", "3")) is False and sett.er_sett(["l:3"])
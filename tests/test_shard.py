@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import pytest
+
+import lovradar
+from conftest import tilstand
+from lovradar import CONFIG, LovRadar, Maaler, flett_shards, i_shard, shard_fil, skriv_rapport
+from lovradar_bench import AvspillingSession
+
+
+def test_fordelingen_er_stabil_og_fullstendig():
+    # sha256 og ikke hash(), så alle prosesser og runnere fordeler likt
+    assert [i for i in (1, 2) if i_shard("Forbrukerkjøpsloven", (i, 2))] == [1]
+    assert [i for i in (1, 2, 3) if i_shard("Syntetisk feed 1", (i, 3))] == [3]
+    navn = [lov.navn for lov in lovradar.ALLE_LOVER] + [f"Syntetisk lov {i}" for i in range(200)]
+    for antall in (1, 2, 3, 5):
+        for n in navn:
+            assert sum(i_shard(n, (i, antall)) for i in range(1, antall + 1)) == 1
+
+
+@pytest.fixture
+def korpus(korpus):
+    lover, rss_kilder, arkiv_for, arkiv_etter = korpus
+    # Feed 1 (shard 1) har de samme sakene som feed 0 (shard 2); flettingen skal slå dem sammen
+    assert i_shard(rss_kilder[0].navn, (2, 2)) and i_shard(rss_kilder[1].navn, (1, 2))
+    for arkiv in (arkiv_for, arkiv_etter):
+        arkiv["svar"][rss_kilder[1].url] = arkiv["svar"][rss_kilder[0].url]
+    return lover, rss_kilder, arkiv_for, arkiv_etter
+
+
+def kjor_shards(lover: list, rss_kilder: list, arkiv: dict) -> dict:
+    for shard in ((1, 2), (2, 2)):
+        radar = LovRadar(lover, rss_kilder, shard=shard, alle=True)
+        rapport = asyncio.run(radar.kjor_skanning(session=AvspillingSession(arkiv)))
+        skriv_rapport(rapport, shard_fil(CONFIG["shard_report_file"], shard))
+    return flett_shards(Maaler(), lover, rss_kilder)
+
+
+def test_to_shards_gir_samme_resultat_som_en_kjoring(avspill, mappe, korpus):
+    lover, rss_kilder, arkiv_for, arkiv_etter = korpus
+
+    mappe("hel")
+    avspill(AvspillingSession(arkiv_for), lover, rss_kilder)
+    # Relevansen regnes per shard med shardens statistikk, så poeng og stikkordrekkefølge kan avvike
+    forventet = tilstand(avspill(AvspillingSession(arkiv_etter), lover, rss_kilder), relevans=False)
+    assert forventet[0], "korpuset skal gi lovendringer"
+    assert any(len(f["kilder"]) == 2 for f in forventet[1]), "korpuset skal gi nyheter fra to feeder"
+
+    mappe("shards")
+    kjor_shards(lover, rss_kilder, arkiv_for)
+    rapport = kjor_shards(lover, rss_kilder, arkiv_etter)
+    assert rapport["statistikk"]["shards"] == 2
+    assert tilstand(rapport, relevans=False) == forventet
+    assert sorted(os.listdir(".")) == sorted([CONFIG["cache_file"], CONFIG["plan_file"], CONFIG["snapshot_dir"]])
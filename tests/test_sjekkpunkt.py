@@ -0,0 +1,51 @@
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+
+from conftest import tilstand
+from lovradar import CONFIG, Sjekkpunkt
+from lovradar_bench import AvspillingSession
+
+
+class Avbrudd(BaseException):
+    # Som når runneren stopper jobben: fanges ikke av feilhåndteringen rundt forespørslene
+    pass
+
+
+class AvbruttSession(AvspillingSession):
+    def __init__(self, arkiv: dict, etter: int = None):
+        super().__init__(arkiv)
+        self.etter = etter
+        self.urler = []
+
+    @asynccontextmanager
+    async def get(self, url: str, headers: dict = None, **kwargs):
+        if self.etter is not None and len(self.urler) >= self.etter:
+            raise Avbrudd()
+        self.urler.append(url)
+        async with super().get(url, headers, **kwargs) as svar:
+            yield svar
+
+
+def test_avbrutt_kjoring_fortsetter_der_den_stoppet(avspill, mappe, korpus):
+    lover, rss_kilder, arkiv_for, arkiv_etter = korpus
+    url_for = {k.navn: k.url for k in lover + rss_kilder}
+
+    mappe("hel")
+    avspill(AvspillingSession(arkiv_for), lover, rss_kilder)
+    forventet = tilstand(avspill(AvspillingSession(arkiv_etter), lover, rss_kilder))
+    assert forventet[0], "korpuset skal gi lovendringer"
+
+    mappe("avbrutt")
+    avspill(AvspillingSession(arkiv_for), lover, rss_kilder)
+    with pytest.raises(Avbrudd):
+        avspill(AvbruttSession(arkiv_etter, etter=6), lover, rss_kilder)
+    ferdige = {kilde for _, kilde in Sjekkpunkt(CONFIG["checkpoint_dir"])._last_alle()}
+    assert 0 < len(ferdige) < len(url_for)
+
+    session = AvbruttSession(arkiv_etter)
+    rapport = avspill(session, lover, rss_kilder, fortsett=True)
+    assert sorted(session.urler) == sorted(url for navn, url in url_for.items() if navn not in ferdige)
+    assert tilstand(rapport) == forventet
+    assert not os.path.exists(CONFIG["checkpoint_dir"])
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from lovradar import CONFIG, er_forfalt, skanneintervall
+
+NAA = datetime(2026, 3, 2, 6, 0)
+TIME = 3600
+DAG = 86400
+
+
+def oppforing(endringer: int = 0, dager: float = 0, sist_sjekket: datetime = None) -> dict:
+    # Endringene spres jevnt over perioden siden kilden ble sett første gang
+    forst_sett = NAA - timedelta(days=dager)
+    historikk = [{"hash": str(n), "fra": (forst_sett + timedelta(days=dager * n / max(endringer, 1))).isoformat()}
+                 for n in range(endringer + 1)]
+    return {"forst_sett": forst_sett.isoformat(), "historikk": historikk,
+            "sist_sjekket": (sist_sjekket or NAA).isoformat()}
+
+
+def test_ny_kilde_sjekkes_ved_taket_med_margin():
+    # Prioren gir 36,5 dager; taket er 14 dager minus en halv dags margin
+    assert skanneintervall(oppforing(), "miljø", NAA) == 14 * DAG - 12 * TIME
+
+
+def test_intervallet_folger_endringsraten():
+    # 31 endringer på 60 + 365 dager: 0,1 / (31 / 425) dager
+    assert skanneintervall(oppforing(30, 60), "miljø", NAA) == pytest.approx(0.1 * 425 / 31 * DAG)
+    assert skanneintervall(oppforing(30, 60), "alle", NAA) == pytest.approx(2 * 0.1 * 425 / 31 * DAG)
+    assert skanneintervall(oppforing(5, 60), "miljø", NAA) > skanneintervall(oppforing(30, 60), "miljø", NAA)
+
+
+def test_kilde_som_endres_ofte_sjekkes_hoyst_en_gang_per_kjoring():
+    assert skanneintervall(oppforing(100, 10), "miljø", NAA) == 20 * TIME
+
+
+def test_forfalt():
+    assert er_forfalt(None, "miljø", NAA)
+    assert er_forfalt({"historikk": []}, "miljø", NAA)
+    assert not er_forfalt(oppforing(sist_sjekket=NAA - timedelta(days=13)), "miljø", NAA)
+    assert er_forfalt(oppforing(30, 60, sist_sjekket=NAA - timedelta(days=2)), "miljø", NAA)
+    assert not er_forfalt(oppforing(30, 60, sist_sjekket=NAA - timedelta(days=1)), "miljø", NAA)
+
+
+def test_kjoring_litt_tidlig_holder_taket(monkeypatch):
+    # Forrige sjekk ble skrevet 06:40 for 14 dager siden; dagens kjøring starter 06:00
+    sist = NAA - timedelta(days=14) + timedelta(minutes=40)
+    assert er_forfalt(oppforing(sist_sjekket=sist), "miljø", NAA)
+    monkeypatch.setitem(CONFIG, "poll_run_margin_hours", 0)
+    assert not er_forfalt(oppforing(sist_sjekket=sist), "miljø", NAA)
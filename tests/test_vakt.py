@@ -0,0 +1,70 @@
+import asyncio
+import socket
+from contextlib import asynccontextmanager
+
+import aiohttp
+import pytest
+
+import lovradar
+import lovradar_bench
+from lovradar import CONFIG, HistorikkLager, LovRadar, Vakt
+from lovradar_bench import AvspillingSession
+
+
+def ledig_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def vent_paa(betingelse, sekunder: float = 20):
+    async with asyncio.timeout(sekunder):
+        while not betingelse():
+            await asyncio.sleep(0.02)
+
+
+def test_vakt_skanner_og_kan_utloses_over_http(avspill, monkeypatch):
+    lover, rss_kilder, arkiv, _ = lovradar_bench.syntetisk_korpus(3, 1, paragrafer=4)
+    session = AvspillingSession(arkiv)
+
+    @asynccontextmanager
+    async def ny_session():
+        yield session
+    monkeypatch.setattr(lovradar, "ny_http_session", ny_session)
+    monkeypatch.setitem(CONFIG, "daemon_min_sleep_seconds", 0)
+    port = ledig_port()
+    url = f"http://127.0.0.1:{port}"
+
+    async def kjor():
+        vakt = Vakt(LovRadar(lover, rss_kilder))
+        oppgave = asyncio.ensure_future(vakt.kjor("127.0.0.1", port))
+        await vent_paa(lambda: vakt.kjoringer == 1 and vakt.neste)
+        async with aiohttp.ClientSession() as klient:
+            async with klient.get(url + "/status") as svar:
+                status = await svar.json()
+            assert status["kjoringer"] == 1 and not status["skanner"]
+            assert status["siste_kjoring"]["statistikk"]["lover_sjekket"] == 3
+            assert lovradar.datetime.fromisoformat(status["neste_kjoring"]) > lovradar.datetime.now()
+
+            # Ingenting er forfalt: en utløst skanning sjekker ingen lover, med alle=1 sjekkes alle
+            for sporring, forventet in (("", 0), ("?alle=1", 3)):
+                async with klient.post(url + "/skann" + sporring) as svar:
+                    assert svar.status == 202
+                n = vakt.kjoringer
+                await vent_paa(lambda: vakt.kjoringer == n + 1 and not vakt.skanner)
+                assert vakt.siste["statistikk"]["lover_sjekket"] == forventet
+        oppgave.cancel()
+        await oppgave
+        return vakt
+
+    vakt = asyncio.run(kjor())
+    assert vakt.kjoringer == 3
+    historikk = HistorikkLager(CONFIG["history_db"])
+    assert historikk.siste_kjoring() == 3
+    historikk.lukk()
+
+
+@pytest.mark.parametrize("argv", [["--daemon", "--merge"], ["--daemon", "--bulk"]])
+def test_daemon_kan_ikke_kombineres_med_datapakker_eller_fletting(argv):
+    with pytest.raises(SystemExit):
+        lovradar.les_argumenter(argv)